@@ -1,45 +1,21 @@
-import time
-import csv
-import os
 import argparse
 from config import CAMERA_PVS, RESULTS_DIR
-from client_utils import create_monitors, cleanup_monitors
-
-os.makedirs(RESULTS_DIR, exist_ok=True)
-
-results_file = os.path.join(RESULTS_DIR, "latency.csv")
-with open(results_file, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["pv", "frame_interval_sec"])
-
-last_time = {pv: None for pv in CAMERA_PVS}
-
-
-def on_update(pvname, value, timestamp):  # unified signature from helper
-    now = time.time()
-    prev = last_time[pvname]
-    last_time[pvname] = now
-    if prev is not None:
-        dt = now - prev
-        with open(results_file, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([pvname, dt])
+from client_utils import PAYLOAD_MODES
+from analyzers import LatencyAnalyzer, run_analyzers
 
 
 def main():
     parser = argparse.ArgumentParser(description="Latency monitor for EPICS CA/PVA")
     parser.add_argument("--protocol", choices=["ca", "pva"], default="ca", help="EPICS protocol (default: ca)")
+    LatencyAnalyzer.add_arguments(parser)
+    parser.add_argument("--payload", choices=PAYLOAD_MODES, default="meta",
+                        help="回调数据模式: meta 只取大小/时间 (默认), zerocopy 只读视图, full 完整数组")
     args = parser.parse_args()
 
-    monitors, backend = create_monitors(CAMERA_PVS, args.protocol, on_update)
+    analyzer = LatencyAnalyzer.from_args(CAMERA_PVS, args, RESULTS_DIR)
     print(f"Latency monitor started using protocol: {args.protocol.upper()}. Press Ctrl+C to stop.")
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("Stopped latency monitor.")
-    finally:
-        cleanup_monitors(monitors, backend)
+    run_analyzers([analyzer], CAMERA_PVS, args.protocol, payload=args.payload)
+    print("Stopped latency monitor.")
 
 
 if __name__ == "__main__":
@@ -1,58 +1,87 @@
-import time
+import argparse
 import csv
 import os
-import argparse
-import numpy as np
+import time
 from config import CAMERA_PVS, RESULTS_DIR
-from client_utils import create_monitors, cleanup_monitors
+from client_utils import PAYLOAD_MODES
+from analyzers import ThroughputAnalyzer, run_analyzers
+from ndcodec import NDArrayDecoder
 
-os.makedirs(RESULTS_DIR, exist_ok=True)
-results_file = os.path.join(RESULTS_DIR, "throughput.csv")
 
-with open(results_file, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["pv", "bytes_per_sec", "mb_per_sec"])
-
-interval = 5  # 统计窗口 (秒)
-counters = {pv: {"bytes": 0, "last": time.time()} for pv in CAMERA_PVS}
-
-
-def on_update(pvname, value, timestamp):
-    if hasattr(value, 'nbytes'):
-        try:
-            counters[pvname]["bytes"] += int(value.nbytes)
-        except Exception:
-            pass
+def codec_summary(rows, cameras, link_gbps):
+    """按编解码器汇总：每台相机的线上/解码后速率、解码开销，并按 cameras 台相机推算链路和 CPU 占用"""
+    by_codec = {}
+    for r in rows:
+        by_codec.setdefault(r['codec'], []).append(r)
+    out = []
+    for codec, rs in sorted(by_codec.items()):
+        n = len(rs)
+        wire = sum(r['wire_mbps'] for r in rs) / n
+        decoded = sum(r['decoded_mbps'] for r in rs) / n
+        frames = sum(r['frames'] for r in rs)
+        decode_ms = sum(r['decode_ms_per_frame'] * r['frames'] for r in rs) / frames if frames else 0.0
+        core = sum(r['decode_core_percent'] for r in rs) / n
+        link_gbit = wire * cameras * 1024 * 1024 * 8 / 1e9
+        out.append({
+            'codec': codec,
+            'pvs': n,
+            'wire_mbps_per_camera': wire,
+            'decoded_mbps_per_camera': decoded,
+            'compression_ratio': decoded / wire if wire else 0.0,
+            'decode_ms_per_frame': decode_ms,
+            'decode_core_percent_per_camera': core,
+            f'link_percent_{cameras}_cameras': link_gbit / link_gbps * 100 if link_gbps else 0.0,
+            f'decode_cores_{cameras}_cameras': core * cameras / 100,
+        })
+    return out
 
 
 def main():
     parser = argparse.ArgumentParser(description="Throughput monitor for EPICS CA/PVA")
     parser.add_argument("--protocol", choices=["ca", "pva"], default="ca")
-    parser.add_argument("--interval", type=int, default=interval, help="统计窗口秒数 (default 5)")
+    ThroughputAnalyzer.add_arguments(parser)
+    parser.add_argument("--payload", choices=PAYLOAD_MODES, default="meta",
+                        help="回调数据模式: meta 只取大小/时间 (默认), zerocopy 只读视图, full 完整数组")
+    parser.add_argument("--codec-compare", action="store_true",
+                        help="PVA：解码压缩的 NTNDArray (lz4/blosc/jpeg)，对比线上字节与解码字节及解码 CPU 开销")
+    parser.add_argument("--decode-threads", type=int, default=4, help="解码线程数 (default 4)")
+    parser.add_argument("--cameras", type=int, default=20, help="按该相机数量推算链路和 CPU 占用 (default 20)")
+    parser.add_argument("--link-gbps", type=float, default=1.0, help="链路带宽 Gbit/s (default 1.0)")
     args = parser.parse_args()
 
-    global interval
-    interval = args.interval
+    if args.codec_compare and args.protocol != "pva":
+        parser.error("--codec-compare requires --protocol pva")
 
-    monitors, backend = create_monitors(CAMERA_PVS, args.protocol, on_update)
+    analyzer = ThroughputAnalyzer.from_args(CAMERA_PVS, args, RESULTS_DIR)
+    decoder = NDArrayDecoder(threads=args.decode_threads) if args.codec_compare else None
     print(f"Throughput monitor started using protocol: {args.protocol.upper()}. Press Ctrl+C to stop.")
-    try:
-        while True:
-            time.sleep(interval)
-            now = time.time()
-            for pv in CAMERA_PVS:
-                elapsed = now - counters[pv]["last"]
-                if elapsed > 0:
-                    bps = counters[pv]["bytes"] / elapsed
-                    mbps = bps / (1024 * 1024)
-                    with open(results_file, "a", newline="") as f:
-                        writer = csv.writer(f)
-                        writer.writerow([pv, bps, mbps])
-                    counters[pv] = {"bytes": 0, "last": now}
-    except KeyboardInterrupt:
-        print("Stopped throughput monitor.")
-    finally:
-        cleanup_monitors(monitors, backend)
+    t0 = time.monotonic()
+    run_analyzers([analyzer], CAMERA_PVS, args.protocol, payload=args.payload, decoder=decoder)
+    elapsed = time.monotonic() - t0
+    print("Stopped throughput monitor.")
+
+    if decoder is not None:
+        rows = decoder.report(elapsed)
+        per_pv_file = os.path.join(RESULTS_DIR, "codec_throughput.csv")
+        summary_file = os.path.join(RESULTS_DIR, "codec_summary.csv")
+        summary = codec_summary(rows, args.cameras, args.link_gbps)
+        for path, data in ((per_pv_file, rows), (summary_file, summary)):
+            with open(path, "w", newline="") as f:
+                if data:
+                    writer = csv.DictWriter(f, fieldnames=list(data[0]))
+                    writer.writeheader()
+                    writer.writerows(data)
+        print(f"\nCodec comparison ({args.cameras} cameras on {args.link_gbps:g} Gbit/s):")
+        for s in summary:
+            print(f"  {s['codec']:6s}: {s['wire_mbps_per_camera']:.2f} MB/s on wire, "
+                  f"{s['decoded_mbps_per_camera']:.2f} MB/s decoded (x{s['compression_ratio']:.2f}), "
+                  f"decode {s['decode_ms_per_frame']:.2f} ms/frame; "
+                  f"link {s[f'link_percent_{args.cameras}_cameras']:.0f}%, "
+                  f"decode cores {s[f'decode_cores_{args.cameras}_cameras']:.2f}")
+        if decoder.dropped:
+            print(f"  Frames dropped waiting for decode: {decoder.dropped}")
+        print(f"Per-PV codec results saved to: {per_pv_file}")
+        print(f"Codec summary saved to: {summary_file}")
 
 
 if __name__ == "__main__":
@@ -6,34 +6,69 @@ import threading
 import psutil
 from config import CAMERA_PVS, RESULTS_DIR
 from client_utils import create_monitors, cleanup_monitors
+from histogram import LatencyHistogram, save_histograms
+from pv_stats import PVStatsTable
+from live_metrics import add_live_arguments, start_live
+from pipeline import POLICIES, EXECUTORS, WorkerPipeline
+from callback_profile import CallbackProfiler
+from connect_tracker import ConnectionTracker, add_connect_arguments
+from resource_sampler import ResourceSampler, add_resource_arguments
+from monitor_options import OverrunCounter, add_monitor_arguments, options_from_args
+from soak import SoakRun, add_soak_arguments, print_summary, summarize, write_report
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+def process_frame(value):
+    """模拟数据处理负载（增加CPU压力）；模块级函数，便于 process 执行器序列化"""
+    if hasattr(value, 'mean'):
+        return value.mean()  # 计算平均值
+    elif hasattr(value, '__iter__'):
+        return sum(value[:100])  # 部分求和
+
+CPU_COLUMNS = ["timestamp", "cpu_percent", "memory_percent", "memory_used_mb", "update_count", "total_data_mb",
+               "interval_p50", "interval_p99"]
+
 class StressTestMonitor:
-    def __init__(self):
-        self.update_count = 0
-        self.total_data_size = 0
+    def __init__(self, pv_names=CAMERA_PVS, live=None, pipeline=None):
         self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.max_interval = 0
-        self.min_interval = float('inf')
-        self.intervals = []
+        # 可选的滑动窗口实时指标（Prometheus 端点 / 终端仪表盘）
+        self.live = live
+        # 可选的处理流水线：回调只把帧放入每 PV 有界队列，由工作线程/进程处理
+        self.pipeline = pipeline
+        # 按 PV 索引的预分配统计表（计数、字节、到达时间、Welford 均值/方差）
+        self.stats = PVStatsTable(pv_names)
+        self.pv_index = self.stats.index
+        # 每个 PV 一个固定大小的对数分桶直方图，内存不随运行时间增长
+        self.histograms = [LatencyHistogram() for _ in pv_names]
+        # IOC 时间戳到回调的延迟，同样按 PV 分开记录
+        self.latency_histograms = [LatencyHistogram() for _ in pv_names]
         self.cpu_data = []
         self.memory_data = []
+        # soak 检查点：上一次检查点时的计数与合并直方图（固定大小）
+        self._window = None
+    
+    def reset(self):
+        """预热结束后清空统计，从此刻开始计量"""
+        self.stats.reset()
+        for h in self.histograms + self.latency_histograms:
+            h.reset()
+        self.cpu_data.clear()
+        self.memory_data.clear()
+        self._window = None
+        self.start_time = time.time()
+    
+    @property
+    def update_count(self):
+        return int(self.stats.count.sum())
+    
+    @property
+    def total_data_size(self):
+        return int(self.stats.bytes.sum())
         
     def on_update(self, pvname, value, timestamp):
         """高强度PV更新处理"""
-        now = time.time()
-        
-        # 计算帧间隔
-        if self.last_update_time is not None:
-            interval = now - self.last_update_time
-            self.intervals.append(interval)
-            self.max_interval = max(self.max_interval, interval)
-            self.min_interval = min(self.min_interval, interval)
-        
-        self.last_update_time = now
-        self.update_count += 1
+        now = time.monotonic()
+        i = self.pv_index[pvname]
         
         # 计算数据大小（压力测试关键指标）
         data_size = 0
@@ -42,16 +77,24 @@ class StressTestMonitor:
         elif hasattr(value, '__len__'):
             data_size = len(value) * 4  # 假设4字节per element
         
-        self.total_data_size += data_size
+        # 按 PV 分别计算帧间隔
+        interval = self.stats.update(i, now, data_size)
+        if interval is not None:
+            self.histograms[i].record(interval)
+        latency = time.time() - timestamp if timestamp else None
+        if latency is not None:
+            self.latency_histograms[i].record(latency)
+        if self.live is not None:
+            self.live.record(i, now, data_size, latency)
         
         # 模拟数据处理负载（增加CPU压力）
         if data_size > 0:
-            # 简单的数据处理操作
+            if self.pipeline is not None:
+                self.pipeline.submit(i, value)
+                return
+            # 简单的数据处理操作（--workers 0：在回调线程内直接处理）
             try:
-                if hasattr(value, 'mean'):
-                    _ = value.mean()  # 计算平均值
-                elif hasattr(value, '__iter__'):
-                    _ = sum(value[:100])  # 部分求和
+                process_frame(value)
             except Exception:
                 pass
     
@@ -63,6 +106,7 @@ class StressTestMonitor:
             try:
                 cpu_percent = psutil.cpu_percent(interval=None)
                 memory_info = psutil.virtual_memory()
+                pct = self.merged_histogram().percentiles((50, 99))
                 
                 self.cpu_data.append({
                     'timestamp': time.time(),
@@ -70,7 +114,9 @@ class StressTestMonitor:
                     'memory_percent': memory_info.percent,
                     'memory_used_mb': memory_info.used / 1024 / 1024,
                     'update_count': self.update_count,
-                    'total_data_mb': self.total_data_size / 1024 / 1024
+                    'total_data_mb': self.total_data_size / 1024 / 1024,
+                    'interval_p50': pct[50],
+                    'interval_p99': pct[99]
                 })
                 
                 time.sleep(interval)
@@ -78,38 +124,107 @@ class StressTestMonitor:
                 print(f"Resource monitoring error: {e}")
                 break
     
+    def checkpoint_window(self):
+        """自上次调用（或 reset）以来的每 PV 更新数/字节数与帧间隔/延迟直方图增量，供 soak 检查点使用"""
+        count, nbytes = self.stats.count.copy(), self.stats.bytes.copy()
+        merged = {'interval': self.merged_histogram(),
+                  'latency': LatencyHistogram.merged(self.latency_histograms)}
+        prev = self._window
+        self._window = (count, nbytes, merged)
+        out = {'updates': count - (prev[0] if prev else 0), 'bytes': nbytes - (prev[1] if prev else 0),
+               'histograms': {}}
+        for name, h in merged.items():
+            delta = h.empty_copy()
+            if prev is None:
+                delta.merge(h)
+            else:
+                delta.counts[:] = h.counts - prev[2][name].counts
+                delta.sync_from_counts()
+                delta.sum = h.sum - prev[2][name].sum
+            out['histograms'][name] = delta.to_dict()
+        return out
+
+    def flush_cpu_data(self, path):
+        """把已采集的资源监控行追加到 CSV 并清空列表（soak 模式下内存不随运行时间增长）"""
+        rows, self.cpu_data = self.cpu_data, []
+        new = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(CPU_COLUMNS)
+            for data in rows:
+                writer.writerow([data[k] for k in CPU_COLUMNS])
+        return {'rows': len(rows)}
+
+    def merged_histogram(self):
+        """所有 PV 帧间隔直方图的合并"""
+        return LatencyHistogram.merged(self.histograms)
+    
     def get_statistics(self):
-        """获取压力测试统计信息"""
+        """获取压力测试统计信息（帧间隔为各 PV 自身的间隔，合并统计）"""
         elapsed = time.time() - self.start_time
-        avg_interval = sum(self.intervals) / len(self.intervals) if self.intervals else 0
+        totals = self.stats.totals()
+        pct = self.merged_histogram().percentiles()
+        lat = LatencyHistogram.merged(self.latency_histograms).percentiles((50, 99))
         
         return {
-            'total_updates': self.update_count,
+            'total_updates': totals['updates'],
             'elapsed_time': elapsed,
-            'avg_update_rate': self.update_count / elapsed if elapsed > 0 else 0,
-            'total_data_mb': self.total_data_size / 1024 / 1024,
-            'avg_throughput_mbps': (self.total_data_size / 1024 / 1024) / elapsed if elapsed > 0 else 0,
-            'avg_interval': avg_interval,
-            'max_interval': self.max_interval if self.max_interval != 0 else 0,
-            'min_interval': self.min_interval if self.min_interval != float('inf') else 0,
-            'interval_stddev': self._calculate_stddev(self.intervals)
+            'avg_update_rate': totals['updates'] / elapsed if elapsed > 0 else 0,
+            'total_data_mb': totals['bytes'] / 1024 / 1024,
+            'avg_throughput_mbps': (totals['bytes'] / 1024 / 1024) / elapsed if elapsed > 0 else 0,
+            'avg_interval': totals['avg_interval'],
+            'max_interval': totals['max_interval'],
+            'min_interval': totals['min_interval'],
+            'interval_stddev': totals['interval_stddev'],
+            'interval_p50': pct[50],
+            'interval_p90': pct[90],
+            'interval_p99': pct[99],
+            'interval_p99_9': pct[99.9],
+            'latency_p50': lat[50],
+            'latency_p99': lat[99]
         }
-    
-    def _calculate_stddev(self, values):
-        if len(values) < 2:
-            return 0
-        mean = sum(values) / len(values)
-        variance = sum((x - mean) ** 2 for x in values) / len(values)
-        return variance ** 0.5
 
 def main():
     parser = argparse.ArgumentParser(description="Stress test for EPICS CA/PVA")
     parser.add_argument("--protocol", choices=["ca", "pva"], default="ca",
                        help="EPICS protocol (default: ca)")
     parser.add_argument("--duration", type=int, default=60,
-                       help="Test duration in seconds (default: 60)")
+                       help="Test duration in seconds (default: 60); with --soak the total over resumed runs")
+    parser.add_argument("--workers", type=int, default=2,
+                       help="数据处理工作线程/进程数；0 表示在回调线程内直接处理 (default: 2)")
+    parser.add_argument("--executor", choices=EXECUTORS, default="thread",
+                       help="处理在工作线程中运行，或由工作线程转发到进程池 (default: thread)")
+    parser.add_argument("--queue-depth", type=int, default=8,
+                       help="每个 PV 待处理帧队列的最大长度 (default: 8)")
+    parser.add_argument("--overflow", choices=POLICIES, default="drop_oldest",
+                       help="队列满时的策略: 丢弃最旧帧/丢弃新帧/阻塞回调 (default: drop_oldest)")
+    parser.add_argument("--profile-callbacks", action="store_true",
+                       help="统计每个 PV 回调耗时、IOC 时间戳到回调入口的间隔及回调线程")
+    parser.add_argument("--trace-sample", type=int, default=0,
+                       help="每 N 次更新采样一次写入 stress_callback_trace.json (0=不写)")
+    add_connect_arguments(parser)
+    add_resource_arguments(parser)
+    add_monitor_arguments(parser)
+    add_live_arguments(parser)
+    add_soak_arguments(parser)
     
     args = parser.parse_args()
+    options = options_from_args(args)
+    
+    # soak 模式：同一目录续跑，本次只运行剩余时长
+    soak = None
+    run_for = args.duration
+    if args.soak:
+        soak = SoakRun(args.soak, CAMERA_PVS, duration=args.duration, checkpoint_interval=args.checkpoint_interval,
+                       memory_interval=args.memory_interval, tracemalloc_frames=args.tracemalloc,
+                       leak_threshold=args.leak_threshold,
+                       metadata={'protocol': args.protocol, 'options': options.metadata()})
+        run_for = soak.remaining
+        if run_for <= 0:
+            print(f"Soak run in {args.soak} already completed {soak.state['elapsed_sec']:.0f} of {args.duration} s")
+            print_summary(summarize(args.soak, args.leak_threshold))
+            return
     
     print(f"Starting stress test:")
     print(f"  Protocol: {args.protocol.upper()}")
@@ -117,19 +232,61 @@ def main():
     print(f"  Monitoring PVs: {len(CAMERA_PVS)}")
     for pv in CAMERA_PVS:
         print(f"    - {pv}")
+    print(f"  Monitor options: {options.metadata()}")
+    if soak is not None:
+        print(f"  Soak: {args.soak} segment {soak.segment}, {run_for:.0f} s remaining, "
+              f"checkpoint every {args.checkpoint_interval:g} s")
+    
+    cpu_file = os.path.join(args.soak, "soak_cpu.csv") if soak else os.path.join(RESULTS_DIR, "stress_cpu.csv")
     
     # 创建压力测试监控器
-    stress_monitor = StressTestMonitor()
+    live, live_closers = start_live(CAMERA_PVS, args)
+    pipeline = None
+    if args.workers > 0:
+        pipeline = WorkerPipeline(CAMERA_PVS, process_frame, workers=args.workers, queue_depth=args.queue_depth,
+                                  policy=args.overflow, executor=args.executor,
+                                  on_depth=live.set_backlog if live is not None else None).start()
+        print(f"  Processing: {args.workers} {args.executor} worker(s), queue depth {args.queue_depth}, "
+              f"overflow {args.overflow}")
+    stress_monitor = StressTestMonitor(live=live, pipeline=pipeline)
+    profiler = CallbackProfiler(CAMERA_PVS, sample_every=args.trace_sample) if args.profile_callbacks else None
+    # 所有 PV 并行连接；全部收到首帧（或超时）并预热后才开始计量
+    tracker = ConnectionTracker(CAMERA_PVS, warmup=args.warmup)
+    # 本进程/各线程 CPU、RSS、网卡字节与包数，与回调收到的负载字节对比得出协议开销
+    sampler = ResourceSampler(args.sample_interval, nic=args.nic, protocol=args.protocol,
+                              payload_source=lambda: stress_monitor.total_data_size,
+                              frames_source=lambda: stress_monitor.update_count,
+                              spill_path=os.path.join(args.soak, f"resources_{soak.segment:03d}.bin") if soak else None)
+    # 服务器/客户端库合并（squash）掉的更新：按 uniqueId 或 IOC 时间戳间隔检测
+    overrun = OverrunCounter(CAMERA_PVS, expected_period=args.expected_period)
+    monitors, backend = [], None
     
     # 启动PV监控（高负载）
     try:
-        monitors, backend = create_monitors(CAMERA_PVS, args.protocol, stress_monitor.on_update)
+        monitors, backend = create_monitors(CAMERA_PVS, args.protocol, stress_monitor.on_update, profiler=profiler,
+                                            tracker=tracker, options=options, overrun=overrun)
         print(f"Monitors created successfully using {args.protocol.upper()}")
+        if args.warmup > 0:
+            print(f"Waiting for all PVs, then warming up for {args.warmup} seconds...")
+        tracker.wait_live(args.connect_timeout)
+        tracker.print_summary()
+        stress_monitor.reset()
+        overrun.reset()
+        sampler.start()
+        if soak is not None:
+            # 每个检查点写入窗口增量（计数、直方图）、本段累计的丢帧与流水线计数以及内存/分配器快照
+            soak.add_source("stress", stress_monitor.checkpoint_window)
+            soak.add_source("cpu", lambda: stress_monitor.flush_cpu_data(cpu_file))
+            soak.add_source("overrun", overrun.summary)
+            if pipeline is not None:
+                soak.add_source("pipeline", lambda: {k: int(sum(v)) for k, v in pipeline.report().items()
+                                                     if k in ('processed', 'dropped')})
+            soak.start()
         
         # 启动资源监控线程
         resource_thread = threading.Thread(
             target=stress_monitor.monitor_resources,
-            args=(args.duration,),
+            args=(run_for,),
             daemon=True
         )
         resource_thread.start()
@@ -137,17 +294,29 @@ def main():
         print("Stress test running... Press Ctrl+C to stop early")
         
         # 运行压力测试
-        time.sleep(args.duration)
+        time.sleep(run_for)
         
     except KeyboardInterrupt:
         print("\nStopping stress test...")
     except Exception as e:
         print(f"Error during stress test: {e}")
     finally:
+        if soak is not None:
+            soak.stop()
+        sampler.stop()
+        overrun.collect_library_stats(monitors)
         cleanup_monitors(monitors, backend)
+        if pipeline is not None:
+            pipeline.close()
+        for closer in live_closers:
+            closer.close()
     
     # 获取统计信息
     stats = stress_monitor.get_statistics()
+    over = overrun.summary()
+    stats['overrun_missed'] = over['missed']
+    stats['overrun_missed_percent'] = over['missed_percent']
+    stats['overrun_events'] = over['overrun_events']
     
     # 保存结果
     results_file = os.path.join(RESULTS_DIR, "stress_test.csv")
@@ -157,16 +326,40 @@ def main():
         for key, value in stats.items():
             writer.writerow([key, value])
     
-    # 保存CPU监控数据
-    cpu_file = os.path.join(RESULTS_DIR, "stress_cpu.csv")
-    with open(cpu_file, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "cpu_percent", "memory_percent", "memory_used_mb", "update_count", "total_data_mb"])
-        for data in stress_monitor.cpu_data:
-            writer.writerow([
-                data['timestamp'], data['cpu_percent'], data['memory_percent'],
-                data['memory_used_mb'], data['update_count'], data['total_data_mb']
-            ])
+    # 保存CPU监控数据（soak 模式下已在各检查点追加到 soak_cpu.csv）
+    if soak is None:
+        if os.path.exists(cpu_file):
+            os.remove(cpu_file)
+        stress_monitor.flush_cpu_data(cpu_file)
+    
+    # 保存每个 PV 的统计（向量化计算）
+    per_pv_file = os.path.join(RESULTS_DIR, "stress_per_pv.csv")
+    with open(per_pv_file, "w", newline="") as f:
+        csv.writer(f).writerows(stress_monitor.stats.rows(stats['elapsed_time']))
+    
+    # 保存每个 PV 的帧间隔直方图（可合并、可重新加载）
+    hist_file = os.path.join(RESULTS_DIR, "stress_histograms.json")
+    save_histograms(hist_file, dict(zip(stress_monitor.stats.pv_names, stress_monitor.histograms)))
+    
+    # 保存进程/线程/网卡采样及协议开销汇总
+    resource_files = sampler.save(os.path.join(RESULTS_DIR, "stress"))
+    
+    # 保存连接/首帧/重连耗时
+    connect_file = os.path.join(RESULTS_DIR, "stress_connect.csv")
+    with open(connect_file, "w", newline="") as f:
+        csv.writer(f).writerows(tracker.rows())
+    
+    # 保存每个 PV 的服务器/库端丢帧（附本次的队列设置，便于对比不同设置）
+    overrun_file = os.path.join(RESULTS_DIR, "stress_overrun.csv")
+    with open(overrun_file, "w", newline="") as f:
+        csv.writer(f).writerows(overrun.rows(options.metadata()))
+    
+    # 保存处理流水线统计（区分传输丢帧与处理丢帧）
+    pipeline_file = None
+    if pipeline is not None:
+        pipeline_file = os.path.join(RESULTS_DIR, "stress_pipeline.csv")
+        with open(pipeline_file, "w", newline="") as f:
+            csv.writer(f).writerows(pipeline.rows())
     
     # 打印结果
     print(f"\nStress Test Results:")
@@ -178,8 +371,50 @@ def main():
     print(f"  Max interval: {stats['max_interval']:.4f} s")
     print(f"  Min interval: {stats['min_interval']:.4f} s")
     print(f"  Interval std dev: {stats['interval_stddev']:.4f} s")
+    print(f"  Interval p50/p90/p99/p99.9: {stats['interval_p50']:.4f} / {stats['interval_p90']:.4f} / "
+          f"{stats['interval_p99']:.4f} / {stats['interval_p99_9']:.4f} s")
+    print(f"  IOC-to-callback latency p50/p99: {stats['latency_p50'] * 1e3:.2f} / {stats['latency_p99'] * 1e3:.2f} ms")
+    per_pv = stress_monitor.stats.report(stats['elapsed_time'])
+    for j, pv in enumerate(per_pv['pv']):
+        print(f"    {pv}: {per_pv['updates'][j]} updates, {per_pv['effective_fps'][j]:.2f} FPS, "
+              f"{per_pv['throughput_mbps'][j]:.2f} MB/s, interval {per_pv['avg_interval'][j]:.4f} "
+              f"± {per_pv['interval_stddev'][j]:.4f} s")
     print(f"Results saved to: {results_file}")
+    print(f"Per-PV results saved to: {per_pv_file}")
     print(f"CPU data saved to: {cpu_file}")
+    print(f"Histograms saved to: {hist_file}")
+    print(f"Resource samples saved to: {', '.join(resource_files)}")
+    overrun.print_summary()
+    print(f"Overrun counts saved to: {overrun_file}")
+    sampler.print_summary()
+    connect = tracker.summary()
+    print(f"Connection timings saved to: {connect_file} (all live after {connect['all_live_ms']:.1f} ms, "
+          f"{connect['reconnects']} reconnects)")
+    if pipeline is not None:
+        rep = pipeline.report()
+        print(f"\nProcessing pipeline ({args.workers} {args.executor} workers, {args.overflow}):")
+        for j, pv in enumerate(rep['pv']):
+            print(f"    {pv}: received {per_pv['updates'][j]}, processed {rep['processed'][j]}, "
+                  f"dropped {rep['dropped'][j]} ({rep['drop_percent'][j]:.2f}%), max depth {rep['max_depth'][j]}, "
+                  f"wait p50/p99 {rep['wait_p50'][j] * 1e3:.2f}/{rep['wait_p99'][j] * 1e3:.2f} ms, "
+                  f"service p50/p99 {rep['service_p50'][j] * 1e3:.2f}/{rep['service_p99'][j] * 1e3:.2f} ms, "
+                  f"blocked {rep['blocked_sec'][j]:.2f} s")
+        print(f"Pipeline stats saved to: {pipeline_file}")
+    if profiler is not None:
+        profile_file = os.path.join(RESULTS_DIR, "stress_callback_profile.csv")
+        with open(profile_file, "w", newline="") as f:
+            csv.writer(f).writerows(profiler.rows())
+        print(f"Callback profile saved to: {profile_file}")
+        if args.trace_sample > 0:
+            trace_file = os.path.join(RESULTS_DIR, "stress_callback_trace.json")
+            n = profiler.save_trace(trace_file)
+            print(f"Callback trace ({n} sampled events) saved to: {trace_file}")
+    if soak is not None:
+        # 整个 soak 运行（含之前各段）的汇总与泄漏判断
+        print()
+        summary = summarize(args.soak, args.leak_threshold)
+        print_summary(summary)
+        print(f"Soak report saved to: {', '.join(write_report(summary, os.path.join(args.soak, 'soak')))}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
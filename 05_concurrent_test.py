@@ -2,36 +2,77 @@ import time
 import csv
 import os
 import argparse
+import signal
 import threading
-import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 from config import CAMERA_PVS, RESULTS_DIR
 from client_utils import create_monitors, cleanup_monitors
+from connect_tracker import ConnectionTracker, add_connect_arguments
+from histogram import LatencyHistogram, save_histograms
+from column_buffer import ColumnBuffer
+from live_metrics import add_live_arguments, start_live
+import results_store
+from results_store import RUN_METADATA, result_path, run_metadata, write_frame
+from resource_sampler import ResourceSampler, add_resource_arguments
+from monitor_options import add_monitor_arguments, options_from_args
+from relay import add_relay_arguments
 import psutil
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
-# 全局队列存储测试结果
-result_queue = queue.Queue()
+# 每个客户端的详细记录列（预分配、可增长的类型化列，替代全局队列中的逐条 dict）
+DETAIL_COLUMNS = [("timestamp", "f8"), ("pv_index", "i4"), ("data_size", "i8"), ("data_count", "i8")]
+
+# 多进程模式共享内存布局：每个客户端分片一行计数器 + 一行帧间隔直方图
+SHM_FIELDS = ("data_count", "data_bytes", "first_update", "last_update", "interval_sum", "started")
+F_COUNT, F_BYTES, F_FIRST, F_LAST, F_ISUM, F_STARTED = range(len(SHM_FIELDS))
+HIST_LAYOUT = dict(max_value=60.0, significant_figures=2)
+# Ctrl+C 时等待工作进程写完详细记录的最长秒数，超时后强制终止
+STOP_TIMEOUT = 30.0
 
 class ConcurrentClient:
     """并发客户端类，用于模拟多个客户端同时访问PV"""
     
-    def __init__(self, client_id, pv_list, protocol):
+    def __init__(self, client_id, pv_list, protocol, counters=None, histogram=None,
+                 spill_dir=None, spill_rows=1 << 20, live=None, options=None, warmup=0.0):
+        """
+        counters: 可选，共享内存中本客户端的计数器行（多进程模式，父进程实时汇总）
+        histogram: 可选，记录每个 PV 帧间隔的 LatencyHistogram
+        spill_dir: 可选，详细记录按块溢写到该目录，内存占用保持有界
+        live: 可选，LiveMetrics（行名为 client<N>/<pv>），运行期间提供滑动窗口实时指标
+        options: 可选，MonitorOptions（PVA queueSize/pipeline、CA 事件掩码、EPICS_CA_MAX_ARRAY_BYTES）
+        warmup: 本客户端所有 PV 收到首帧后再预热的秒数；在 start_measuring() 之前的更新不计入统计
+        """
         self.client_id = client_id
         self.pv_list = pv_list
         self.protocol = protocol
+        self.options = options
         self.monitors = []
         self.backend = None
         self.data_count = 0
+        self.data_bytes = 0
         self.start_time = time.time()
         self.last_update_time = time.time()
+        self.counters = counters
+        self.histogram = histogram
+        self.pv_last = {pv: None for pv in pv_list}
+        self.pv_index = {pv: i for i, pv in enumerate(pv_list)}
+        self.lock = threading.Lock()
+        spill_path = None
+        if spill_dir:
+            spill_path = os.path.join(spill_dir, f"client{client_id}_{os.getpid()}_{id(self):x}.bin")
+        self.detail = ColumnBuffer(DETAIL_COLUMNS, spill_path=spill_path, spill_rows=spill_rows)
+        self.live = live
+        self.live_index = {pv: live.index[live_row(client_id, pv)] for pv in pv_list} if live else None
+        # 所有 PV 并行连接；收到首帧并预热后才把更新交给 on_update
+        self.tracker = ConnectionTracker(pv_list, warmup=warmup)
         
     def on_update(self, pvname, value, timestamp):
         """PV更新回调函数"""
         now = time.time()
-        self.data_count += 1
-        self.last_update_time = now
         
         # 计算数据大小（估算）
         data_size = 0
@@ -40,26 +81,59 @@ class ConcurrentClient:
         elif hasattr(value, '__len__'):
             data_size = len(value) * 4  # 假设4字节per element
         
-        # 记录结果
-        result_queue.put({
-            'client_id': self.client_id,
-            'pvname': pvname,
-            'timestamp': now,
-            'data_size': data_size,
-            'data_count': self.data_count
-        })
+        # 同一客户端的多个 PV 可能在不同回调线程中更新
+        with self.lock:
+            self.data_count += 1
+            self.data_bytes += data_size
+            self.last_update_time = now
+            
+            # 记录结果（写入本客户端的列缓冲区）；缓冲区满时只在锁内换出，溢写在锁外进行
+            full = self.detail.append_deferred(now, self.pv_index[pvname], data_size, self.data_count)
+            
+            if self.histogram is not None or self.counters is not None:
+                last = self.pv_last[pvname]
+                self.pv_last[pvname] = now
+                interval = now - last if last is not None else None
+                if interval is not None and self.histogram is not None:
+                    self.histogram.record(interval)
+                c = self.counters
+                if c is not None:
+                    c[F_COUNT] += 1
+                    c[F_BYTES] += data_size
+                    c[F_LAST] = now
+                    if c[F_FIRST] == 0:
+                        c[F_FIRST] = now
+                    if interval is not None:
+                        c[F_ISUM] += interval
+        
+        if full is not None:
+            self.detail.write_chunk(full)
+        
+        if self.live is not None:
+            latency = now - timestamp if timestamp else None
+            self.live.record(self.live_index[pvname], time.monotonic(), data_size, latency)
     
     def start_monitoring(self):
         """启动监控"""
         try:
             self.monitors, self.backend = create_monitors(
-                self.pv_list, self.protocol, self.on_update
+                self.pv_list, self.protocol, self.on_update, options=self.options, tracker=self.tracker
             )
             return True
         except Exception as e:
             print(f"Client {self.client_id} failed to start: {e}")
             return False
     
+    def start_measuring(self, timeout):
+        """等待所有 PV 收到首帧（或超时）并预热，然后开始计量；返回仍未收到首帧的 PV"""
+        missing = self.tracker.wait_live(timeout)
+        with self.lock:
+            self.start_time = self.last_update_time = time.time()
+        if missing:
+            print(f"Client {self.client_id}: no update from {len(missing)} PV(s) after {timeout:g} s: "
+                  f"{', '.join(missing)}")
+        return missing
+    
     def stop_monitoring(self):
         """停止监控"""
         try:
@@ -73,13 +147,26 @@ class ConcurrentClient:
         return {
             'client_id': self.client_id,
             'data_count': self.data_count,
+            'data_bytes': self.data_bytes,
             'elapsed_time': elapsed,
             'avg_rate': self.data_count / elapsed if elapsed > 0 else 0
         }
 
-def run_client(client_id, pv_list, protocol, duration):
-    """运行单个并发客户端"""
-    client = ConcurrentClient(client_id, pv_list, protocol)
+def live_row(client_id, pv):
+    """线程模式实时指标中每个 客户端/PV 的行名"""
+    return f"client{client_id}/{pv}"
+
+def run_client(client_id, pv_list, protocol, duration, spill_dir=None, live=None, registry=None, options=None,
+               connect_timeout=10.0, warmup=0.0):
+    """运行单个并发客户端，返回客户端对象（统计信息及详细记录）
+
+    registry: 可选列表，客户端创建后立即加入（供资源采样器实时读取负载字节数）
+    计量（及 duration）在本客户端所有 PV 收到首帧并预热 warmup 秒后才开始
+    """
+    client = ConcurrentClient(client_id, pv_list, protocol, spill_dir=spill_dir, live=live, options=options,
+                              warmup=warmup)
+    if registry is not None:
+        registry.append(client)
     
     if not client.start_monitoring():
         return None
@@ -87,18 +174,236 @@ def run_client(client_id, pv_list, protocol, duration):
     print(f"Client {client_id} started monitoring {len(pv_list)} PVs")
     
     try:
+        client.start_measuring(connect_timeout)
         time.sleep(duration)
     except KeyboardInterrupt:
         pass
     finally:
         client.stop_monitoring()
     
-    return client.get_stats()
+    return client
+
+def pin_to_core(core):
+    """把当前进程绑定到指定 CPU 核"""
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {core})
+        else:
+            psutil.Process().cpu_affinity([core])
+        return True
+    except Exception as e:
+        print(f"Could not pin to core {core}: {e}")
+        return False
+
+
+def shm_layout(n_rows):
+    """共享内存块大小及各部分的 numpy 视图构造参数"""
+    hist_len = LatencyHistogram.counts_len_for(**HIST_LAYOUT)
+    counters_bytes = n_rows * len(SHM_FIELDS) * 8
+    hist_bytes = n_rows * hist_len * 8
+    return hist_len, counters_bytes, counters_bytes + hist_bytes
+
+
+def shm_views(shm, n_rows):
+    hist_len, counters_bytes, _ = shm_layout(n_rows)
+    counters = np.ndarray((n_rows, len(SHM_FIELDS)), dtype=np.float64, buffer=shm.buf)
+    hists = np.ndarray((n_rows, hist_len), dtype=np.int64, buffer=shm.buf, offset=counters_bytes)
+    return counters, hists
+
+
+def process_worker(worker_id, shm_name, n_rows, specs, protocol, duration, core, spill_dir=None,
+                   results_format="csv", metadata=None, options=None, connect_timeout=10.0, warmup=0.0,
+                   stop=None):
+    """工作进程：运行分配到的客户端分片，计数和直方图写入共享内存
+
+    specs: [(row, client_id, pv_list), ...]
+    stop: 父进程设置的停止事件；Ctrl+C 由父进程处理，工作进程收到停止事件后正常收尾并写出详细记录
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop = stop if stop is not None else threading.Event()
+    RUN_METADATA.update(metadata or {}, worker_id=worker_id, worker_pid=os.getpid())
+    if core is not None:
+        pin_to_core(core)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        counters, hists = shm_views(shm, n_rows)
+        clients = []
+        for row, client_id, pv_list in specs:
+            client = ConcurrentClient(client_id, pv_list, protocol, counters=counters[row],
+                                      histogram=LatencyHistogram(counts=hists[row], **HIST_LAYOUT),
+                                      spill_dir=spill_dir, options=options, warmup=warmup)
+            if client.start_monitoring():
+                counters[row, F_STARTED] = 1
+                clients.append(client)
+        print(f"Worker {worker_id} (core {core}) started {len(clients)} client shard(s)")
+        try:
+            # 各分片并行等待首帧与预热，全部开始计量后再计时
+            waiters = [threading.Thread(target=c.start_measuring, args=(connect_timeout,), daemon=True)
+                       for c in clients]
+            for t in waiters:
+                t.start()
+            for t in waiters:
+                while t.is_alive() and not stop.is_set():
+                    t.join(0.1)
+            stop.wait(duration)
+        finally:
+            for client in clients:
+                client.stop_monitoring()
+        # 工作进程各自写出自己的详细记录
+        write_detail_file(result_path(RESULTS_DIR, f"concurrent_detail_w{worker_id}", results_format), clients)
+        del counters, hists
+    finally:
+        shm.close()
+
+
+def build_shards(client_pvs, n_workers, shard):
+    """把客户端（或每个客户端的 PV 分组）分配到工作进程
+
+    返回 [[(row, client_id, pv_list), ...] per worker]
+    """
+    workers = [[] for _ in range(n_workers)]
+    row = 0
+    for client_id, pvs in enumerate(client_pvs):
+        if shard == "pvs":
+            chunks = [pvs[k::n_workers] for k in range(n_workers)]
+            for k, chunk in enumerate(chunks):
+                if chunk:
+                    workers[k].append((row, client_id, chunk))
+                    row += 1
+        else:
+            workers[client_id % n_workers].append((row, client_id, pvs))
+            row += 1
+    return workers, row
 
-def monitor_system_resources(duration, interval=1.0):
-    """监控系统资源使用情况"""
-    cpu_data = []
-    memory_data = []
+
+def run_process_mode(client_pvs, args, sampler=None):
+    """多进程模式：客户端分布到多个绑定 CPU 核的工作进程，父进程通过共享内存实时汇总
+
+    sampler: 可选 ResourceSampler，从共享内存计数器读取负载字节数；共享内存释放前停止采样
+    """
+    n_workers = args.processes or os.cpu_count() or 1
+    if args.shard == "clients":
+        n_workers = min(n_workers, len(client_pvs))
+    shards, n_rows = build_shards(client_pvs, n_workers, args.shard)
+    _, _, size = shm_layout(n_rows)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    counters, hists = shm_views(shm, n_rows)
+    counters[:] = 0
+    hists[:] = 0
+    if sampler is not None:
+        sampler.set_sources(payload=lambda: counters[:, F_BYTES].sum(), frames=lambda: counters[:, F_COUNT].sum())
+    row_client = np.zeros(n_rows, dtype=np.int64)
+    for spec_list in shards:
+        for row, client_id, _ in spec_list:
+            row_client[row] = client_id
+
+    ncpu = os.cpu_count() or 1
+    ctx = mp.get_context("spawn")  # EPICS 客户端库的线程不能安全地跨 fork 继承
+    procs = []
+    stop = ctx.Event()
+    for w, specs in enumerate(shards):
+        if not specs:
+            continue
+        core = w % ncpu if args.pin_cores else None
+        p = ctx.Process(target=process_worker, name=f"concurrent-worker-{w}",
+                        args=(w, shm.name, n_rows, specs, args.protocol, args.duration, core, args.spill_dir,
+                              args.results_format, dict(RUN_METADATA), options_from_args(args),
+                              args.connect_timeout, args.warmup, stop))
+        p.start()
+        procs.append(p)
+    print(f"Started {len(procs)} worker processes ({args.shard} sharding, {n_rows} shards)")
+
+    hist = LatencyHistogram(**HIST_LAYOUT)
+    start = time.time()
+    last_count = 0
+    last_t = start
+    try:
+        while any(p.is_alive() for p in procs):
+            time.sleep(1.0)
+            now = time.time()
+            total = counters[:, F_COUNT].sum()
+            mb = counters[:, F_BYTES].sum() / 1024 / 1024
+            hist.counts[:] = hists.sum(axis=0)
+            hist.sync_from_counts()
+            rate = (total - last_count) / (now - last_t)
+            last_count, last_t = total, now
+            print(f"  [{now - start:6.1f}s] updates={int(total)} rate={rate:.1f} Hz data={mb:.1f} MB "
+                  f"interval p50={hist.percentile(50) * 1e3:.1f} ms p99={hist.percentile(99) * 1e3:.1f} ms")
+    except KeyboardInterrupt:
+        print("\nStopping concurrent test...")
+        # 先通知工作进程收尾（停止监控、写出详细记录），超时仍未退出的才强制终止
+        stop.set()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for p in procs:
+            p.join(max(0.0, deadline - time.monotonic()))
+        for p in procs:
+            if p.is_alive():
+                print(f"Worker {p.name} did not stop within {STOP_TIMEOUT:g} s, terminating")
+                p.terminate()
+    for p in procs:
+        p.join()
+
+    # 按客户端汇总各分片
+    client_stats = []
+    client_hists = {}
+    for client_id in range(len(client_pvs)):
+        rows = np.nonzero(row_client == client_id)[0]
+        c = counters[rows]
+        if not c[:, F_STARTED].any():
+            continue
+        count = int(c[:, F_COUNT].sum())
+        firsts = c[:, F_FIRST][c[:, F_FIRST] > 0]
+        elapsed = (c[:, F_LAST].max() - firsts.min()) if len(firsts) else 0
+        client_stats.append({
+            'client_id': client_id,
+            'data_count': count,
+            'data_bytes': int(c[:, F_BYTES].sum()),
+            'elapsed_time': elapsed,
+            'avg_rate': count / elapsed if elapsed > 0 else 0
+        })
+        h = LatencyHistogram(**HIST_LAYOUT)
+        h.counts[:] = hists[rows].sum(axis=0)
+        h.sync_from_counts()
+        client_hists[f"client{client_id}"] = h
+
+    hist.counts[:] = hists.sum(axis=0)
+    hist.sync_from_counts()
+    client_hists["all"] = hist
+    save_histograms(os.path.join(RESULTS_DIR, "concurrent_histograms.json"), client_hists)
+
+    if sampler is not None:
+        sampler.stop()
+    del counters, hists
+    shm.close()
+    shm.unlink()
+    return client_stats
+
+
+def write_detail_file(detail_file, clients):
+    """把各客户端的列缓冲区一次性向量化写入详细数据文件（格式由扩展名决定：csv/parquet/h5，PV 名按字典编码）"""
+    import pandas as pd
+    
+    frames = []
+    for client in clients:
+        cols = client.detail.to_arrays()
+        names = np.asarray(client.pv_list, dtype=object)
+        frames.append(pd.DataFrame({
+            'client_id': np.full(len(cols['timestamp']), client.client_id, dtype=np.int32),
+            'pvname': pd.Categorical.from_codes(cols['pv_index'], categories=names) if len(names) else [],
+            'timestamp': cols['timestamp'],
+            'data_size': cols['data_size'],
+            'data_count': cols['data_count'],
+        }))
+        client.detail.close(remove_spill=True)
+    columns = ["client_id", "pvname", "timestamp", "data_size", "data_count"]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    write_frame(detail_file, df[columns], categorical=["pvname"])
+
+
+def monitor_system_resources(duration, interval=1.0, cpu_data=None):
+    """监控系统资源使用情况；cpu_data 为可选的输出列表，采样随时追加（提前结束时已有数据不丢失）"""
+    if cpu_data is None:
+        cpu_data = []
     
     start_time = time.time()
     while time.time() - start_time < duration:
@@ -119,6 +424,52 @@ def monitor_system_resources(duration, interval=1.0):
     
     return cpu_data
 
+def run_thread_mode(client_pvs, args, clients, sampler=None):
+    """线程模式：所有客户端在同一进程的线程池中运行（共享一个 GIL）
+
+    clients: 输出列表，收集已完成的客户端对象（用于写出详细记录）
+    sampler: 可选 ResourceSampler，实时读取各客户端的负载字节数和更新数
+    """
+    client_stats = []
+    running = []
+    if sampler is not None:
+        sampler.set_sources(payload=lambda: sum(c.data_bytes for c in list(running)),
+                            frames=lambda: sum(c.data_count for c in list(running)))
+    rows = [live_row(i, pv) for i in range(args.clients) for pv in client_pvs[i]]
+    live, live_closers = start_live(rows, args)
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        # 提交所有客户端任务
+        futures = {
+            executor.submit(run_client, i, client_pvs[i], args.protocol, args.duration, args.spill_dir, live,
+                            running, options_from_args(args), args.connect_timeout, args.warmup): i
+            for i in range(args.clients)
+        }
+        
+        try:
+            # 等待所有任务完成
+            for future in as_completed(futures):
+                client_id = futures[future]
+                try:
+                    client = future.result()
+                    if client:
+                        clients.append(client)
+                        stats = client.get_stats()
+                        client_stats.append(stats)
+                        print(f"Client {client_id} completed: {stats['data_count']} updates, "
+                              f"avg rate: {stats['avg_rate']:.2f} Hz")
+                except Exception as e:
+                    print(f"Client {client_id} failed: {e}")
+        
+        except KeyboardInterrupt:
+            print("\nStopping concurrent test...")
+            # 等待当前任务完成
+            for future in futures:
+                future.cancel()
+    for closer in live_closers:
+        closer.close()
+    return client_stats
+
+
 def main():
     parser = argparse.ArgumentParser(description="Concurrent test for EPICS CA/PVA")
     parser.add_argument("--protocol", choices=["ca", "pva"], default="ca", 
@@ -129,13 +480,40 @@ def main():
                        help="Test duration in seconds (default: 60)")
     parser.add_argument("--pv-per-client", type=int, default=0,
                        help="PVs per client (0 = all PVs per client)")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread",
+                       help="thread: 所有客户端在一个进程的线程池中 (默认); process: 分布到多个工作进程")
+    parser.add_argument("--processes", type=int, default=0,
+                       help="process 模式的工作进程数 (0 = CPU 核数)")
+    parser.add_argument("--shard", choices=["clients", "pvs"], default="clients",
+                       help="process 模式分片方式: 按客户端或按每个客户端的 PV 分组")
+    parser.add_argument("--pin-cores", action="store_true",
+                       help="process 模式下把每个工作进程绑定到一个 CPU 核")
+    parser.add_argument("--spill-dir", default=None,
+                       help="运行期间把详细记录按块溢写到该目录（长时间/高速率测试时限制内存）")
+    parser.add_argument("--results-format", choices=list(results_store.FORMATS), default=results_store.DEFAULT_FORMAT,
+                       help="详细记录的文件格式 (默认取环境变量 RESULTS_FORMAT，未设置时为 csv)")
+    parser.add_argument("--route", choices=["direct", "relay"], default="direct",
+                       help="direct: 每个客户端直接订阅 IOC (默认); relay: 本进程启动 PVA 转发器，每个 PV 只向 IOC 订阅一次，客户端订阅转发器")
+    add_resource_arguments(parser)
+    add_monitor_arguments(parser, overrun=False)
+    add_connect_arguments(parser)
+    add_relay_arguments(parser)
+    add_live_arguments(parser)
     
     args = parser.parse_args()
+    if args.route == "relay" and args.protocol != "pva":
+        parser.error("--route relay 需要 --protocol pva（转发器上下游均为 PVA）")
+    RUN_METADATA.update(run_metadata(args.protocol, CAMERA_PVS, clients=args.clients, mode=args.mode,
+                                     route=args.route, **options_from_args(args).metadata()))
     
     print(f"Starting concurrent test:")
     print(f"  Protocol: {args.protocol.upper()}")
+    print(f"  Mode: {args.mode}")
+    print(f"  Route: {args.route}")
     print(f"  Concurrent clients: {args.clients}")
     print(f"  Duration: {args.duration} seconds")
+    if args.warmup > 0:
+        print(f"  Warm-up: {args.warmup} seconds after all PVs of a client are live")
     print(f"  Total PVs: {len(CAMERA_PVS)}")
     
     # 分配PV给各个客户端
@@ -150,40 +528,45 @@ def main():
         # 所有客户端监控所有PV
         client_pvs = [CAMERA_PVS] * args.clients
     
-    # 启动系统资源监控线程
+    # relay 模式：转发器只订阅客户端用到的 PV 各一次，客户端改为订阅转发后的名称
+    relay = None
+    direct_subscriptions = sum(len(pvs) for pvs in client_pvs)
+    if args.route == "relay":
+        from relay import PvaRelay
+        used = [pv for pv in CAMERA_PVS if any(pv in pvs for pvs in client_pvs)]
+        slots = args.clients if args.relay_slots is None else args.relay_slots
+        relay = PvaRelay(used, prefix=args.relay_prefix, slots=slots, queue_depth=args.relay_queue,
+                         policy=args.relay_policy, options=options_from_args(args)).start()
+        client_pvs = [relay.downstream_names(i if relay.slots else None, pvs) for i, pvs in enumerate(client_pvs)]
+        RUN_METADATA.update(relay_slots=relay.slots, relay_queue=args.relay_queue, relay_policy=args.relay_policy)
+        print(f"  Relay: {len(used)} upstream PVs -> "
+              f"{f'{relay.slots} per-client slot(s)' if relay.slots else 'shared downstream PVs'} ({args.relay_prefix}...)")
+    
+    # 启动系统资源监控线程（结果收集到 system_data，测试结束后写出）
+    system_data = []
     resource_thread = threading.Thread(
-        target=lambda: monitor_system_resources(args.duration),
+        target=monitor_system_resources,
+        args=(args.duration,),
+        kwargs={'cpu_data': system_data},
         daemon=True
     )
     resource_thread.start()
+    # 本进程（process 模式含工作进程）及各线程 CPU、RSS、网卡计数器与负载字节数
+    sampler = ResourceSampler(args.sample_interval, nic=args.nic, include_children=args.mode == "process",
+                              protocol=args.protocol).start()
     
-    # 使用线程池运行并发客户端
-    client_stats = []
-    with ThreadPoolExecutor(max_workers=args.clients) as executor:
-        # 提交所有客户端任务
-        futures = {
-            executor.submit(run_client, i, client_pvs[i], args.protocol, args.duration): i
-            for i in range(args.clients)
-        }
-        
-        try:
-            # 等待所有任务完成
-            for future in as_completed(futures):
-                client_id = futures[future]
-                try:
-                    stats = future.result()
-                    if stats:
-                        client_stats.append(stats)
-                        print(f"Client {client_id} completed: {stats['data_count']} updates, "
-                              f"avg rate: {stats['avg_rate']:.2f} Hz")
-                except Exception as e:
-                    print(f"Client {client_id} failed: {e}")
-        
-        except KeyboardInterrupt:
-            print("\nStopping concurrent test...")
-            # 等待当前任务完成
-            for future in futures:
-                future.cancel()
+    if args.mode == "process":
+        client_stats = run_process_mode(client_pvs, args, sampler)
+        for stats in sorted(client_stats, key=lambda s: s['client_id']):
+            print(f"Client {stats['client_id']} completed: {stats['data_count']} updates, "
+                  f"avg rate: {stats['avg_rate']:.2f} Hz")
+    else:
+        clients = []
+        client_stats = run_thread_mode(client_pvs, args, clients, sampler)
+    sampler.stop()
+    resource_thread.join(timeout=2.0)
+    if relay is not None:
+        relay.close()
     
     # 保存结果
     results_file = os.path.join(RESULTS_DIR, "concurrent_test.csv")
@@ -200,25 +583,43 @@ def main():
                 stats['avg_rate']
             ])
     
-    # 保存详细数据记录
-    detail_file = os.path.join(RESULTS_DIR, "concurrent_detail.csv")
-    with open(detail_file, "w", newline="") as f:
+    # 保存详细数据记录（process 模式下由各工作进程写入 concurrent_detail_w<N>.csv）
+    if args.mode == "process":
+        detail_file = result_path(RESULTS_DIR, "concurrent_detail_w*", args.results_format)
+    else:
+        detail_file = result_path(RESULTS_DIR, "concurrent_detail", args.results_format)
+        write_detail_file(detail_file, clients)
+    
+    # 保存系统资源数据
+    system_file = os.path.join(RESULTS_DIR, "concurrent_cpu.csv")
+    with open(system_file, "w", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(["client_id", "pvname", "timestamp", "data_size", "data_count"])
-        
-        # 处理队列中的所有结果
-        while not result_queue.empty():
-            try:
-                result = result_queue.get_nowait()
-                writer.writerow([
-                    result['client_id'],
-                    result['pvname'],
-                    result['timestamp'],
-                    result['data_size'],
-                    result['data_count']
-                ])
-            except queue.Empty:
-                break
+        writer.writerow(["timestamp", "cpu_percent", "memory_percent", "memory_used_mb"])
+        for data in system_data:
+            writer.writerow([data['timestamp'], data['cpu_percent'], data['memory_percent'], data['memory_used_mb']])
+    resource_files = sampler.save(os.path.join(RESULTS_DIR, "concurrent"))
+    
+    # IOC 侧负载：direct 时等于各客户端收到的总和；relay 时为转发器的上游订阅
+    client_frames = sum(s['data_count'] for s in client_stats)
+    client_bytes = sum(s.get('data_bytes', 0) for s in client_stats)
+    route = {'route': args.route, 'clients': args.clients, 'client_subscriptions': direct_subscriptions,
+             'client_frames': client_frames, 'client_mb': client_bytes / 1024 / 1024,
+             'ioc_subscriptions': direct_subscriptions, 'ioc_frames': client_frames,
+             'ioc_mb': client_bytes / 1024 / 1024, 'relay_backlog_dropped': 0,
+             'relay_added_p50_ms': None, 'relay_added_p99_ms': None}
+    if relay is not None:
+        rs = relay.summary()
+        route.update(ioc_subscriptions=rs['upstream_subscriptions'], ioc_frames=rs['upstream_frames'],
+                     ioc_mb=rs['upstream_bytes'] / 1024 / 1024, relay_backlog_dropped=rs['backlog_dropped'],
+                     relay_added_p50_ms=rs['added_p50_ms'], relay_added_p99_ms=rs['added_p99_ms'])
+        relay_file = os.path.join(RESULTS_DIR, "concurrent_relay.csv")
+        with open(relay_file, "w", newline="") as f:
+            csv.writer(f).writerows(relay.rows())
+    route_file = os.path.join(RESULTS_DIR, "concurrent_route.csv")
+    with open(route_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(route))
+        writer.writeheader()
+        writer.writerow(route)
     
     # 打印总结
     if client_stats:
@@ -230,6 +631,19 @@ def main():
         print(f"  Average rate per client: {avg_rate_per_client:.2f} Hz")
         print(f"  Results saved to: {results_file}")
         print(f"  Detailed data saved to: {detail_file}")
+        print(f"  System resources saved to: {system_file}")
+        print(f"  Resource samples saved to: {', '.join(resource_files)}")
+        print(f"  Route summary saved to: {route_file}")
+        sampler.print_summary()
+    
+    print(f"IOC side ({args.route}): {route['ioc_subscriptions']} subscriptions, {route['ioc_frames']} frames, "
+          f"{route['ioc_mb']:.1f} MB sent (clients received {client_frames} frames, {route['client_mb']:.1f} MB "
+          f"over {direct_subscriptions} subscriptions)")
+    if relay is not None:
+        if route['client_mb']:
+            print(f"  Relay saved {(1 - route['ioc_mb'] / route['client_mb']) * 100:.0f}% of the IOC uplink")
+        print(f"  Relay details saved to: {relay_file}")
+        relay.print_summary()
     
     print("Concurrent test completed.")
 
@@ -1,3 +1,5 @@
+import os
+
 # 相机 IMAGE PV 列表
 CAMERA_PVS = [
     "13ARV222:image1:ArrayData",
@@ -6,5 +8,9 @@ CAMERA_PVS = [
     # ... 可以继续添加直到 20+ 个相机
 ]
 
+# 可通过环境变量 CAMERA_PVS（逗号分隔）覆盖，例如指向 08_sim_ioc.py 模拟的相机
+if os.environ.get("CAMERA_PVS"):
+    CAMERA_PVS = [pv.strip() for pv in os.environ["CAMERA_PVS"].split(",") if pv.strip()]
+
 # 输出目录
-RESULTS_DIR = "results"
+RESULTS_DIR = os.environ.get("RESULTS_DIR") or "results"
@@ -5,27 +5,8 @@ param(
 
 if (-not (Test-Path -Path 'results')) { New-Item -ItemType Directory -Path 'results' | Out-Null }
 
-Write-Host "Running latency monitor (protocol=$Protocol)..."
-$lat = Start-Process -FilePath python -ArgumentList '01_latency_monitor.py','--protocol', $Protocol -PassThru
-
-Write-Host "Running throughput monitor (protocol=$Protocol)..."
-$thr = Start-Process -FilePath python -ArgumentList '02_throughput.py','--protocol', $Protocol -PassThru
-
-Write-Host "Running packet loss monitor (protocol=$Protocol)..."
-$loss = Start-Process -FilePath python -ArgumentList '03_packetloss.py','--protocol', $Protocol -PassThru
-
-Write-Host "Running CPU monitor ..."
-$cpu = Start-Process -FilePath python -ArgumentList '04_cpu.py' -PassThru
-
+# 单进程运行所有分析器：每个 PV 只订阅一次，更新分发给 latency/throughput/loss/resources
+Write-Host "Running latency, throughput, packet loss and CPU analyzers (protocol=$Protocol)..."
 Write-Host "Press Ctrl+C to stop all tests."
-try {
-    while ($true) { Start-Sleep -Seconds 1 }
-}
-finally {
-    foreach ($p in @($lat,$thr,$loss,$cpu)) {
-        if ($p -and -not $p.HasExited) {
-            try { $p.Kill() } catch {}
-        }
-    }
-    Write-Host "All processes terminated."
-}
+python 06_run_all.py --protocol $Protocol @args
+Write-Host "All analyzers stopped."
@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import csv
+import importlib
+import os
+from config import CAMERA_PVS, RESULTS_DIR
+from client_utils import PAYLOAD_MODES
+from analyzers import ANALYZERS, add_analyzer_arguments, make_analyzers, run_analyzers, run_analyzers_async
+from callback_profile import CallbackProfiler
+from connect_tracker import ConnectionTracker, add_connect_arguments
+from monitor_options import OverrunCounter, add_monitor_arguments, options_from_args
+import results_store
+
+DEFAULT_ANALYZERS = "latency,throughput,loss,resources"
+
+
+def main():
+    # 先解析 --plugin，使插件中注册的分析器参数也能出现在 --help 中
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument("--plugin", action="append", default=[])
+    known, _ = pre.parse_known_args()
+    for module in known.plugin:
+        importlib.import_module(module)
+
+    parser = argparse.ArgumentParser(description="Run all analyzers on a single subscription per PV")
+    parser.add_argument("--protocol", choices=["ca", "pva"], default="ca", help="EPICS protocol (default: ca)")
+    parser.add_argument("--analyzers", default=DEFAULT_ANALYZERS,
+                        help=f"逗号分隔的分析器列表 (default: {DEFAULT_ANALYZERS}; 可用: {', '.join(ANALYZERS)})")
+    parser.add_argument("--plugin", action="append", default=[],
+                        help="导入额外的分析器模块 (可重复)")
+    parser.add_argument("--duration", type=float, default=0, help="运行秒数 (0=直到 Ctrl+C)")
+    parser.add_argument("--payload", choices=PAYLOAD_MODES, default="full",
+                        help="回调数据模式 (内置分析器只需 meta；插件需要图像时用 full/zerocopy)")
+    parser.add_argument("--backend", choices=["thread", "async"], default="thread",
+                        help="thread: 库回调线程 (默认); async: asyncio，每个 PV 一个有界队列和消费协程")
+    parser.add_argument("--queue-depth", type=int, default=4,
+                        help="async 后端每个 PV 的队列深度，满时丢弃最旧的帧 (default 4)")
+    parser.add_argument("--profile-callbacks", action="store_true",
+                        help="thread 后端：统计每个 PV 回调耗时、IOC 时间戳到回调入口的间隔及回调线程")
+    parser.add_argument("--trace-sample", type=int, default=0,
+                        help="与 --profile-callbacks 一起使用：每 N 次更新采样一次写入 callback_trace.json (0=不写)")
+    parser.add_argument("--results-format", choices=list(results_store.FORMATS), default=results_store.DEFAULT_FORMAT,
+                        help="结果文件格式 csv/parquet/hdf5 (默认取环境变量 RESULTS_FORMAT，未设置时为 csv)")
+    add_connect_arguments(parser)
+    add_monitor_arguments(parser)
+    add_analyzer_arguments(parser)
+    args = parser.parse_args()
+    results_store.DEFAULT_FORMAT = args.results_format
+    options = options_from_args(args)
+
+    names = [n.strip() for n in args.analyzers.split(",") if n.strip()]
+    analyzers = make_analyzers(names, CAMERA_PVS, args, RESULTS_DIR)
+    print(f"Running analyzers [{', '.join(names)}] on {len(CAMERA_PVS)} PVs using protocol: "
+          f"{args.protocol.upper()} (one subscription per PV). Press Ctrl+C to stop.")
+    tracker = ConnectionTracker(CAMERA_PVS, warmup=args.warmup)
+    if args.backend == "async":
+        # 事件循环延迟直方图在清理阶段写出，Ctrl+C 中断时也会保存
+        lag_file = os.path.join(RESULTS_DIR, "loop_lag_histogram.json")
+        if os.path.exists(lag_file):
+            os.remove(lag_file)
+        try:
+            summary = asyncio.run(run_analyzers_async(analyzers, CAMERA_PVS, args.protocol,
+                                                      duration=args.duration or None, payload=args.payload,
+                                                      queue_depth=args.queue_depth, options=options,
+                                                      lag_path=lag_file, tracker=tracker,
+                                                      connect_timeout=args.connect_timeout))
+        except KeyboardInterrupt:
+            summary = None
+        if summary:
+            lag = summary['loop_lag']
+            print(f"Event loop lag: p50={lag['p50'] * 1e3:.2f} ms p99={lag['p99'] * 1e3:.2f} ms "
+                  f"max={lag['max'] * 1e3:.2f} ms")
+            for pv, st in summary['streams'].items():
+                print(f"  {pv}: received={st['received']} dropped={st['dropped']} max_depth={st['max_depth']}")
+        if os.path.exists(lag_file):
+            print(f"Event loop lag histogram saved to: {lag_file}")
+    else:
+        profiler = CallbackProfiler(CAMERA_PVS, sample_every=args.trace_sample) if args.profile_callbacks else None
+        overrun = OverrunCounter(CAMERA_PVS, expected_period=args.expected_period)
+        run_analyzers(analyzers, CAMERA_PVS, args.protocol, duration=args.duration or None,
+                      payload=args.payload, profiler=profiler, tracker=tracker,
+                      connect_timeout=args.connect_timeout, options=options, overrun=overrun)
+        overrun_file = os.path.join(RESULTS_DIR, "overrun.csv")
+        with open(overrun_file, "w", newline="") as f:
+            csv.writer(f).writerows(overrun.rows(options.metadata()))
+        overrun.print_summary()
+        print(f"Overrun counts saved to: {overrun_file}")
+        if profiler is not None:
+            profile_file = os.path.join(RESULTS_DIR, "callback_profile.csv")
+            with open(profile_file, "w", newline="") as f:
+                csv.writer(f).writerows(profiler.rows())
+            print(f"Callback profile saved to: {profile_file}")
+            if args.trace_sample > 0:
+                trace_file = os.path.join(RESULTS_DIR, "callback_trace.json")
+                n = profiler.save_trace(trace_file)
+                print(f"Callback trace ({n} sampled events) saved to: {trace_file} "
+                      f"(open in chrome://tracing or ui.perfetto.dev)")
+    connect_file = os.path.join(RESULTS_DIR, "connect.csv")
+    with open(connect_file, "w", newline="") as f:
+        csv.writer(f).writerows(tracker.rows())
+    print(f"Connection timings saved to: {connect_file}")
+    print("All analyzers stopped.")
+
+
+if __name__ == "__main__":
+    main()
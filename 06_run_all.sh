@@ -1,22 +1,7 @@
 #!/bin/bash
 mkdir -p results
 PROTO=${1:-ca}
-echo "Running latency monitor (protocol=$PROTO)..."
-python3 01_latency_monitor.py --protocol "$PROTO" &
-LAT_PID=$!
-
-echo "Running throughput monitor (protocol=$PROTO)..."
-python3 02_throughput.py --protocol "$PROTO" &
-THR_PID=$!
-
-echo "Running packet loss monitor (protocol=$PROTO)..."
-python3 03_packetloss.py --protocol "$PROTO" &
-LOSS_PID=$!
-
-echo "Running CPU monitor..."
-python3 04_cpu.py &
-CPU_PID=$!
-
+# 单进程运行所有分析器：每个 PV 只订阅一次，更新分发给 latency/throughput/loss/resources
+echo "Running latency, throughput, packet loss and CPU analyzers (protocol=$PROTO)..."
 echo "Press Ctrl+C to stop all tests."
-trap "kill $LAT_PID $THR_PID $LOSS_PID $CPU_PID" SIGINT
-wait
+exec python3 06_run_all.py --protocol "$PROTO" "${@:2}"
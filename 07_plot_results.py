@@ -1,29 +1,54 @@
 import os
-import pandas as pd
 import matplotlib.pyplot as plt
 from config import RESULTS_DIR
+from results_store import find_result, read_results
 
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+
+def load(stem, columns=None):
+    """读取 results/<stem>.csv|.parquet|.h5 中最新的一个（列式格式只加载需要的列）"""
+    path = find_result(RESULTS_DIR, stem)
+    if path is None:
+        raise FileNotFoundError(f"{stem}.* not found in {RESULTS_DIR}")
+    if columns and path.endswith(".csv"):
+        # 旧结果文件可能没有新增的列
+        import csv
+        with open(path, newline="") as f:
+            header = next(csv.reader(f), [])
+        columns = [c for c in columns if c in header]
+    return read_results(path, columns=columns)
+
 # 延迟
 try:
-    df = pd.read_csv(os.path.join(RESULTS_DIR, "latency.csv"))
+    df = load("latency", ["pv", "frame_interval_sec", "ioc_latency_sec"])
     plt.figure()
-    for pv, g in df.groupby("pv"):
+    for pv, g in df.groupby("pv", observed=True):
         plt.plot(g["frame_interval_sec"].values, label=pv)
     plt.title("Frame Interval (Latency Approx)")
     plt.xlabel("Frame Index")
     plt.ylabel("Interval (s)")
     plt.legend()
     plt.savefig(os.path.join(RESULTS_DIR, "latency.png"))
+
+    # IOC -> 客户端端到端延迟（需要 IOC 时间戳）
+    if "ioc_latency_sec" in df.columns and df["ioc_latency_sec"].notna().any():
+        plt.figure()
+        for pv, g in df.dropna(subset=["ioc_latency_sec"]).groupby("pv", observed=True):
+            plt.plot(g["ioc_latency_sec"].values * 1e3, label=pv)
+        plt.title("End-to-end Latency (IOC timestamp -> client)")
+        plt.xlabel("Frame Index")
+        plt.ylabel("Latency (ms)")
+        plt.legend()
+        plt.savefig(os.path.join(RESULTS_DIR, "latency_e2e.png"))
 except Exception as e:
     print("Latency plot error:", e)
 
 # 吞吐量
 try:
-    df = pd.read_csv(os.path.join(RESULTS_DIR, "throughput.csv"))
+    df = load("throughput", ["pv", "mb_per_sec"])
     plt.figure()
-    for pv, g in df.groupby("pv"):
+    for pv, g in df.groupby("pv", observed=True):
         plt.plot(g["mb_per_sec"].values, label=pv)
     plt.title("Throughput (MB/s)")
     plt.xlabel("Interval Index")
@@ -35,7 +60,7 @@ except Exception as e:
 
 # 丢包率
 try:
-    df = pd.read_csv(os.path.join(RESULTS_DIR, "packetloss.csv"))
+    df = load("packetloss")
     plt.figure()
     plt.bar(df["pv"], df["loss_rate_percent"])
     plt.title("Packet Loss Rate")
@@ -47,7 +72,7 @@ except Exception as e:
 
 # CPU
 try:
-    df = pd.read_csv(os.path.join(RESULTS_DIR, "cpu.csv"))
+    df = load("cpu", ["cpu_percent", "memory_percent"])
     plt.figure()
     plt.plot(df["cpu_percent"], label="CPU %")
     plt.plot(df["memory_percent"], label="Memory %")
@@ -0,0 +1,56 @@
+import argparse
+import signal
+from sim_ioc import DTYPES, Simulator, make_cameras, sim_pv_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic camera IOC (NTNDArray over PVA, waveform over CA)")
+    parser.add_argument("--protocol", choices=["ca", "pva", "both"], default="pva",
+                        help="Protocol(s) to serve (default: pva)")
+    parser.add_argument("--cameras", type=int, default=3, help="Number of image PVs (default: 3)")
+    parser.add_argument("--prefix", default="SIM:", help="PV prefix (default: SIM:)")
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--dtype", choices=DTYPES, default="uint8")
+    parser.add_argument("--fps", type=float, default=10.0, help="Frame rate per camera (default: 10)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="帧发送时间抖动标准差 (秒)")
+    parser.add_argument("--drop-prob", type=float, default=0.0, help="故意丢帧概率 (uniqueId 仍递增)")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="每隔多少秒发送一次突发 (0=关闭)")
+    parser.add_argument("--burst-len", type=int, default=0, help="突发时额外连续发送的帧数")
+    parser.add_argument("--pool-depth", type=int, default=4, help="每个相机预分配的帧缓冲数量")
+    parser.add_argument("--duration", type=float, default=0, help="运行秒数 (0=直到 Ctrl+C)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    protocols = ("ca", "pva") if args.protocol == "both" else (args.protocol,)
+    cameras = make_cameras(
+        args.cameras, prefix=args.prefix, width=args.width, height=args.height, dtype=args.dtype,
+        fps=args.fps, jitter=args.jitter, drop_prob=args.drop_prob, burst_every=args.burst_every,
+        burst_len=args.burst_len, pool_depth=args.pool_depth, seed=args.seed,
+    )
+    sim = Simulator(cameras, protocols)
+    # 允许被 sweep/bench 脚本用 SIGTERM 正常结束
+    signal.signal(signal.SIGTERM, lambda *a: sim.stop())
+
+    frame_mb = cameras[0].pool.nbytes / 1024 / 1024
+    print(f"Simulated IOC serving {args.cameras} cameras over {'/'.join(p.upper() for p in protocols)}")
+    print(f"  {args.width}x{args.height} {args.dtype} ({frame_mb:.2f} MB/frame) @ {args.fps} FPS "
+          f"=> {frame_mb * args.fps * args.cameras:.1f} MB/s nominal")
+    print("  Use these PVs with the test scripts:")
+    print(f"    export CAMERA_PVS={','.join(sim_pv_names(args.cameras, args.prefix))}")
+    print("Press Ctrl+C to stop.")
+    try:
+        sim.run(duration=args.duration or None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+    for row in sim.summary():
+        print(f"  {row['pv']}: sent={row['sent']} dropped={row['dropped']} "
+              f"last_uniqueId={row['last_unique_id']} {row['mb_sent']:.1f} MB")
+    print("Simulator stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import time
+import csv
+import os
+import argparse
+import threading
+from config import CAMERA_PVS, RESULTS_DIR
+from client_utils import PAYLOAD_MODES, create_monitors, cleanup_monitors
+
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+class FrameCounter:
+    """最小回调：只统计帧数和字节数，用于测量各数据模式本身的开销"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+
+    def on_update(self, pvname, value, timestamp):
+        nbytes = getattr(value, 'nbytes', 0)
+        with self.lock:
+            self.frames += 1
+            self.bytes += nbytes
+
+    def snapshot(self):
+        with self.lock:
+            return self.frames, self.bytes
+
+
+def measure(protocol, payload, duration, warmup):
+    """运行一种 协议/模式 组合，返回每帧 CPU 开销"""
+    counter = FrameCounter()
+    monitors, backend = create_monitors(CAMERA_PVS, protocol, counter.on_update, payload=payload)
+    try:
+        time.sleep(warmup)
+        f0, b0 = counter.snapshot()
+        cpu0 = time.process_time()
+        t0 = time.perf_counter()
+        time.sleep(duration)
+        f1, b1 = counter.snapshot()
+        cpu1 = time.process_time()
+        t1 = time.perf_counter()
+    finally:
+        cleanup_monitors(monitors, backend)
+
+    frames = f1 - f0
+    elapsed = t1 - t0
+    cpu = cpu1 - cpu0
+    return {
+        'protocol': protocol,
+        'payload': payload,
+        'frames': frames,
+        'elapsed_sec': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0,
+        'mb_per_sec': (b1 - b0) / elapsed / 1024 / 1024 if elapsed > 0 else 0,
+        'process_cpu_sec': cpu,
+        'cpu_percent': cpu / elapsed * 100 if elapsed > 0 else 0,
+        'cpu_us_per_frame': cpu / frames * 1e6 if frames > 0 else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame CPU cost of full/zerocopy/meta payload modes")
+    parser.add_argument("--protocols", default="ca,pva", help="逗号分隔的协议列表 (default: ca,pva)")
+    parser.add_argument("--modes", default=",".join(PAYLOAD_MODES), help="逗号分隔的数据模式列表")
+    parser.add_argument("--duration", type=float, default=10, help="每种组合的测量秒数 (default: 10)")
+    parser.add_argument("--warmup", type=float, default=2, help="每种组合测量前的预热秒数 (default: 2)")
+    args = parser.parse_args()
+
+    protocols = [p.strip() for p in args.protocols.split(",") if p.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+
+    print(f"Measuring payload modes on {len(CAMERA_PVS)} PVs: protocols={protocols} modes={modes}")
+    results = []
+    for protocol in protocols:
+        for payload in modes:
+            try:
+                r = measure(protocol, payload, args.duration, args.warmup)
+            except Exception as e:
+                print(f"  {protocol.upper()}/{payload}: failed: {e}")
+                continue
+            results.append(r)
+            print(f"  {protocol.upper():3s}/{payload:8s}: {r['frames']} frames, {r['fps']:.1f} FPS, "
+                  f"{r['mb_per_sec']:.1f} MB/s, CPU {r['cpu_percent']:.1f}%, "
+                  f"{r['cpu_us_per_frame']:.1f} us/frame")
+
+    results_file = os.path.join(RESULTS_DIR, "payload_modes.csv")
+    with open(results_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        keys = ['protocol', 'payload', 'frames', 'elapsed_sec', 'fps', 'mb_per_sec',
+                'process_cpu_sec', 'cpu_percent', 'cpu_us_per_frame']
+        writer.writerow(keys)
+        for r in results:
+            writer.writerow([r[k] for k in keys])
+    print(f"Results saved to: {results_file}")
+
+
+if __name__ == "__main__":
+    main()
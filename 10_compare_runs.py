@@ -0,0 +1,90 @@
+import argparse
+import glob
+import os
+from config import RESULTS_DIR
+from run_compare import RESOURCE_DELTA_METRICS, analyze, load_run_info, protocol_deltas
+
+
+def expand(patterns):
+    """文件、目录或通配符 -> 文件列表（保持顺序、去重）"""
+    paths = []
+    for p in patterns:
+        if os.path.isdir(p):
+            matches = sorted(glob.glob(os.path.join(p, "*")))
+        else:
+            matches = sorted(glob.glob(p)) or [p]
+        for m in matches:
+            if os.path.isfile(m) and m not in paths:
+                paths.append(m)
+    return paths
+
+
+def print_runs(per_run):
+    lat = per_run[per_run["kind"] == "latency"] if len(per_run) else per_run
+    if len(lat) == 0:
+        return
+    print("\nLatency runs (frame interval, seconds):")
+    print(f"  {'run':24s} {'proto':5s} {'fps':>6s} {'n':>7s} {'mean':>8s} {'p50':>8s} {'p99':>8s} "
+          f"{'jitter':>8s} {'eff_fps':>7s} {'bursts':>6s}")
+    for _, r in lat.sort_values(["fps", "protocol"], na_position="last").iterrows():
+        fps = f"{r['fps']:.3g}" if r.get("fps") == r.get("fps") and r.get("fps") is not None else "-"
+        print(f"  {r['run']:24s} {str(r['protocol'] or '-'):5s} {fps:>6s} {int(r['samples']):7d} "
+              f"{r['mean']:8.4f} {r['p50']:8.4f} {r['p99']:8.4f} {r['jitter']:8.4f} "
+              f"{r['effective_fps']:7.2f} {int(r['bursts']):6d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare many result files: per-PV/per-run summaries and CA vs PVA deltas")
+    parser.add_argument("paths", nargs="+", help="结果文件、目录或通配符 (如 data/latency*.csv)")
+    parser.add_argument("--runs", help="运行信息映射 CSV (file,protocol,fps,...) 或 JSON，如 data/runs.csv")
+    parser.add_argument("--skip", type=int, default=5, help="每个 PV 丢弃的开头样本数 (default: 5)")
+    parser.add_argument("--outlier-factor", type=float, default=2.0,
+                        help="帧间隔超过中位数的多少倍算离群 (default: 2.0)")
+    parser.add_argument("--jobs", type=int, default=0, help="并行解析进程数 (default: CPU 核数)")
+    parser.add_argument("--cache-dir", default=os.path.join(RESULTS_DIR, ".compare_cache"),
+                        help="按文件哈希缓存解析结果的目录")
+    parser.add_argument("--no-cache", action="store_true", help="不读写缓存，全部重新解析")
+    parser.add_argument("--output-prefix", default=os.path.join(RESULTS_DIR, "compare"),
+                        help="输出文件前缀 (default: results/compare)")
+    args = parser.parse_args()
+
+    paths = expand(args.paths)
+    if args.runs:
+        paths = [p for p in paths if os.path.abspath(p) != os.path.abspath(args.runs)]
+    info = load_run_info(args.runs) if args.runs else None
+    per_pv, per_run = analyze(paths, info=info, jobs=args.jobs,
+                              cache_dir=None if args.no_cache else args.cache_dir,
+                              skip=args.skip, outlier_factor=args.outlier_factor)
+    if len(per_run) == 0:
+        print("No result files could be summarized")
+        return
+    deltas = protocol_deltas(per_run)
+    resource_deltas = protocol_deltas(per_run, RESOURCE_DELTA_METRICS, kind="resources")
+
+    print_runs(per_run)
+    if len(deltas):
+        print("\nPVA - CA (same nominal fps):")
+        for _, r in deltas.iterrows():
+            print(f"  fps={r['fps']:<6.3g} mean {r['mean_delta'] * 1e3:+8.2f} ms, p99 {r['p99_delta'] * 1e3:+8.2f} ms, "
+                  f"jitter {r['jitter_delta'] * 1e3:+8.2f} ms, effective fps {r['effective_fps_delta']:+.3f}")
+
+    if len(resource_deltas):
+        print("\nWire overhead, PVA vs CA (resource summaries):")
+        for _, r in resource_deltas.iterrows():
+            fps = "-" if r['fps'] != r['fps'] else f"{r['fps']:g}"
+            print(f"  fps={fps:<6s} overhead CA {r['wire_overhead_percent_ca']:+.2f}% / PVA {r['wire_overhead_percent_pva']:+.2f}%, "
+                  f"packets/frame CA {r.get('packets_per_frame_ca', float('nan')):.1f} / "
+                  f"PVA {r.get('packets_per_frame_pva', float('nan')):.1f}")
+
+    os.makedirs(os.path.dirname(args.output_prefix) or ".", exist_ok=True)
+    outputs = {"per_pv": per_pv, "per_run": per_run, "protocol_delta": deltas,
+               "overhead_delta": resource_deltas}
+    for name, df in outputs.items():
+        if len(df):
+            path = f"{args.output_prefix}_{name}.csv"
+            df.to_csv(path, index=False)
+            print(f"Saved: {path}")
+
+
+if __name__ == "__main__":
+    main()
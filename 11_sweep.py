@@ -0,0 +1,89 @@
+import argparse
+import csv
+import os
+import shlex
+from config import RESULTS_DIR
+from sweep import ADAPTIVE_AXES, AXES, TARGETS, SweepRunner, base_point, grid, plot_curves, saturation_table
+
+
+def split(text, cast=str):
+    return [cast(v.strip()) for v in str(text).split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep (grid or adaptive) with saturation detection")
+    parser.add_argument("--protocol", default="ca,pva", help="协议列表 (default: ca,pva)")
+    parser.add_argument("--cameras", default="1,2,4", help="相机数量列表 (default: 1,2,4)")
+    parser.add_argument("--clients", default="1", help="客户端数量列表；1 用 04_stress_test.py，>1 用 05_concurrent_test.py")
+    parser.add_argument("--size", default="1024x1024", help="帧尺寸列表，如 512x512,1024x1024")
+    parser.add_argument("--fps", default="10", help="每个相机帧率列表 (default: 10)")
+    parser.add_argument("--adaptive", choices=ADAPTIVE_AXES, default=None,
+                        help="对该轴做自适应搜索（倍增直到饱和再二分），其余轴按列表做网格")
+    parser.add_argument("--min", type=float, default=1, help="自适应搜索起点 (default: 1)")
+    parser.add_argument("--max", type=float, default=64, help="自适应搜索上限 (default: 64)")
+    parser.add_argument("--duration", type=int, default=30, help="每个点的测量秒数 (default: 30)")
+    parser.add_argument("--warmup", type=float, default=5, help="每个点测量前的预热秒数 (default: 5)")
+    parser.add_argument("--cooldown", type=float, default=3, help="每个点结束后的冷却秒数 (default: 3)")
+    parser.add_argument("--max-loss", type=float, default=1.0, help="饱和阈值：丢帧百分比 (default: 1.0)")
+    parser.add_argument("--max-latency", type=float, default=0.5, help="饱和阈值：延迟 p99 秒数 (default: 0.5)")
+    parser.add_argument("--target", choices=TARGETS, default="sim",
+                        help="sim: 每个点启动本地模拟 IOC (default); external: 使用 CAMERA_PVS 中的前 N 个真实 PV")
+    parser.add_argument("--dtype", default="uint8", help="模拟相机像素类型 (default: uint8)")
+    parser.add_argument("--test-args", default="", help="传给测试脚本的额外参数，如 \"--workers 4\"")
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "sweep"),
+                        help="扫描目录；已完成的点记录在其中的 sweep.csv，重新运行时跳过（断点续跑）")
+    args = parser.parse_args()
+
+    axes = {
+        'protocol': split(args.protocol),
+        'cameras': split(args.cameras, int),
+        'clients': split(args.clients, int),
+        'size': split(args.size),
+        'fps': split(args.fps, float),
+    }
+    runner = SweepRunner(args.out, duration=args.duration, warmup=args.warmup, cooldown=args.cooldown,
+                         target=args.target, dtype=args.dtype, max_loss=args.max_loss,
+                         max_latency=args.max_latency, test_args=shlex.split(args.test_args))
+    if runner.done:
+        print(f"Resuming sweep: {len(runner.done)} point(s) already measured in {runner.state_path}")
+
+    if args.adaptive:
+        curve_axis = args.adaptive
+        rows = []
+        for base in grid({a: v for a, v in axes.items() if a != curve_axis}, base_point()):
+            series_rows, first_bad = runner.run_adaptive(base, curve_axis, args.min, args.max)
+            rows.extend(series_rows)
+    else:
+        # 曲线横轴：第一个有多个取值的轴
+        curve_axis = next((a for a in ("cameras", "clients", "fps", "size", "protocol") if len(axes[a]) > 1), "cameras")
+        rows = runner.run_grid(grid(axes))
+
+    scaling_file = os.path.join(args.out, "scaling.csv")
+    with open(scaling_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['id', *AXES], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda r: (str(r['protocol']), r['size'], r['clients'], r['cameras'], r['fps'])))
+
+    sat = saturation_table(rows, curve_axis)
+    sat_file = os.path.join(args.out, "saturation.csv")
+    with open(sat_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(sat[0]) if sat else ['axis'])
+        writer.writeheader()
+        writer.writerows(sat)
+
+    print(f"\nSaturation along '{curve_axis}' (loss > {args.max_loss}% or latency p99 > {args.max_latency}s):")
+    for s in sat:
+        others = ", ".join(f"{a}={s[a]}" for a in AXES if a != curve_axis)
+        limit = f"saturates at {s['first_saturated']}" if s['first_saturated'] is not None else "no saturation"
+        print(f"  {others}: max ok {s['max_ok']}, {limit}")
+    print(f"Scaling data saved to: {scaling_file}")
+    print(f"Saturation points saved to: {sat_file}")
+    plot_file = os.path.join(args.out, "scaling.png")
+    if plot_curves(rows, curve_axis, plot_file):
+        print(f"Scaling curves saved to: {plot_file}")
+    else:
+        print("matplotlib not installed; skipping scaling.png")
+
+
+if __name__ == "__main__":
+    main()
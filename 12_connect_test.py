@@ -0,0 +1,110 @@
+import argparse
+import csv
+import os
+import threading
+import time
+from config import CAMERA_PVS, RESULTS_DIR
+from client_utils import create_monitors, cleanup_monitors
+from connect_tracker import ConnectionTracker
+
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+class UpdateCounter:
+    """最小回调：只计数（闸门打开后的更新）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def on_update(self, pvname, value, timestamp):
+        with self.lock:
+            self.count += 1
+
+
+def release(monitors, backend, protocol):
+    """断开本轮所有通道，使下一轮重新搜索和连接"""
+    if protocol == "ca":
+        for pv in monitors:
+            try:
+                pv.clear_callbacks()
+                pv.disconnect()
+            except Exception:
+                pass
+        try:
+            from epics import ca  # type: ignore
+            ca.clear_cache()
+        except Exception:
+            pass
+    cleanup_monitors(monitors, backend)
+
+
+def connect_round(protocol, timeout, watch=0.0):
+    """一轮批量并行连接：全部通道同时创建，等待全部收到首帧；watch>0 时继续订阅以统计断线重连"""
+    tracker = ConnectionTracker(CAMERA_PVS)
+    counter = UpdateCounter()
+    t0 = time.monotonic()
+    monitors, backend = create_monitors(CAMERA_PVS, protocol, counter.on_update, payload="meta", tracker=tracker)
+    create_ms = (time.monotonic() - t0) * 1e3
+    try:
+        tracker.wait_live(timeout)
+        if watch > 0:
+            print(f"  Watching for {watch:.0f} s (restart the IOC now to measure reconnects)...")
+            time.sleep(watch)
+    finally:
+        release(monitors, backend, protocol)
+    return tracker, create_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk parallel connect: connect / first-update / reconnect timing")
+    parser.add_argument("--protocol", choices=["ca", "pva"], default="ca", help="EPICS protocol (default: ca)")
+    parser.add_argument("--rounds", type=int, default=3, help="重复连接的轮数 (default: 3)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="每轮等待全部 PV 首帧的最长秒数 (default: 10)")
+    parser.add_argument("--pause", type=float, default=1.0, help="两轮之间的间隔秒数 (default: 1)")
+    parser.add_argument("--watch", type=float, default=0.0,
+                        help="最后一轮连接后继续订阅的秒数，期间重启 IOC 可测量断线和重连耗时 (default: 0)")
+    args = parser.parse_args()
+    args.rounds = max(1, args.rounds)
+
+    print(f"Bulk connect test: {len(CAMERA_PVS)} PVs over {args.protocol.upper()}, {args.rounds} round(s)")
+    per_pv_rows = []
+    round_rows = []
+    for r in range(args.rounds):
+        last = r == args.rounds - 1
+        tracker, create_ms = connect_round(args.protocol, args.timeout, args.watch if last else 0.0)
+        s = tracker.summary()
+        print(f"Round {r + 1}: channels created in {create_ms:.1f} ms")
+        tracker.print_summary()
+        round_rows.append([r + 1, s['pvs'], s['connected'], s['live'], create_ms, s['all_connected_ms'],
+                           s['all_live_ms'], s['first_update_p50_ms'], s['first_update_max_ms'],
+                           len(s['slow']), len(s['failed']), s['reconnects']])
+        rows = tracker.rows()
+        per_pv_rows.extend([[r + 1] + row for row in rows[1:]])
+        header = ['round'] + rows[0]
+        if last and s['reconnects']:
+            rep = tracker.report()
+            for j, pv in enumerate(rep['pv']):
+                if rep['reconnects'][j]:
+                    print(f"    {pv}: {rep['disconnects'][j]} disconnects, {rep['reconnects'][j]} reconnects, "
+                          f"reconnect mean {rep['reconnect_mean_ms'][j]:.1f} ms, max {rep['reconnect_max_ms'][j]:.1f} ms")
+        if not last:
+            time.sleep(args.pause)
+
+    per_pv_file = os.path.join(RESULTS_DIR, "connect_per_pv.csv")
+    with open(per_pv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(per_pv_rows)
+    rounds_file = os.path.join(RESULTS_DIR, "connect_rounds.csv")
+    with open(rounds_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["round", "pvs", "connected", "live", "create_ms", "all_connected_ms", "all_live_ms",
+                         "first_update_p50_ms", "first_update_max_ms", "slow", "failed", "reconnects"])
+        writer.writerows(round_rows)
+    print(f"Per-PV timings saved to: {per_pv_file}")
+    print(f"Round summary saved to: {rounds_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import time
+from config import CAMERA_PVS, RESULTS_DIR
+from client_utils import create_monitors, cleanup_monitors
+from capture import CaptureWriter
+from monitor_options import add_monitor_arguments, options_from_args
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record camera frames and metadata into a memory-mapped capture file")
+    parser.add_argument("--protocol", choices=["ca", "pva"], default="pva", help="EPICS protocol (default: pva)")
+    parser.add_argument("--duration", type=float, default=0, help="录制秒数 (0=直到 Ctrl+C)")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "capture.cap"),
+                        help="捕获文件路径 (default: results/capture.cap)")
+    parser.add_argument("--max-gb", type=float, default=0, help="捕获文件大小上限 GB，超出后的帧只计数不写入 (0=不限)")
+    parser.add_argument("--note", default="", help="写入文件头的说明，如现场现象或工况")
+    add_monitor_arguments(parser, overrun=False)
+    args = parser.parse_args()
+    options = options_from_args(args)
+
+    writer = CaptureWriter(args.output, CAMERA_PVS, protocol=args.protocol,
+                           metadata={'note': args.note, **options.metadata()},
+                           max_bytes=int(args.max_gb * 1024 ** 3) if args.max_gb > 0 else None)
+    print(f"Recording {len(CAMERA_PVS)} PVs over {args.protocol.upper()} to {args.output}. Press Ctrl+C to stop.")
+    monitors, backend = [], None
+    start = time.time()
+    try:
+        # full: PVA 帧带图像尺寸；每帧只拷贝一次，直接写入映射文件
+        monitors, backend = create_monitors(CAMERA_PVS, args.protocol, writer.on_update, with_meta=True,
+                                            options=options)
+        end = start + args.duration if args.duration else None
+        while end is None or time.time() < end:
+            time.sleep(max(0.0, min(5.0, end - time.time())) if end else 5.0)
+            print(f"  [{time.time() - start:6.1f}s] frames={sum(writer.frames)} "
+                  f"size={writer.size / 1024 / 1024:.1f} MB skipped={writer.skipped}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cleanup_monitors(monitors, backend)
+        writer.close()
+
+    elapsed = time.time() - start
+    print(f"Capture saved to: {args.output} ({writer.size / 1024 / 1024:.1f} MB in {elapsed:.1f} s)")
+    for pv, frames, nbytes in zip(writer.pv_names, writer.frames, writer.bytes):
+        print(f"    {pv}: {frames} frames, {nbytes / 1024 / 1024:.1f} MB")
+    if writer.skipped:
+        print(f"  Skipped {writer.skipped} updates (size limit, non-array payload or unsupported dtype)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import csv
+import os
+import signal
+from config import RESULTS_DIR
+from capture import CaptureReader, Replayer
+
+
+def print_info(reader):
+    info = reader.info
+    print(f"Capture {reader.path}: {len(reader)} frames, protocol {info.get('protocol')}, "
+          f"host {info.get('host')}, metadata {info.get('metadata')}")
+    for row in reader.summary():
+        print(f"    {row['pv']}: {row['frames']} frames over {row['duration_sec']:.1f} s ({row['fps']:.2f} FPS), "
+              f"{row['mb']:.1f} MB, uniqueId gaps {row['uid_missing']}, interval p50/p99/max "
+              f"{row['interval_p50'] * 1e3:.1f}/{row['interval_p99'] * 1e3:.1f}/{row['interval_max'] * 1e3:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a capture file over local PVA/CA with the recorded timing")
+    parser.add_argument("capture", help="13_record.py 生成的捕获文件")
+    parser.add_argument("--protocol", choices=["ca", "pva", "both"], default="pva",
+                        help="Protocol(s) to serve (default: pva)")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数；0 表示尽可能快 (default: 1)")
+    parser.add_argument("--clock", choices=["recv", "ioc"], default="recv",
+                        help="recv: 按录制客户端的接收时间（含网络突发和抖动，默认）; ioc: 按 IOC 时间戳")
+    parser.add_argument("--prefix", default=None,
+                        help="替换 PV 名第一段前缀，如 REPLAY: 把 13ARV222:image1:ArrayData 发布为 REPLAY:image1:ArrayData")
+    parser.add_argument("--loop", action="store_true", help="回放结束后从头循环 (uniqueId 继续递增)")
+    parser.add_argument("--duration", type=float, default=0, help="运行秒数 (0=回放完毕或直到 Ctrl+C)")
+    parser.add_argument("--info", action="store_true", help="只打印捕获文件摘要并导出帧间隔，不发布")
+    args = parser.parse_args()
+
+    reader = CaptureReader(args.capture)
+    print_info(reader)
+    if args.info:
+        # 与 data/latency*.csv 相同格式的帧间隔，可直接交给 10_compare_runs.py 对比
+        out = os.path.join(RESULTS_DIR, os.path.splitext(os.path.basename(args.capture))[0] + "_intervals.csv")
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(out, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["pv", "frame_interval_sec", "recv_time", "unique_id"])
+            ix = reader.index
+            for p, pv in enumerate(reader.pv_names):
+                rec = reader.frames_of(p)
+                dt = reader.intervals(p)
+                for k, interval in zip(rec[1:], dt):
+                    writer.writerow([pv, interval, ix['recv_time'][k], ix['unique_id'][k]])
+        print(f"Intervals saved to: {out}")
+        reader.close()
+        return
+
+    protocols = ("ca", "pva") if args.protocol == "both" else (args.protocol,)
+    replayer = Replayer(reader, protocols, speed=args.speed, clock=args.clock, prefix=args.prefix, loop=args.loop)
+    signal.signal(signal.SIGTERM, lambda *a: replayer.stop())
+    print(f"Replaying at {args.speed:g}x over {'/'.join(p.upper() for p in protocols)} "
+          f"({replayer.span:.1f} s of capture{', looping' if args.loop else ''})")
+    print("  Use these PVs with the test scripts:")
+    print(f"    export CAMERA_PVS={','.join(replayer.names)}")
+    try:
+        replayer.run(duration=args.duration or None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replayer.close()
+
+    for row in replayer.summary():
+        print(f"  {row['pv']}: sent={row['sent']} {row['mb_sent']:.1f} MB")
+    print(f"  Late frames: {replayer.late} (max {replayer.max_late * 1e3:.1f} ms behind schedule), loops: {replayer.loops}")
+    reader.close()
+    print("Replay stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from config import RESULTS_DIR
+from bench import CALLBACKS, PAYLOADS, PROTOCOLS, SOURCES, compare, load_results, print_comparison, run_suite, save_results
+
+
+def split(text, choices=None):
+    values = [v.strip() for v in str(text).split(",") if v.strip()]
+    for v in values:
+        if choices is not None and v not in choices:
+            raise SystemExit(f"unknown value '{v}'; use one of {', '.join(choices)}")
+    return values
+
+
+def add_compare_arguments(parser):
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="相对变差超过该比例才可能判为回归 (default: 0.05 即 5%%)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.5,
+                        help="每次更新残留内存块数增加超过该值才可能判为回归 (default: 0.5)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="置换检验显著性水平 (default: 0.05)")
+    parser.add_argument("--all", action="store_true", help="列出全部指标，而不只是回归/改进项")
+
+
+def report(baseline, current, args, csv_path=None):
+    """打印比较结果，返回回归项数"""
+    rows = compare(baseline, current, threshold=args.threshold, alloc_threshold=args.alloc_threshold,
+                   alpha=args.alpha)
+    print(f"\nComparing against baseline from {baseline['meta'].get('time')} "
+          f"(rev {baseline['meta'].get('git_rev')}, host {baseline['meta'].get('host')}):")
+    print_comparison(rows, all_rows=args.all)
+    if csv_path and rows:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Comparison saved to: {csv_path}")
+    regressions = [r for r in rows if r['regression']]
+    if regressions:
+        print(f"{len(regressions)} significant regression(s)")
+    else:
+        print(f"No significant regressions in {len(rows)} metric(s)")
+    return len(regressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regression benchmarks of the client_utils hot path with baseline comparison")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行基准并保存 JSON 结果（可同时与基线比较）")
+    run.add_argument("--source", default="inproc",
+                     help="事件来源列表：inproc 进程内注入（无需 EPICS 库）、sim 本地模拟 IOC (default: inproc)")
+    run.add_argument("--protocols", default=",".join(PROTOCOLS), help="协议列表 (default: ca,pva)")
+    run.add_argument("--callbacks", default=",".join(CALLBACKS),
+                     help="回调列表：latency,throughput,loss 分析器与 04 的 stress (default: 全部)")
+    run.add_argument("--payload", default="full", help=f"载荷模式列表 {'/'.join(PAYLOADS)} (default: full)")
+    run.add_argument("--repeats", type=int, default=5, help="每个用例重复次数，比较时作为样本 (default: 5)")
+    run.add_argument("--updates", type=int, default=20000, help="inproc：每次重复注入的更新数 (default: 20000)")
+    run.add_argument("--duration", type=float, default=10, help="sim：每次重复的测量秒数 (default: 10)")
+    run.add_argument("--warmup", type=float, default=3, help="sim：订阅后测量前的预热秒数 (default: 3)")
+    run.add_argument("--cameras", type=int, default=4, help="PV 数量 (default: 4)")
+    run.add_argument("--size", default="1024x1024", help="帧尺寸 (default: 1024x1024)")
+    run.add_argument("--dtype", default="uint8", help="像素类型 (default: uint8)")
+    run.add_argument("--fps", type=float, default=30, help="每个 PV 的帧率 (default: 30)")
+    run.add_argument("--output", default=None,
+                     help="结果 JSON 路径 (default: results/bench/bench_<时间>.json)")
+    run.add_argument("--baseline", default=None, help="基线 JSON；给出时运行后比较，有显著回归则退出码为 1")
+    run.add_argument("--save-baseline", action="store_true", help="同时把本次结果写为 --baseline 指定的基线文件")
+    add_compare_arguments(run)
+
+    cmp_ = sub.add_parser("compare", help="比较两个已保存的 JSON 结果")
+    cmp_.add_argument("baseline", help="基线 JSON")
+    cmp_.add_argument("current", help="当前 JSON")
+    cmp_.add_argument("--csv", default=None, help="把逐项比较结果写入 CSV")
+    add_compare_arguments(cmp_)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        n = report(load_results(args.baseline), load_results(args.current), args, args.csv)
+        sys.exit(1 if n else 0)
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    sources = split(args.source, SOURCES)
+    protocols = split(args.protocols, PROTOCOLS)
+    callbacks = split(args.callbacks, CALLBACKS)
+    payloads = split(args.payload, PAYLOADS)
+    if args.repeats < 4:
+        print(f"Note: with {args.repeats} repeat(s) per side no difference can reach p < 0.05; use --repeats 4 or more")
+    print(f"Benchmark: {len(sources) * len(protocols) * len(callbacks) * len(payloads)} case(s) x {args.repeats} repeat(s)")
+    results = run_suite(sources, protocols, callbacks, payloads, repeats=args.repeats, cameras=args.cameras,
+                        updates=args.updates, duration=args.duration, warmup=args.warmup, width=width,
+                        height=height, dtype=args.dtype, fps=args.fps)
+    output = args.output or os.path.join(RESULTS_DIR, "bench", time.strftime("bench_%Y%m%d_%H%M%S.json"))
+    save_results(output, results)
+    print(f"Results saved to: {output}")
+
+    if not args.baseline:
+        return
+    if args.save_baseline or not os.path.exists(args.baseline):
+        save_results(args.baseline, results)
+        print(f"Baseline saved to: {args.baseline}")
+        return
+    n = report(load_results(args.baseline), results, args, os.path.splitext(output)[0] + "_compare.csv")
+    sys.exit(1 if n else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import csv
+import os
+import time
+from config import CAMERA_PVS, RESULTS_DIR
+from monitor_options import add_monitor_arguments, options_from_args
+from relay import PvaRelay, add_relay_arguments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PVA fan-out relay: one upstream subscription per camera PV, many local viewers")
+    parser.add_argument("--duration", type=float, default=0, help="运行秒数 (0=直到 Ctrl+C)")
+    parser.add_argument("--report-interval", type=float, default=5, help="状态输出间隔秒数 (default: 5)")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "relay.csv"),
+                        help="每个名称组/PV 的转发统计 (default: results/relay.csv)")
+    add_relay_arguments(parser)
+    add_monitor_arguments(parser, overrun=False)
+    args = parser.parse_args()
+
+    relay = PvaRelay(CAMERA_PVS, prefix=args.relay_prefix, slots=args.relay_slots or 0,
+                     queue_depth=args.relay_queue, policy=args.relay_policy, options=options_from_args(args))
+    print(f"Relaying {len(CAMERA_PVS)} PVs. Press Ctrl+C to stop.")
+    if relay.slots:
+        print(f"  {relay.slots} per-client slot(s), queue {args.relay_queue} per PV, policy {args.relay_policy}; "
+              f"client 0 subscribes to:")
+    else:
+        print("  Shared downstream PVs (per-subscriber queueing by the p4p server):")
+    for name in relay.downstream_names(0 if relay.slots else None):
+        print(f"    {name}")
+    relay.start()
+    start = time.time()
+    try:
+        end = start + args.duration if args.duration else None
+        while end is None or time.time() < end:
+            time.sleep(min(args.report_interval, end - time.time()) if end else args.report_interval)
+            s = relay.summary()
+            print(f"  [{time.time() - start:6.1f}s] upstream={s['upstream_frames']} posts={s['downstream_posts']} "
+                  f"backlog_dropped={s['backlog_dropped']} added p99={s['added_p99_ms']:.3f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        relay.close()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", newline="") as f:
+        csv.writer(f).writerows(relay.rows())
+    relay.print_summary()
+    print(f"Relay statistics saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
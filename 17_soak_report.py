@@ -0,0 +1,36 @@
+import argparse
+import os
+import time
+from soak import print_summary, summarize, write_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a soak run directory (finished or still running)")
+    parser.add_argument("soak_dir", help="04_stress_test.py --soak 使用的目录")
+    parser.add_argument("--leak-threshold", type=float, default=1.0,
+                        help="RSS 增长趋势超过该值 (MB/小时) 且拟合 R^2>=0.5 时判为疑似泄漏 (default: 1.0)")
+    parser.add_argument("--settle", type=float, default=0.2,
+                        help="每段开头不参与趋势拟合的样本比例（预热、缓存填充） (default: 0.2)")
+    parser.add_argument("--watch", type=float, default=0, help="每隔 N 秒重新汇总一次 (0=只汇总一次)")
+    parser.add_argument("--output", default=None,
+                        help="CSV 报告前缀 (default: <soak_dir>/soak，生成 _windows.csv 与 _summary.csv)")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.soak_dir, "state.json")):
+        raise SystemExit(f"{args.soak_dir} is not a soak run directory (no state.json)")
+    try:
+        while True:
+            summary = summarize(args.soak_dir, args.leak_threshold, args.settle)
+            print_summary(summary)
+            if not args.watch:
+                break
+            print()
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    paths = write_report(summary, args.output or os.path.join(args.soak_dir, "soak"))
+    print(f"Soak report saved to: {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,550 @@
+"""Pluggable per-frame analyzers sharing a single subscription.
+
+Each analyzer receives the unified `on_update(pvname, value, timestamp, meta)`
+callback from `client_utils.create_monitors(..., with_meta=True)`, where
+`meta` is a `client_utils.FrameMeta` (uniqueId, IOC time, receive time).
+`FanOut` lets one monitor per PV feed any number of analyzers, so running
+latency, throughput, loss and resource measurements together no longer
+multiplies the network load:
+
+    from analyzers import FanOut, make_analyzers, run_analyzers
+
+    analyzers = make_analyzers(["latency", "throughput"], CAMERA_PVS, args)
+    run_analyzers(analyzers, CAMERA_PVS, "pva")   # until Ctrl+C
+
+New analyzers subclass `Analyzer` and register themselves:
+
+    @register_analyzer
+    class MyAnalyzer(Analyzer):
+        name = "mine"
+        def on_update(self, pvname, value, timestamp, meta=None): ...
+
+Put the class in any importable module and pass it to `06_run_all.py
+--plugin mymodule --analyzers latency,mine`.
+
+With the asyncio backend (`run_analyzers_async`, `06_run_all.py --backend
+async`) each PV is consumed by its own task and analyzers may override
+`on_update_async` to run as coroutines.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from client_utils import (FrameMeta, create_monitors, cleanup_monitors, create_monitors_async,
+                          cleanup_monitors_async)
+from histogram import LatencyHistogram
+from live_metrics import add_live_arguments, start_live
+from period_estimator import PeriodEstimator
+from resource_sampler import ResourceSampler, add_resource_arguments
+from result_writer import ResultWriter
+from results_store import RUN_METADATA, result_path, run_metadata
+from sequence_tracker import SequenceTracker
+
+ANALYZERS: Dict[str, Type["Analyzer"]] = {}
+
+
+def register_analyzer(cls: Type["Analyzer"]) -> Type["Analyzer"]:
+    """Class decorator adding an analyzer to the `ANALYZERS` registry under `cls.name`."""
+    ANALYZERS[cls.name] = cls
+    return cls
+
+
+class Analyzer:
+    """Base class: per-frame callback plus an optional periodic report."""
+
+    name = "base"
+    # Seconds between report() calls; 0 disables periodic reporting.
+    report_interval = 0.0
+
+    def __init__(self, pv_names: Sequence[str], results_dir: str = "results"):
+        self.pv_names = list(pv_names)
+        self.results_dir = results_dir
+        # analyzers save into results_dir on close; scripts may construct them directly
+        os.makedirs(results_dir, exist_ok=True)
+        self._next_report = time.time() + self.report_interval if self.report_interval > 0 else None
+
+    @classmethod
+    def add_arguments(cls, parser: argparse.ArgumentParser) -> None:
+        """Register analyzer-specific command-line options."""
+
+    @classmethod
+    def from_args(cls, pv_names: Sequence[str], args: argparse.Namespace, results_dir: str) -> "Analyzer":
+        return cls(pv_names, results_dir)
+
+    def on_update(self, pvname: str, value: Any, timestamp: Optional[float],
+                  meta: Optional[FrameMeta] = None) -> None:
+        raise NotImplementedError
+
+    async def on_update_async(self, pvname: str, value: Any, timestamp: Optional[float],
+                              meta: Optional[FrameMeta] = None) -> None:
+        """Coroutine form used by the asyncio runner; override for analyzers that await."""
+        self.on_update(pvname, value, timestamp, meta)
+
+    def tick(self, now: float) -> None:
+        """Called from the runner's main loop; dispatches report() when due."""
+        if self._next_report is not None and now >= self._next_report:
+            self.report(now)
+            self._next_report = now + self.report_interval
+
+    def report(self, now: float) -> None:
+        pass
+
+    def observe_backlog(self, depths: Dict[str, int]) -> None:
+        """Called by runners that queue updates with the current per-PV queue depths."""
+
+    def close(self) -> None:
+        pass
+
+
+class FanOut:
+    """Callable passed to create_monitors that forwards every update to all analyzers."""
+
+    def __init__(self, analyzers: Sequence[Analyzer]):
+        self.analyzers = list(analyzers)
+        self.errors = 0
+
+    def __call__(self, pvname: str, value: Any, timestamp: Optional[float],
+                 meta: Optional[FrameMeta] = None) -> None:
+        for analyzer in self.analyzers:
+            try:
+                analyzer.on_update(pvname, value, timestamp, meta)
+            except Exception as e:
+                # One faulty analyzer must not starve the others of frames.
+                self.errors += 1
+                if self.errors <= 10:
+                    print(f"Analyzer {analyzer.name} error on {pvname}: {e}")
+
+
+# ----------------------------------------------------------------------
+# Built-in analyzers (formerly separate scripts 01-04)
+# ----------------------------------------------------------------------
+@register_analyzer
+class LatencyAnalyzer(Analyzer):
+    """帧间隔及 IOC->客户端端到端延迟，写入 latency.csv
+
+    端到端延迟 = 客户端接收时间 - IOC 时间戳 - clock_offset。
+    clock_offset 为数值时表示 IOC 时钟领先客户端的秒数；为 'auto' 时按 PV
+    减去观测到的最小延迟（得到相对最小传输时间的延迟，适用于时钟未同步的情况）。
+    """
+
+    name = "latency"
+
+    def __init__(self, pv_names, results_dir="results", clock_offset=0.0):
+        super().__init__(pv_names, results_dir)
+        self.auto_offset = clock_offset == "auto"
+        self.clock_offset = 0.0 if self.auto_offset else float(clock_offset)
+        self.last_time = {pv: None for pv in self.pv_names}
+        self.min_delay = {pv: float('inf') for pv in self.pv_names}
+        self.writer = ResultWriter(result_path(results_dir, "latency"),
+                                   ["pv", "frame_interval_sec", "unique_id", "ioc_latency_sec", "recv_time"],
+                                   dtypes=["category", "f8", "i8", "f8", "f8"])
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--clock-offset", default="0",
+                            help="IOC 时钟相对客户端的偏差秒数，或 'auto' 按最小延迟校正 (default 0)")
+
+    @classmethod
+    def from_args(cls, pv_names, args, results_dir):
+        offset = args.clock_offset if args.clock_offset == "auto" else float(args.clock_offset)
+        return cls(pv_names, results_dir, clock_offset=offset)
+
+    def on_update(self, pvname, value, timestamp, meta=None):
+        if meta is None:
+            now = time.monotonic()
+            recv = time.time()
+            uid = latency = None
+        else:
+            now = meta.recv_mono
+            recv = meta.recv_time
+            uid = meta.unique_id
+            latency = None
+            if meta.ioc_time is not None:
+                latency = meta.recv_time - meta.ioc_time - self.clock_offset
+                if self.auto_offset:
+                    if latency < self.min_delay[pvname]:
+                        self.min_delay[pvname] = latency
+                    latency -= self.min_delay[pvname]
+        prev = self.last_time[pvname]
+        self.last_time[pvname] = now
+        if prev is not None:
+            self.writer.push((pvname, now - prev, uid, latency, recv))
+
+    def close(self):
+        self.writer.close()
+        print(self.writer.format_stats())
+
+
+@register_analyzer
+class ThroughputAnalyzer(Analyzer):
+    """吞吐量 (MB/s)，每 interval 秒写入 throughput.csv"""
+
+    name = "throughput"
+
+    def __init__(self, pv_names, results_dir="results", interval=5):
+        self.report_interval = interval
+        super().__init__(pv_names, results_dir)
+        now = time.time()
+        self.counters = {pv: {"bytes": 0, "last": now} for pv in self.pv_names}
+        self.writer = ResultWriter(result_path(results_dir, "throughput"), ["pv", "bytes_per_sec", "mb_per_sec", "timestamp"],
+                                   dtypes=["category", "f8", "f8", "f8"])
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--interval", type=int, default=5, help="吞吐量统计窗口秒数 (default 5)")
+
+    @classmethod
+    def from_args(cls, pv_names, args, results_dir):
+        return cls(pv_names, results_dir, interval=args.interval)
+
+    def on_update(self, pvname, value, timestamp, meta=None):
+        if hasattr(value, 'nbytes'):
+            try:
+                self.counters[pvname]["bytes"] += int(value.nbytes)
+            except Exception:
+                pass
+
+    def report(self, now):
+        for pv in self.pv_names:
+            elapsed = now - self.counters[pv]["last"]
+            if elapsed > 0:
+                bps = self.counters[pv]["bytes"] / elapsed
+                self.writer.push((pv, bps, bps / (1024 * 1024), now))
+                self.counters[pv] = {"bytes": 0, "last": now}
+
+    def close(self):
+        self.writer.close()
+        print(self.writer.format_stats())
+
+
+@register_analyzer
+class PacketLossAnalyzer(Analyzer):
+    """丢帧统计，每 report_interval 秒写入 packetloss.csv
+
+    有 uniqueId 时（PVA NTNDArray）按 ID 序列精确统计丢帧/重复/乱序；
+    否则按每个 PV 自己的帧周期估计（PeriodEstimator：最近帧间隔的滑动中位数，
+    随帧率变化自动调整），间隔 > 1.5 个周期记为丢帧，远超周期记为停顿，
+    远小于周期记为突发。优先使用 IOC 时间戳 (CA DBR_TIME) 的间隔，
+    没有 IOC 时间戳时才使用客户端接收时间间隔。avg_dt 只作为周期的初值。
+    """
+
+    name = "loss"
+
+    def __init__(self, pv_names, results_dir="results", avg_dt=None, report_interval=10):
+        self.report_interval = report_interval
+        super().__init__(pv_names, results_dir)
+        self.avg_dt = avg_dt
+        self.method = {pv: "arrival" for pv in self.pv_names}
+        self.sequences = {pv: SequenceTracker() for pv in self.pv_names}
+        # 每个 PV 独立估计帧周期，混合 10/30/60 FPS 的相机可在一次运行中测量
+        self.periods = {pv: PeriodEstimator(period=avg_dt) for pv in self.pv_names}
+        self.writer = ResultWriter(result_path(results_dir, "packetloss"),
+                                   ["pv", "total_frames", "lost_frames", "loss_rate_percent",
+                                    "duplicate_frames", "reordered_frames", "method", "timestamp",
+                                    "period_ms", "bursts", "burst_frames", "stalls", "stall_sec"],
+                                   dtypes=["category", "i8", "i8", "f8", "i8", "i8", "category", "f8",
+                                           "f8", "i8", "i8", "i8", "f8"])
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--avg-dt", type=float, default=None,
+                            help="帧间隔初值 (秒)；默认不指定，按每个 PV 最近帧间隔的滑动中位数自动估计")
+        parser.add_argument("--report-interval", type=int, default=10, help="丢包统计写入间隔秒数 (默认10)")
+
+    @classmethod
+    def from_args(cls, pv_names, args, results_dir):
+        return cls(pv_names, results_dir, avg_dt=args.avg_dt, report_interval=args.report_interval)
+
+    def on_update(self, pvname, value, timestamp, meta=None):
+        if meta is not None and meta.unique_id is not None:
+            self.method[pvname] = "unique_id"
+            self.sequences[pvname].update(meta.unique_id)
+        elif meta is not None and meta.ioc_time is not None:
+            self.method[pvname] = "ioc_timestamp"
+        # 有 uniqueId 时丢帧按 ID 统计，周期估计只提供帧率、突发和停顿
+        if meta is not None and meta.ioc_time is not None:
+            self.periods[pvname].update(meta.ioc_time)
+        else:
+            self.periods[pvname].update(meta.recv_mono if meta is not None else time.monotonic())
+
+    def report(self, now):
+        for pv in self.pv_names:
+            seq = self.sequences[pv]
+            est = self.periods[pv]
+            if self.method[pv] == "unique_id":
+                total, lost = seq.expected, seq.lost
+            else:
+                total, lost = est.expected, est.lost
+            loss_rate = (lost / total * 100) if total > 0 else 0
+            period_ms = est.period * 1e3 if est.period else float("nan")
+            self.writer.push((pv, total, lost, loss_rate, seq.duplicates, seq.reordered, self.method[pv], now,
+                              period_ms, est.bursts, est.burst_frames, est.stalls, est.stall_sec))
+
+    def close(self):
+        self.writer.close()
+        print(self.writer.format_stats())
+
+
+@register_analyzer
+class ResourceAnalyzer(Analyzer):
+    """CPU/内存占用采样，写入 cpu.csv（替代原 04_cpu.py）"""
+
+    name = "resources"
+
+    def __init__(self, pv_names, results_dir="results", sample_interval=1.0, resource_interval=0.1, nic=None):
+        self.report_interval = sample_interval
+        super().__init__(pv_names, results_dir)
+        import psutil  # only needed when this analyzer is enabled
+        self._psutil = psutil
+        self._proc = psutil.Process()
+        psutil.cpu_percent(interval=None)  # prime the counters
+        self._proc.cpu_percent(interval=None)
+        self.update_count = 0
+        self.payload_bytes = 0
+        # 高频进程/线程/网卡采样，得出相对回调负载的线上开销；首个 tick（测量开始）时启动
+        self.sampler = ResourceSampler(resource_interval, nic=nic, payload_source=lambda: self.payload_bytes,
+                                       frames_source=lambda: self.update_count)
+        self._sampling = False
+        self.writer = ResultWriter(result_path(results_dir, "cpu"),
+                                   ["timestamp", "cpu_percent", "memory_percent", "process_cpu_percent",
+                                    "process_rss_mb", "update_count"],
+                                   dtypes=["f8", "f8", "f8", "f8", "f8", "i8"])
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--cpu-interval", type=float, default=1.0, help="CPU 采样间隔秒数 (默认1)")
+        add_resource_arguments(parser)
+
+    @classmethod
+    def from_args(cls, pv_names, args, results_dir):
+        return cls(pv_names, results_dir, sample_interval=args.cpu_interval,
+                   resource_interval=args.sample_interval, nic=args.nic)
+
+    def on_update(self, pvname, value, timestamp, meta=None):
+        self.update_count += 1
+        self.payload_bytes += getattr(value, 'nbytes', 0)
+
+    def tick(self, now):
+        if not self._sampling:
+            self.sampler.protocol = RUN_METADATA.get('protocol')
+            self.sampler.start()
+            self._sampling = True
+        super().tick(now)
+
+    def report(self, now):
+        mem = self._psutil.virtual_memory()
+        self.writer.push((now, self._psutil.cpu_percent(interval=None), mem.percent,
+                          self._proc.cpu_percent(interval=None),
+                          self._proc.memory_info().rss / 1024 / 1024, self.update_count))
+
+    def close(self):
+        self.writer.close()
+        print(self.writer.format_stats())
+        self.sampler.stop()
+        paths = self.sampler.save(os.path.join(self.results_dir, "run"))
+        print(f"Resource samples saved to: {', '.join(paths)}")
+        self.sampler.print_summary()
+
+
+@register_analyzer
+class LiveAnalyzer(Analyzer):
+    """滑动窗口实时指标：Prometheus HTTP 端点 (--metrics-port) 和/或终端仪表盘 (--dashboard)"""
+
+    name = "live"
+
+    def __init__(self, pv_names, results_dir="results", args=None):
+        super().__init__(pv_names, results_dir)
+        if args is None:
+            args = argparse.Namespace(metrics_port=9108, dashboard=False, window=10.0)
+        elif args.metrics_port is None and not args.dashboard:
+            args = argparse.Namespace(**{**vars(args), 'metrics_port': 9108})
+        self.metrics, self._closers = start_live(self.pv_names, args)
+        self.index = self.metrics.index
+
+    @classmethod
+    def add_arguments(cls, parser):
+        add_live_arguments(parser)
+
+    @classmethod
+    def from_args(cls, pv_names, args, results_dir):
+        return cls(pv_names, results_dir, args=args)
+
+    def on_update(self, pvname, value, timestamp, meta=None):
+        nbytes = getattr(value, 'nbytes', 0)
+        if meta is None:
+            self.metrics.record(self.index[pvname], time.monotonic(), nbytes)
+            return
+        latency = meta.recv_time - meta.ioc_time if meta.ioc_time is not None else None
+        self.metrics.record(self.index[pvname], meta.recv_mono, nbytes, latency, meta.unique_id)
+
+    def observe_backlog(self, depths):
+        for pv, depth in depths.items():
+            self.metrics.set_backlog(self.index[pv], depth)
+
+    def close(self):
+        for c in self._closers:
+            c.close()
+
+
+# ----------------------------------------------------------------------
+# Runner helpers
+# ----------------------------------------------------------------------
+def add_analyzer_arguments(parser: argparse.ArgumentParser, names: Optional[Sequence[str]] = None) -> None:
+    for name in (names or list(ANALYZERS)):
+        ANALYZERS[name].add_arguments(parser)
+
+
+def make_analyzers(names: Sequence[str], pv_names: Sequence[str], args: argparse.Namespace,
+                   results_dir: str = "results") -> List[Analyzer]:
+    unknown = [n for n in names if n not in ANALYZERS]
+    if unknown:
+        raise ValueError(f"unknown analyzer(s): {', '.join(unknown)}; available: {', '.join(ANALYZERS)}")
+    return [ANALYZERS[n].from_args(pv_names, args, results_dir) for n in names]
+
+
+def run_analyzers(analyzers: Sequence[Analyzer], pv_names: Sequence[str], protocol: str,
+                  duration: Optional[float] = None, tick: float = 0.5, payload: str = "full",
+                  profiler: Optional[Any] = None, decoder: Optional[Any] = None,
+                  tracker: Optional[Any] = None, connect_timeout: float = 10.0,
+                  options: Optional[Any] = None, overrun: Optional[Any] = None) -> None:
+    """Subscribe once to every PV, fan out to `analyzers` until Ctrl+C or `duration` seconds.
+
+    `payload`, `profiler`, `decoder`, `tracker`, `options` and `overrun` are passed to
+    create_monitors (the overrun counter is reset when the tracker's gate opens); the built-in
+    analyzers only need sizes and timing, so 'meta' avoids materializing images for them.
+    With a ConnectionTracker the analyzers see no updates, and `duration` does not start,
+    until every PV is live (or `connect_timeout` expired) and the tracker's warm-up elapsed.
+    """
+    RUN_METADATA.update(run_metadata(protocol, pv_names, payload=payload,
+                                     analyzers=[a.name for a in analyzers],
+                                     **(options.metadata() if options is not None else {})))
+    fanout = FanOut(analyzers)
+    monitors, backend = create_monitors(list(pv_names), protocol, fanout, with_meta=True, payload=payload,
+                                        profiler=profiler, decoder=decoder, tracker=tracker,
+                                        options=options, overrun=overrun)
+    try:
+        if tracker is not None:
+            tracker.wait_live(connect_timeout)
+            tracker.print_summary()
+            if overrun is not None:
+                overrun.reset()
+        end = time.time() + duration if duration else None
+        while end is None or time.time() < end:
+            time.sleep(tick)
+            now = time.time()
+            for analyzer in analyzers:
+                analyzer.tick(now)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if overrun is not None:
+            overrun.collect_library_stats(monitors)
+        cleanup_monitors(monitors, backend)
+        if decoder is not None:
+            decoder.close()
+        for analyzer in analyzers:
+            try:
+                analyzer.close()
+            except Exception as e:
+                print(f"Analyzer {analyzer.name} close error: {e}")
+
+
+class LoopLagMonitor:
+    """Measure asyncio event-loop lag: how late a sleep(interval) wakes up."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.histogram = LatencyHistogram()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.histogram.record(loop.time() - t0 - self.interval)
+
+
+async def run_analyzers_async(analyzers: Sequence[Analyzer], pv_names: Sequence[str], protocol: str,
+                              duration: Optional[float] = None, tick: float = 0.5, payload: str = "full",
+                              queue_depth: int = 4, options: Optional[Any] = None,
+                              lag_path: Optional[str] = None, tracker: Optional[Any] = None,
+                              connect_timeout: float = 10.0) -> Dict[str, Any]:
+    """asyncio counterpart of run_analyzers: one consumer task per PV stream.
+
+    With a ConnectionTracker, updates reach the analyzers (and `duration` starts) only
+    once every PV is live (or `connect_timeout` expired) and the warm-up elapsed.
+    Returns a summary with per-PV queue statistics and event-loop lag percentiles,
+    also when the run is cancelled (Ctrl+C under asyncio.run). The lag histogram is
+    written to `lag_path` during cleanup, so it is kept even if KeyboardInterrupt
+    escapes the loop.
+    """
+    RUN_METADATA.update(run_metadata(protocol, pv_names, payload=payload, backend="async",
+                                     analyzers=[a.name for a in analyzers],
+                                     **(options.metadata() if options is not None else {})))
+    if tracker is not None:
+        for pv in pv_names:
+            tracker.mark_created(pv)
+    streams, backend = await create_monitors_async(list(pv_names), protocol, queue_depth=queue_depth,
+                                                   payload=payload, options=options)
+    errors = 0
+
+    async def consume(pv, stream):
+        nonlocal errors
+        # streams carry no connection events: the first update marks the PV connected
+        track = tracker.wrap(pv, lambda: None, implicit_connect=True) if tracker is not None else None
+        async for pvname, value, timestamp, meta in stream:
+            if track is not None:
+                track()
+                if not tracker.open:
+                    continue
+            for analyzer in analyzers:
+                try:
+                    await analyzer.on_update_async(pvname, value, timestamp, meta)
+                except Exception as e:
+                    errors += 1
+                    if errors <= 10:
+                        print(f"Analyzer {analyzer.name} error on {pvname}: {e}")
+
+    lag = LoopLagMonitor()
+    tasks = [asyncio.create_task(consume(pv, stream)) for pv, stream in streams.items()]
+    lag_task = asyncio.create_task(lag.run())
+    loop = asyncio.get_running_loop()
+    try:
+        if tracker is not None:
+            await loop.run_in_executor(None, tracker.wait_live, connect_timeout)
+            tracker.print_summary()
+        end = loop.time() + duration if duration else None
+        while end is None or loop.time() < end:
+            await asyncio.sleep(tick)
+            now = time.time()
+            depths = {pv: st.depth for pv, st in streams.items()}
+            for analyzer in analyzers:
+                analyzer.observe_backlog(depths)
+                analyzer.tick(now)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        lag_task.cancel()
+        if lag_path:
+            lag.histogram.save(lag_path)
+        try:
+            await cleanup_monitors_async(streams, backend)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for analyzer in analyzers:
+                try:
+                    analyzer.close()
+                except Exception as e:
+                    print(f"Analyzer {analyzer.name} close error: {e}")
+
+    return {
+        'streams': {pv: {'received': st.received, 'dropped': st.dropped, 'max_depth': st.max_depth}
+                    for pv, st in streams.items()},
+        'loop_lag': lag.histogram.summary(),
+        'loop_lag_histogram': lag.histogram,
+    }
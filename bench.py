@@ -0,0 +1,474 @@
+"""Regression benchmarks for the client_utils per-update path.
+
+Each case runs one callback ('latency', 'throughput', 'loss' analyzers or
+04's 'stress' monitor) behind one backend (CA or PVA) and one payload mode,
+fed from one of two sources:
+
+- 'inproc': an `EventInjector` calls the exact callable create_monitors
+  would hand to pyepics / p4p (`client_utils.make_library_callback`) with
+  preallocated events shaped like the library's, so the numbers isolate
+  this repository's Python path from the network and the libraries.
+- 'sim': `08_sim_ioc.py` is started in a child process and the case
+  subscribes through create_monitors, so the libraries' receive and
+  dispatch cost is included (needs p4p / pyepics + pcaspy).
+
+Per repeat a case yields updates/s, process CPU ns per update and callback
+latency p50/p99/p99.9 from timed passes. A separate pass runs under
+tracemalloc, so tracing does not slow the timed numbers. It measures the
+bytes each update allocates above what was live before it (temporaries,
+copies; the per-callback peak), and the memory blocks still live per update
+afterwards (growth and leaks).
+Repeats are stored as sample lists in a JSON baseline:
+
+    results = run_suite(sources=("inproc",), protocols=("ca", "pva"), repeats=5)
+    save_results("results/bench/baseline.json", results)
+    rows = compare(load_results("results/bench/baseline.json"), results)
+
+`compare` flags a metric as a regression only when it got worse by more
+than `threshold` (relative; absolute for retained blocks, whose baseline
+is usually ~0) AND a one-sided permutation test on the repeat
+samples gives p < `alpha`, so run-to-run noise alone does not fail a build.
+With n repeats per side the smallest exact p-value is 1 / C(2n, n): use at
+least 4 repeats (p >= 1/70) for alpha 0.05.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import gc
+import importlib
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from client_utils import create_monitors, cleanup_monitors, make_library_callback
+from histogram import LatencyHistogram
+
+SOURCES = ("inproc", "sim")
+PROTOCOLS = ("ca", "pva")
+CALLBACKS = ("latency", "throughput", "loss", "stress")
+PAYLOADS = ("full", "zerocopy", "meta")
+
+# metric -> (better direction, regression threshold kind)
+METRICS: Dict[str, Tuple[str, str]] = {
+    'updates_per_sec': ("higher", "relative"),
+    'cpu_ns_per_update': ("lower", "relative"),
+    'alloc_bytes_per_update': ("lower", "relative"),
+    'retained_blocks_per_update': ("lower", "absolute"),
+    'callback_p50_ns': ("lower", "relative"),
+    'callback_p99_ns': ("lower", "relative"),
+    'callback_p999_ns': ("lower", "relative"),
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def case_key(source: str, protocol: str, callback: str, payload: str) -> str:
+    return f"{source}/{protocol}/{callback}/{payload}"
+
+
+def make_callback(name: str, pv_names: Sequence[str], results_dir: str) -> Tuple[Callable[..., None], bool, Any]:
+    """(user callback, with_meta, owner) for a benchmarked callback; `owner.close()` if it has one."""
+    if name == "stress":
+        # 04_stress_test is a script module; its monitor is the non-meta callback under test
+        stress = importlib.import_module("04_stress_test")
+        monitor = stress.StressTestMonitor(pv_names)
+        return monitor.on_update, False, monitor
+    from analyzers import ANALYZERS
+    if name not in ANALYZERS:
+        raise ValueError(f"unknown callback '{name}'; use one of {', '.join(CALLBACKS)}")
+    analyzer = ANALYZERS[name](pv_names, results_dir)
+    return analyzer.on_update, True, analyzer
+
+
+class EventInjector:
+    """Preallocated library-shaped updates replayed into per-PV library callbacks.
+
+    CA events are the keyword arguments pyepics passes (form='time'). PVA
+    events are what p4p delivers: for payload 'full' an NT-unwrapped ndarray
+    carrying the raw Value in `.raw`, otherwise a raw (nt=False) Value, both
+    with uniqueId and timeStamp. IOC times advance by 1/fps per PV so the
+    loss and latency callbacks see a regular stream; all events share a
+    small pool of frame buffers.
+    """
+
+    def __init__(self, pv_names: Sequence[str], protocol: str, updates: int, width: int = 1024,
+                 height: int = 1024, dtype: str = "uint8", fps: float = 30.0, payload: str = "full"):
+        self.pv_names = list(pv_names)
+        self.protocol = protocol
+        self.payload = payload
+        self.updates = int(updates)
+        from sim_ioc import FramePool
+        pool = FramePool(width, height, dtype, depth=4)
+        self.nbytes = pool.nbytes
+        # stamps end just before now so the IOC-to-callback latency stays realistic
+        t0 = time.time() - self.updates / (fps * len(self.pv_names)) - 1.0
+        n = len(self.pv_names)
+        self.events: List[Tuple[int, Any]] = []
+        for k in range(self.updates):
+            i = k % n
+            uid = k // n + 1
+            ts = t0 + uid / fps
+            self.events.append((i, self._event(self.pv_names[i], pool.get(uid), ts, uid)))
+
+    def _event(self, pvname: str, frame: np.ndarray, ts: float, uid: int) -> Any:
+        sec = int(ts)
+        nsec = int((ts - sec) * 1e9)
+        if self.protocol == "ca":
+            flat = frame.reshape(-1)
+            return {'pvname': pvname, 'value': flat, 'char_value': '<array>', 'count': flat.size,
+                    'type': 'time_char', 'status': 0, 'severity': 0, 'timestamp': ts,
+                    'posixseconds': sec, 'nanoseconds': nsec}
+        raw = {'value': frame.reshape(-1), 'uniqueId': uid,
+               'dimension': [{'size': frame.shape[1]}, {'size': frame.shape[0]}],
+               'timeStamp.secondsPastEpoch': sec, 'timeStamp.nanoseconds': nsec}
+        if self.payload != "full":
+            return raw
+        val = frame.view(_NTArray)
+        val.raw = raw
+        return val
+
+    def callbacks(self, user_callback: Callable[..., None], with_meta: bool) -> List[Callable[..., Any]]:
+        return [make_library_callback(pv, self.protocol, user_callback, with_meta=with_meta, payload=self.payload)
+                for pv in self.pv_names]
+
+    def run(self, callbacks: Sequence[Callable[..., Any]]) -> None:
+        if self.protocol == "ca":
+            for i, kw in self.events:
+                callbacks[i](**kw)
+        else:
+            for i, val in self.events:
+                callbacks[i](val)
+
+    def run_timed(self, callbacks: Sequence[Callable[..., Any]]) -> np.ndarray:
+        """Replay once timing every library callback; returns the durations in ns."""
+        clock = time.perf_counter_ns
+        durations = [0] * len(self.events)
+        ca = self.protocol == "ca"
+        for k, (i, ev) in enumerate(self.events):
+            if ca:
+                t = clock()
+                callbacks[i](**ev)
+            else:
+                t = clock()
+                callbacks[i](ev)
+            durations[k] = clock() - t
+        return np.array(durations, dtype=np.int64)
+
+    def run_traced(self, callbacks: Sequence[Callable[..., Any]]) -> int:
+        """Replay once under tracemalloc; returns the summed per-callback allocation peaks in bytes."""
+        traced = tracemalloc.get_traced_memory
+        reset = tracemalloc.reset_peak
+        total = 0
+        ca = self.protocol == "ca"
+        for i, ev in self.events:
+            reset()
+            before = traced()[0]
+            if ca:
+                callbacks[i](**ev)
+            else:
+                callbacks[i](ev)
+            total += traced()[1] - before
+        return total
+
+
+class _NTArray(np.ndarray):
+    """ndarray with a `.raw` Value, like p4p's NT-unwrapped NTNDArray."""
+    raw: Any = None
+
+
+def _measure(run: Callable[[], int]) -> Dict[str, float]:
+    """Updates/s and CPU ns per update of `run()` (which returns updates done)."""
+    gc.collect()
+    cpu = time.process_time_ns()
+    wall = time.perf_counter()
+    n = run()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time_ns() - cpu
+    n = max(n, 1)
+    return {
+        'updates': n,
+        'updates_per_sec': n / wall if wall > 0 else 0.0,
+        'cpu_ns_per_update': cpu / n,
+    }
+
+
+def _alloc_metrics(run: Callable[[], Tuple[int, int]]) -> Dict[str, float]:
+    """Allocated and retained memory per update of `run()`, which runs under tracemalloc and
+    returns (updates done, summed per-update allocation peaks in bytes)."""
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        n, peak_bytes = run()
+        gc.collect()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    n = max(n, 1)
+    return {'alloc_bytes_per_update': peak_bytes / n, 'retained_blocks_per_update': retained / n}
+
+
+def _close_quietly(owner: Any) -> None:
+    # analyzers print their writer statistics on close; that is noise here
+    close = getattr(owner, 'close', None)
+    if close is not None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            close()
+
+
+def _latency_metrics(ns: np.ndarray) -> Dict[str, float]:
+    hist = LatencyHistogram(max_value=1.0, unit=1e-9)
+    hist.record_many(ns * 1e-9)
+    return {
+        'callback_p50_ns': hist.percentile(50.0) * 1e9,
+        'callback_p99_ns': hist.percentile(99.0) * 1e9,
+        'callback_p999_ns': hist.percentile(99.9) * 1e9,
+    }
+
+
+def run_inproc_case(protocol: str, callback: str, payload: str = "full", cameras: int = 4, updates: int = 20000,
+                    width: int = 1024, height: int = 1024, dtype: str = "uint8", fps: float = 30.0) -> Dict[str, float]:
+    """One repeat of a case against the in-process injector."""
+    pv_names = [f"BENCH:image{i + 1}:ArrayData" for i in range(cameras)]
+    injector = EventInjector(pv_names, protocol, updates, width, height, dtype, fps, payload)
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    try:
+        user_cb, with_meta, owner = make_callback(callback, pv_names, tmp)
+        callbacks = injector.callbacks(user_cb, with_meta)
+        injector.run(callbacks)  # warm-up: first-touch of per-PV state and writer buffers
+
+        def replay() -> int:
+            injector.run(callbacks)
+            return injector.updates
+
+        result = _measure(replay)
+        result.update(_latency_metrics(injector.run_timed(callbacks)))
+        result.update(_alloc_metrics(lambda: (injector.updates, injector.run_traced(callbacks))))
+        _close_quietly(owner)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def run_sim_case(protocol: str, callback: str, payload: str = "full", cameras: int = 4, duration: float = 10.0,
+                 warmup: float = 3.0, width: int = 1024, height: int = 1024, dtype: str = "uint8",
+                 fps: float = 30.0) -> Dict[str, float]:
+    """One repeat of a case subscribed through create_monitors to a local 08_sim_ioc.py."""
+    from sim_ioc import sim_pv_names
+    from sweep import start_sim, stop_sim
+    pv_names = sim_pv_names(cameras)
+    env = dict(os.environ)
+    if protocol == "ca":
+        frame_bytes = width * height * np.dtype(dtype).itemsize
+        env['EPICS_CA_MAX_ARRAY_BYTES'] = str(max(frame_bytes + 4096, int(env.get('EPICS_CA_MAX_ARRAY_BYTES', 0))))
+        os.environ['EPICS_CA_MAX_ARRAY_BYTES'] = env['EPICS_CA_MAX_ARRAY_BYTES']
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    sim = start_sim(protocol, cameras, width, height, fps, dtype=dtype, env=env, settle=2.0)
+    monitors, backend = [], None
+    try:
+        user_cb, with_meta, owner = make_callback(callback, pv_names, tmp)
+        hist = LatencyHistogram(max_value=1.0, unit=1e-9)
+        counter = [0]
+        gate = [False]
+        # allocation pass: [on, updates, summed allocation peaks]; peaks are process-wide, so
+        # they include what the library's threads allocate meanwhile
+        traced = [False, 0, 0]
+        clock = time.perf_counter_ns
+
+        def timed(*args):
+            if traced[0]:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                user_cb(*args)
+                traced[1] += 1
+                traced[2] += tracemalloc.get_traced_memory()[1] - before
+                return
+            t = clock()
+            user_cb(*args)
+            if gate[0]:
+                hist.record((clock() - t) * 1e-9)
+                counter[0] += 1
+
+        monitors, backend = create_monitors(pv_names, protocol, timed, with_meta=with_meta, payload=payload)
+        time.sleep(warmup)
+
+        def window() -> int:
+            gate[0] = True
+            time.sleep(duration)
+            gate[0] = False
+            return counter[0]
+
+        result = _measure(window)
+        result.update({
+            'callback_p50_ns': hist.percentile(50.0) * 1e9,
+            'callback_p99_ns': hist.percentile(99.0) * 1e9,
+            'callback_p999_ns': hist.percentile(99.9) * 1e9,
+        })
+
+        def traced_window() -> Tuple[int, int]:
+            traced[0] = True
+            time.sleep(max(1.0, duration / 2))
+            traced[0] = False
+            return traced[1], traced[2]
+
+        result.update(_alloc_metrics(traced_window))
+        _close_quietly(owner)
+    finally:
+        cleanup_monitors(monitors, backend)
+        stop_sim(sim)
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def run_suite(sources: Iterable[str] = ("inproc",), protocols: Iterable[str] = PROTOCOLS,
+              callbacks: Iterable[str] = CALLBACKS, payloads: Iterable[str] = ("full",), repeats: int = 5,
+              progress: Optional[Callable[[str], None]] = print, **kwargs: Any) -> Dict[str, Any]:
+    """Run every source x protocol x callback x payload case `repeats` times.
+
+    kwargs go to the case runners: cameras, width, height, dtype, fps, plus
+    `updates` (inproc) or `duration` / `warmup` (sim).
+    """
+    inproc_keys = ('cameras', 'updates', 'width', 'height', 'dtype', 'fps')
+    sim_keys = ('cameras', 'duration', 'warmup', 'width', 'height', 'dtype', 'fps')
+    cases: Dict[str, Dict[str, List[float]]] = {}
+    for source, protocol, callback, payload in itertools.product(sources, protocols, callbacks, payloads):
+        key = case_key(source, protocol, callback, payload)
+        samples: Dict[str, List[float]] = {m: [] for m in METRICS}
+        for r in range(max(1, repeats)):
+            if source == "inproc":
+                res = run_inproc_case(protocol, callback, payload, **{k: v for k, v in kwargs.items() if k in inproc_keys})
+            elif source == "sim":
+                res = run_sim_case(protocol, callback, payload, **{k: v for k, v in kwargs.items() if k in sim_keys})
+            else:
+                raise ValueError(f"unknown source '{source}'; use one of {', '.join(SOURCES)}")
+            for m in METRICS:
+                samples[m].append(float(res[m]))
+            if progress is not None:
+                progress(f"  {key} [{r + 1}/{repeats}] {res['updates_per_sec']:.0f} upd/s, "
+                         f"{res['cpu_ns_per_update']:.0f} CPU ns/upd, {res['alloc_bytes_per_update']:.0f} B alloc/upd, "
+                         f"{res['retained_blocks_per_update']:.2f} retained blocks/upd, "
+                         f"p99 {res['callback_p99_ns']:.0f} ns")
+        cases[key] = samples
+    return {'meta': bench_metadata(kwargs), 'cases': cases}
+
+
+def bench_metadata(config: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                             text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        rev = None
+    return {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'git_rev': rev,
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'config': dict(config),
+    }
+
+
+def save_results(path: str, results: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def permutation_pvalue(baseline: Sequence[float], current: Sequence[float], worse: str = "lower",
+                       rounds: int = 10000, seed: int = 0) -> float:
+    """One-sided p-value that `current` is worse than `baseline` (difference of means).
+
+    `worse` is the direction of a regression: 'higher' values or 'lower'
+    values. Exact over all relabelings when there are at most `rounds`,
+    otherwise sampled.
+    """
+    a = np.asarray(baseline, dtype=np.float64)
+    b = np.asarray(current, dtype=np.float64)
+    if len(a) == 0 or len(b) == 0:
+        return 1.0
+    sign = 1.0 if worse == "higher" else -1.0
+    observed = sign * (b.mean() - a.mean())
+    pooled = np.concatenate([a, b])
+    n, nb = len(pooled), len(b)
+    combos = math.comb(n, nb)
+    if combos <= rounds:
+        total = pooled.sum()
+        hits = 0
+        for idx in itertools.combinations(range(n), nb):
+            sb = pooled[list(idx)].sum()
+            diff = sign * (sb / nb - (total - sb) / (n - nb))
+            if diff >= observed - 1e-12 * max(1.0, abs(observed)):
+                hits += 1
+        return hits / combos
+    rng = np.random.default_rng(seed)
+    hits = 0
+    for _ in range(rounds):
+        perm = rng.permutation(pooled)
+        diff = sign * (perm[:nb].mean() - perm[nb:].mean())
+        if diff >= observed:
+            hits += 1
+    return (hits + 1) / (rounds + 1)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.05,
+            alloc_threshold: float = 0.5, alpha: float = 0.05) -> List[Dict[str, Any]]:
+    """Per case and metric: baseline/current medians, change, p-value and whether it regressed.
+
+    Cases present in only one of the files are skipped.
+    """
+    rows = []
+    for key in sorted(set(baseline['cases']) & set(current['cases'])):
+        for metric, (better, kind) in METRICS.items():
+            a = baseline['cases'][key].get(metric) or []
+            b = current['cases'][key].get(metric) or []
+            if not a or not b:
+                continue
+            base, cur = float(np.median(a)), float(np.median(b))
+            worse = "lower" if better == "higher" else "higher"
+            delta = cur - base if worse == "higher" else base - cur  # > 0: got worse
+            if kind == "absolute":
+                change = cur - base
+                beyond = delta > alloc_threshold
+            else:
+                change = (cur - base) / base if base else 0.0
+                beyond = base != 0 and delta / abs(base) > threshold
+            p = permutation_pvalue(a, b, worse)
+            rows.append({
+                'case': key, 'metric': metric, 'baseline': base, 'current': cur, 'change': change,
+                'change_kind': kind, 'p_value': p, 'regression': bool(beyond and p < alpha),
+                'improvement': bool(delta < 0 and permutation_pvalue(a, b, better) < alpha
+                                    and (abs(change) > (alloc_threshold if kind == "absolute" else threshold))),
+            })
+    return rows
+
+
+def print_comparison(rows: Sequence[Dict[str, Any]], all_rows: bool = False) -> None:
+    print(f"  {'case':36s} {'metric':24s} {'baseline':>12s} {'current':>12s} {'change':>9s} {'p':>6s}")
+    for r in rows:
+        if not all_rows and not (r['regression'] or r['improvement']):
+            continue
+        change = f"{r['change']:+.2f}" if r['change_kind'] == "absolute" else f"{r['change'] * 100:+.1f}%"
+        flag = " REGRESSION" if r['regression'] else (" improved" if r['improvement'] else "")
+        print(f"  {r['case']:36s} {r['metric']:24s} {r['baseline']:12.4g} {r['current']:12.4g} "
+              f"{change:>9s} {r['p_value']:6.3f}{flag}")
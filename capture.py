@@ -0,0 +1,509 @@
+"""Record camera streams into memory-mapped capture files and replay them.
+
+A capture is one append-only file:
+
+- a 4 KiB header: magic, format version and a JSON block (PV names,
+  protocol, host, start time, free-form metadata),
+- then one record per frame: a 64-byte record header (PV index, dtype,
+  shape, uniqueId, IOC timestamp, client receive time on the wall and
+  monotonic clocks, payload size) followed by the raw array bytes, padded
+  so every payload starts 64-byte aligned.
+
+`CaptureWriter` maps the file and copies each frame straight into the map
+(one memcpy per frame, no Python objects kept). The file grows in
+`chunk_bytes` steps and is truncated to its used length on close; a capture
+cut short by a crash stays readable up to the last complete record.
+
+`CaptureReader` maps a capture read-only, indexes the record headers into
+NumPy columns and hands out frames as read-only ndarray views of the map,
+so reading a multi-GB capture copies nothing and only touches the pages
+being published:
+
+    with CaptureWriter("field.cap", CAMERA_PVS, protocol="pva") as writer:
+        monitors, backend = create_monitors(CAMERA_PVS, "pva", writer.on_update, with_meta=True)
+        ...
+    reader = CaptureReader("field.cap")
+    reader.frame(0)          # ndarray view, no copy
+    reader.intervals(0)      # receive-time intervals of the first PV
+
+`Replayer` republishes a capture over local PVA (p4p NTNDArray) and/or CA
+(pcaspy waveform), either with the recorded timing or `speed` times
+faster, from one scheduler thread like `sim_ioc.Simulator`. Frames keep
+their recorded uniqueId (loops continue the sequence) so loss analysis sees
+the original gaps; timestamps are the replay wall clock, so latency is
+measured against the replay. The CLIs are `13_record.py` and `14_replay.py`.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"EPICSCAP"
+VERSION = 1
+HEADER_SIZE = 4096
+ALIGN = 64
+# magic, pv index, dtype code, ndim, uniqueId, ioc time, recv time, recv mono, payload bytes, shape[4]
+RECORD = struct.Struct("<4sHBBqdddQ4I")
+RECORD_MAGIC = b"FRM1"
+MAX_DIMS = 4
+# dtype code <-> numpy dtype string; codes are stored in the file, only append
+DTYPE_CODES = ["|u1", "|i1", "<u2", "<i2", "<u4", "<i4", "<u8", "<i8", "<f4", "<f8"]
+_DTYPE_INDEX = {np.dtype(d): i for i, d in enumerate(DTYPE_CODES)}
+
+INDEX_COLUMNS = ("pv", "unique_id", "ioc_time", "recv_time", "recv_mono", "offset", "nbytes", "dtype", "ndim")
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class CaptureWriter:
+    """Append frames and their metadata to a memory-mapped capture file."""
+
+    def __init__(self, path: str, pv_names: Sequence[str], protocol: Optional[str] = None,
+                 metadata: Optional[Dict[str, Any]] = None, chunk_bytes: int = 256 << 20,
+                 max_bytes: Optional[int] = None):
+        """
+        Args:
+            path: capture file; overwritten.
+            pv_names: PVs that will be recorded; `index` maps names to record PV indices.
+            protocol: recorded in the header.
+            metadata: extra JSON-serializable header fields.
+            chunk_bytes: file growth step.
+            max_bytes: stop recording (and count the rest as skipped) beyond this file size.
+        """
+        self.path = path
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        self.chunk_bytes = max(chunk_bytes, mmap.PAGESIZE)
+        self.max_bytes = max_bytes
+        self.frames = [0] * len(self.pv_names)
+        self.bytes = [0] * len(self.pv_names)
+        self.skipped = 0
+        info = {
+            'version': VERSION,
+            'pv_names': self.pv_names,
+            'protocol': protocol,
+            'host': socket.gethostname(),
+            'start_time': time.time(),
+            'metadata': metadata or {},
+        }
+        blob = json.dumps(info).encode()
+        if len(MAGIC) + 8 + len(blob) > HEADER_SIZE:
+            raise ValueError("capture header too large (too many PVs or too much metadata)")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "w+b")
+        self._cap = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._grow(HEADER_SIZE + self.chunk_bytes)
+        self._mm[:len(MAGIC)] = MAGIC
+        struct.pack_into("<II", self._mm, len(MAGIC), VERSION, len(blob))
+        self._mm[len(MAGIC) + 8:len(MAGIC) + 8 + len(blob)] = blob
+        self._pos = HEADER_SIZE
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def _grow(self, size: int) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._f.truncate(size)
+        self._cap = size
+        self._mm = mmap.mmap(self._f.fileno(), size)
+
+    def write(self, pvname: str, array: Any, unique_id: Optional[int] = None, ioc_time: Optional[float] = None,
+              recv_time: Optional[float] = None, recv_mono: Optional[float] = None) -> bool:
+        """Append one frame; returns False if it was skipped (closed, max_bytes, unsupported dtype)."""
+        arr = np.asarray(array)
+        code = _DTYPE_INDEX.get(arr.dtype.newbyteorder("<") if arr.dtype.byteorder == ">" else arr.dtype)
+        if code is None or arr.ndim > MAX_DIMS or self.closed:
+            self.skipped += 1
+            return False
+        if arr.dtype.byteorder == ">":
+            arr = arr.astype(arr.dtype.newbyteorder("<"))
+        arr = np.ascontiguousarray(arr)
+        nbytes = arr.nbytes
+        shape = tuple(arr.shape) + (0,) * (MAX_DIMS - arr.ndim)
+        i = self.index[pvname]
+        size = _aligned(RECORD.size + nbytes)
+        if recv_time is None:
+            recv_time = time.time()
+        if recv_mono is None:
+            recv_mono = time.monotonic()
+        with self._lock:
+            if self.closed:
+                self.skipped += 1
+                return False
+            pos = self._pos
+            if self.max_bytes is not None and pos + size > self.max_bytes:
+                self.skipped += 1
+                return False
+            if pos + size > self._cap:
+                self._grow(self._cap + max(self.chunk_bytes, size))
+            mm = self._mm
+            data = pos + RECORD.size
+            # payload first, header last: a reader never sees a header without its payload
+            mm[data:data + nbytes] = arr.reshape(-1).view(np.uint8)
+            RECORD.pack_into(mm, pos, RECORD_MAGIC, i, code, arr.ndim,
+                             -1 if unique_id is None else int(unique_id),
+                             np.nan if ioc_time is None else ioc_time, recv_time, recv_mono, nbytes, *shape)
+            self._pos = pos + size
+            self.frames[i] += 1
+            self.bytes[i] += nbytes
+        return True
+
+    def on_update(self, pvname: str, value: Any, timestamp: Optional[float], meta: Any = None) -> None:
+        """create_monitors callback (with_meta=True); `FrameInfo` payloads are skipped."""
+        if not hasattr(value, 'dtype'):
+            self.skipped += 1
+            return
+        if meta is None:
+            self.write(pvname, value, ioc_time=timestamp)
+        else:
+            self.write(pvname, value, meta.unique_id, meta.ioc_time, meta.recv_time, meta.recv_mono)
+
+    @property
+    def size(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._mm.flush()
+            self._mm.close()
+            self._f.truncate(self._pos)
+            self._f.close()
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CaptureReader:
+    """Read-only view of a capture file: header info, record index and zero-copy frames."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        if size < HEADER_SIZE:
+            self._f.close()
+            raise ValueError(f"{path}: not a capture file (too short)")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a capture file")
+        version, n = struct.unpack_from("<II", self._mm, len(MAGIC))
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"{path}: capture format {version} is newer than supported ({VERSION})")
+        self.info: Dict[str, Any] = json.loads(self._mm[len(MAGIC) + 8:len(MAGIC) + 8 + n])
+        self.pv_names: List[str] = list(self.info['pv_names'])
+        self._scan(size)
+
+    def _scan(self, size: int) -> None:
+        """Index every complete record; stops at the first incomplete/unwritten one."""
+        rows = []
+        shapes = []
+        mm = self._mm
+        pos = HEADER_SIZE
+        unpack = RECORD.unpack_from
+        while pos + RECORD.size <= size:
+            magic, pv, code, ndim, uid, ioc, recv, mono, nbytes, *shape = unpack(mm, pos)
+            if magic != RECORD_MAGIC or pos + RECORD.size + nbytes > size:
+                break
+            rows.append((pv, uid, ioc, recv, mono, pos + RECORD.size, nbytes, code, ndim))
+            shapes.append(shape)
+            pos += _aligned(RECORD.size + nbytes)
+        self.data_end = pos
+        table = np.array(rows, dtype=[("pv", "i4"), ("unique_id", "i8"), ("ioc_time", "f8"), ("recv_time", "f8"),
+                                      ("recv_mono", "f8"), ("offset", "i8"), ("nbytes", "i8"), ("dtype", "i2"),
+                                      ("ndim", "i2")])
+        self.index: Dict[str, np.ndarray] = {name: table[name] for name in INDEX_COLUMNS}
+        self.shapes = np.array(shapes, dtype=np.int64).reshape(-1, MAX_DIMS)
+
+    def __len__(self) -> int:
+        return len(self.index['pv'])
+
+    def frame(self, k: int) -> np.ndarray:
+        """Frame `k` as a read-only ndarray view of the mapped file."""
+        ix = self.index
+        n = int(ix['nbytes'][k])
+        dtype = np.dtype(DTYPE_CODES[ix['dtype'][k]])
+        arr = np.frombuffer(self._mm, dtype=dtype, count=n // dtype.itemsize, offset=int(ix['offset'][k]))
+        ndim = int(ix['ndim'][k])
+        return arr.reshape(tuple(self.shapes[k, :ndim])) if ndim > 1 else arr
+
+    def frames_of(self, pv: int) -> np.ndarray:
+        """Record numbers belonging to PV index `pv`, in file order."""
+        return np.nonzero(self.index['pv'] == pv)[0]
+
+    def intervals(self, pv: int, clock: str = "recv") -> np.ndarray:
+        """Frame intervals of one PV on the receive ('recv') or IOC ('ioc') clock."""
+        t = self.index['recv_mono' if clock == "recv" else 'ioc_time'][self.frames_of(pv)]
+        return np.diff(t)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-PV frame count, duration, rate, volume, uniqueId gaps and interval spread."""
+        ix = self.index
+        out = []
+        for p, pv in enumerate(self.pv_names):
+            rec = self.frames_of(p)
+            mono = ix['recv_mono'][rec]
+            uid = ix['unique_id'][rec]
+            dt = np.diff(mono)
+            duration = float(mono[-1] - mono[0]) if len(rec) > 1 else 0.0
+            has_uid = len(uid) > 1 and (uid >= 0).all()
+            steps = np.diff(uid) if has_uid else np.array([], dtype=np.int64)
+            out.append({
+                'pv': pv,
+                'frames': int(len(rec)),
+                'duration_sec': duration,
+                'fps': (len(rec) - 1) / duration if duration > 0 else 0.0,
+                'mb': float(ix['nbytes'][rec].sum()) / 1024 / 1024,
+                'uid_missing': int((steps[steps > 1] - 1).sum()) if has_uid else 0,
+                'interval_p50': float(np.percentile(dt, 50)) if len(dt) else np.nan,
+                'interval_p99': float(np.percentile(dt, 99)) if len(dt) else np.nan,
+                'interval_max': float(dt.max()) if len(dt) else np.nan,
+            })
+        return out
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        except BufferError:
+            # frame views are still alive; the map is released with them
+            pass
+        self._f.close()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def replay_name(pv: str, prefix: Optional[str] = None) -> str:
+    """Served name for a recorded PV: `prefix` replaces its first ':' component ('13ARV222:' -> 'REPLAY:')."""
+    if not prefix:
+        return pv
+    head, sep, rest = pv.partition(":")
+    return prefix + (rest if sep else head)
+
+
+# ----------------------------------------------------------------------
+# Replay publishers
+# ----------------------------------------------------------------------
+class CapturePvaPublisher:
+    """p4p server publishing captured frames as NTNDArray."""
+
+    def __init__(self, reader: CaptureReader, names: Sequence[str]):
+        try:
+            from p4p.nt import NTNDArray  # type: ignore
+            from p4p.server import Server  # type: ignore
+            from p4p.server.thread import SharedPV  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("p4p not installed. Install with: pip install p4p") from e
+
+        self._nt = NTNDArray()
+        self._pvs: List[Any] = []
+        for p, name in enumerate(names):
+            rec = reader.frames_of(p)
+            initial = reader.frame(int(rec[0])) if len(rec) else np.zeros(1, dtype=np.uint8)
+            self._pvs.append(SharedPV(initial=self._nt.wrap(initial)))
+        self._server = Server(providers=[dict(zip(names, self._pvs))])
+
+    def publish(self, pv: int, frame: np.ndarray, unique_id: int, ts: float) -> None:
+        # the mapped view goes to p4p as is; no copy is made on the Python side
+        V = self._nt.wrap(frame)
+        sec = int(ts)
+        nsec = int((ts - sec) * 1e9)
+        V['uniqueId'] = unique_id & 0x7FFFFFFF
+        V['timeStamp.secondsPastEpoch'] = sec
+        V['timeStamp.nanoseconds'] = nsec
+        V['dataTimeStamp.secondsPastEpoch'] = sec
+        V['dataTimeStamp.nanoseconds'] = nsec
+        self._pvs[pv].post(V)
+
+    def close(self) -> None:
+        try:
+            self._server.stop()
+        except Exception:
+            pass
+
+
+class CaptureCaPublisher:
+    """pcaspy server publishing captured frames as waveforms plus UniqueId_RBV counters."""
+
+    def __init__(self, reader: CaptureReader, names: Sequence[str]):
+        try:
+            from pcaspy import SimpleServer, Driver  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("pcaspy not installed. Install with: pip install pcaspy") from e
+        from sim_ioc import CA_TYPES
+
+        ix = reader.index
+        pvdb: Dict[str, Dict[str, Any]] = {}
+        self._names = list(names)
+        self._uid_names = []
+        for p, name in enumerate(self._names):
+            rec = reader.frames_of(p)
+            dtype = np.dtype(DTYPE_CODES[ix['dtype'][rec[0]]]) if len(rec) else np.dtype("uint8")
+            count = int((ix['nbytes'][rec] // dtype.itemsize).max()) if len(rec) else 1
+            pvdb[name] = {'type': CA_TYPES.get(dtype.name, 'char'), 'count': count}
+            base = name[:-len(":ArrayData")] if name.endswith(":ArrayData") else name
+            self._uid_names.append(base + ":UniqueId_RBV")
+            pvdb[self._uid_names[-1]] = {'type': 'int'}
+        self._server = SimpleServer()
+        self._server.createPV("", pvdb)
+        self._driver = Driver()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._process, name="pcaspy", daemon=True)
+        self._thread.start()
+
+    def _process(self) -> None:
+        while not self._stop.is_set():
+            self._server.process(0.01)
+
+    def publish(self, pv: int, frame: np.ndarray, unique_id: int, ts: float) -> None:
+        # pcaspy copies the flat view into its gdd on updatePVs
+        with self._lock:
+            self._driver.setParam(self._names[pv], frame.reshape(-1))
+            self._driver.setParam(self._uid_names[pv], unique_id & 0x7FFFFFFF)
+            self._driver.updatePVs()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(1.0)
+
+
+# ----------------------------------------------------------------------
+# Scheduler
+# ----------------------------------------------------------------------
+class Replayer:
+    """Republish a capture with its recorded timing (or `speed` times faster)."""
+
+    def __init__(self, reader: CaptureReader, protocols: Iterable[str] = ("pva",), speed: float = 1.0,
+                 clock: str = "recv", prefix: Optional[str] = None, loop: bool = False,
+                 publishers: Optional[Sequence[Any]] = None):
+        """
+        Args:
+            reader: the capture.
+            protocols: 'pva' and/or 'ca'.
+            speed: time scale; 2.0 replays twice as fast, 0 sends as fast as possible.
+            clock: 'recv' keeps the receive timing the recording client saw (network
+                bursts and jitter included); 'ioc' uses the IOC timestamps.
+            prefix: serve under renamed PVs (see replay_name), e.g. to avoid clashing with the real IOC.
+            loop: start over at the end of the capture.
+        """
+        if clock not in ("recv", "ioc"):
+            raise ValueError("clock must be 'recv' or 'ioc'")
+        if len(reader) == 0:
+            raise ValueError(f"{reader.path}: capture holds no frames")
+        self.reader = reader
+        self.speed = speed
+        self.loop = loop
+        self.names = [replay_name(pv, prefix) for pv in reader.pv_names]
+        t = reader.index['recv_mono' if clock == "recv" else 'ioc_time']
+        if clock == "ioc" and np.isnan(t).any():
+            raise ValueError("capture has frames without IOC timestamps; use clock='recv'")
+        self.order = np.argsort(t, kind="stable")
+        self.offsets = t[self.order] - t[self.order[0]]
+        self.span = float(self.offsets[-1])
+        uid = reader.index['unique_id']
+        uid = uid[uid >= 0]
+        # a loop continues the uniqueId sequence instead of jumping back (which looks like an IOC restart)
+        self._uid_span = int(uid.max() - uid.min() + 1) if len(uid) else 0
+        if publishers is None:
+            publishers = []
+            for proto in protocols:
+                proto = proto.lower()
+                if proto == "pva":
+                    publishers.append(CapturePvaPublisher(reader, self.names))
+                elif proto == "ca":
+                    publishers.append(CaptureCaPublisher(reader, self.names))
+                else:
+                    raise ValueError("protocol must be 'ca' or 'pva'")
+        self.publishers = list(publishers)
+        n = len(reader.pv_names)
+        self.sent = [0] * n
+        self.bytes_sent = [0] * n
+        self.late = 0
+        self.max_late = 0.0
+        self.loops = 0
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, duration: Optional[float] = None, report_interval: float = 5.0,
+            report: Optional[Callable[[str], None]] = print) -> None:
+        reader = self.reader
+        pv_col = reader.index['pv']
+        uid_col = reader.index['unique_id']
+        nbytes_col = reader.index['nbytes']
+        scale = 1.0 / self.speed if self.speed > 0 else 0.0
+        t0 = time.monotonic()
+        end = t0 + duration if duration else float("inf")
+        wall0 = time.time() - t0
+        next_report = t0 + report_interval
+        base = t0
+        while not self._stop.is_set():
+            for k, offset in zip(self.order, self.offsets):
+                due = base + offset * scale
+                now = time.monotonic()
+                if now >= end or self._stop.is_set():
+                    return
+                if due > now:
+                    if self._stop.wait(min(due - now, end - now)):
+                        return
+                    now = time.monotonic()
+                elif now - due > 0.001:
+                    # behind schedule: send immediately, bursts stay bursts
+                    self.late += 1
+                    self.max_late = max(self.max_late, now - due)
+                p = int(pv_col[k])
+                uid = int(uid_col[k])
+                uid = uid + self.loops * self._uid_span if uid >= 0 else self.sent[p] + 1
+                frame = reader.frame(int(k))
+                ts = wall0 + now
+                for pub in self.publishers:
+                    pub.publish(p, frame, uid, ts)
+                self.sent[p] += 1
+                self.bytes_sent[p] += int(nbytes_col[k])
+                if report is not None and now >= next_report:
+                    report(f"[replay] loop {self.loops + 1}: frames sent={sum(self.sent)} "
+                           f"late={self.late} (max {self.max_late * 1e3:.1f} ms)")
+                    next_report = now + report_interval
+            if not self.loop:
+                return
+            self.loops += 1
+            # next pass starts one median frame period after the last frame
+            gap = float(np.median(np.diff(self.offsets))) if len(self.offsets) > 1 else 0.0
+            base = time.monotonic() + gap * scale
+
+    def close(self) -> None:
+        self.stop()
+        for pub in self.publishers:
+            pub.close()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [{
+            'pv': name,
+            'recorded_pv': pv,
+            'sent': self.sent[p],
+            'mb_sent': self.bytes_sent[p] / 1024 / 1024,
+        } for p, (pv, name) in enumerate(zip(self.reader.pv_names, self.names))]
@@ -18,20 +18,314 @@ Usage pattern (in scripts):
 
 All scripts run until Ctrl+C. On KeyboardInterrupt you may optionally
 call `cleanup_monitors(monitors, backend)` to close PVA context.
+
+Pass `with_meta=True` to receive a fourth argument, a `FrameMeta` with the
+NTNDArray `uniqueId` (PVA only), the IOC timestamp (PVA `timeStamp`, CA
+DBR_TIME) and the client receive time on both the wall and monotonic
+clocks:
+
+    def on_update(pvname, value, timestamp, meta):
+        latency = meta.recv_time - meta.ioc_time
+
+`payload` selects what the callback receives as `value`:
+
+- 'full' (default): the decoded array as before (p4p NT-unwrapped ndarray
+  reshaped to the image dimensions, pyepics numpy array).
+- 'zerocopy': a read-only ndarray view of the transport buffer. PVA uses a
+  raw (nt=False) context and hands out the array p4p wraps around the
+  received data without copying or reshaping.
+- 'meta': a `FrameInfo` (element count, dtype, byte size, shape) only; the
+  array is never handed to user code. Useful for throughput/loss scripts.
+
+pyepics always unpacks a CA update into a numpy array before calling back,
+so on CA 'zerocopy' and 'meta' only avoid work done after that point; the
+large savings are on PVA. `09_payload_modes.py` measures the per-frame CPU
+cost of each mode and protocol.
+
+`create_monitors_async` is an asyncio backend: each PV becomes a `PVStream`
+(an async iterator of `(pvname, value, timestamp, FrameMeta)`) with a
+bounded queue, so slow consumers drop their own oldest frames instead of
+stalling the delivery of every other PV:
+
+    streams, backend = await create_monitors_async(CAMERA_PVS, "pva", queue_depth=4)
+    async for pvname, value, timestamp, meta in streams[CAMERA_PVS[0]]:
+        ...
+    await cleanup_monitors_async(streams, backend)
+
+Pass `profiler=callback_profile.CallbackProfiler(pv_names)` to instrument
+the user callback (duration, IOC-timestamp-to-callback gap, delivering
+thread). The wrapper is installed once per PV at subscription time; with
+the default `profiler=None` the callback path is unchanged.
+
+Pass `decoder=ndcodec.NDArrayDecoder()` (PVA only) to receive decoded
+images from areaDetector IOCs that compress NTNDArrays (`codec` lz4, blosc,
+jpeg); compressed frames are decoded on the decoder's threads and the
+callback is invoked from there.
+
+Pass `options=monitor_options.MonitorOptions(...)` to set the PVA monitor
+queueSize/pipeline request, the CA event mask and EPICS_CA_MAX_ARRAY_BYTES
+for the run, and `overrun=monitor_options.OverrunCounter(pv_names)` to count
+updates the server or client library squashed (uniqueId or IOC timestamp
+gaps). Both default to None, which leaves the subscription and the callback
+path unchanged.
 """
 
 from __future__ import annotations
 
-from typing import Callable, List, Tuple, Optional, Any
+import asyncio
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple, Optional, Any
+
+# EPICS epoch (1990-01-01) in POSIX seconds. CA records that were never
+# processed report this (or zero) as their DBR_TIME stamp.
+EPICS_EPOCH = 631152000.0
+
+
+class FrameMeta(NamedTuple):
+    """Per-frame metadata delivered alongside the payload when with_meta=True."""
+
+    unique_id: Optional[int]  # NTNDArray uniqueId; None on CA
+    ioc_time: Optional[float]  # IOC timestamp (POSIX seconds), None if not provided
+    recv_time: float  # client wall clock at callback entry (time.time())
+    recv_mono: float  # client monotonic clock at callback entry (time.monotonic())
+
+
+PAYLOAD_MODES = ("full", "zerocopy", "meta")
+
+
+class FrameInfo(NamedTuple):
+    """Payload description delivered instead of the array when payload='meta'."""
+
+    count: int  # number of elements
+    dtype: str  # numpy dtype string, e.g. '|u1'
+    nbytes: int  # payload size in bytes as received
+    shape: Tuple[int, ...]  # image dimensions if known, else (count,)
+
+
+def _readonly_view(arr: Any) -> Any:
+    if hasattr(arr, 'flags'):
+        arr = arr.view()
+        arr.flags.writeable = False
+    return arr
+
+
+def _frame_info(arr: Any, shape: Optional[Tuple[int, ...]] = None) -> FrameInfo:
+    if hasattr(arr, 'nbytes'):
+        return FrameInfo(int(arr.size), arr.dtype.str, int(arr.nbytes), shape or tuple(arr.shape))
+    n = len(arr) if hasattr(arr, '__len__') else 1
+    return FrameInfo(n, '', 0, shape or (n,))
+
+
+def _valid_ioc_time(ts: Optional[float]) -> Optional[float]:
+    if ts is None or ts <= EPICS_EPOCH + 1:
+        return None
+    return ts
+
+
+def _pva_stamp(val: Any) -> Tuple[Optional[float], Optional[int]]:
+    """Return (IOC timestamp, uniqueId) from a PVA update."""
+    # p4p's NT unwrapping (e.g. ntndarray) keeps the full Value in .raw
+    raw = getattr(val, 'raw', val)
+    ts = None
+    uid = None
+    try:
+        # val.timeStamp has (secondsPastEpoch, nanoseconds)
+        ts = raw['timeStamp.secondsPastEpoch'] + raw['timeStamp.nanoseconds'] * 1e-9
+    except Exception:
+        try:
+            ts = val.timeStamp.secondsPastEpoch + val.timeStamp.nanoseconds * 1e-9  # type: ignore[attr-defined]
+        except Exception:
+            ts = getattr(val, 'timestamp', None)
+    try:
+        uid = int(raw['uniqueId'])
+    except Exception:
+        pass
+    return _valid_ioc_time(ts), uid
+
+
+def _pva_payload(val: Any) -> Any:
+    """Extract the numeric/array payload from a (possibly NT-unwrapped) PVA update."""
+    if hasattr(val, 'nbytes'):  # already an ndarray (p4p unwraps NTNDArray/NTScalarArray)
+        return val
+    data = val
+    for key in ("value", "data"):  # common normative field names
+        if hasattr(data, key):
+            try:
+                data = getattr(data, key)
+            except Exception:
+                pass
+            if hasattr(data, 'nbytes'):
+                break
+    return data
+
+
+def _pva_raw_array(val: Any) -> Any:
+    """The 'value' array of a raw (nt=False) Value; p4p wraps the received buffer without copying."""
+    try:
+        return val['value']
+    except Exception:
+        return _pva_payload(val)
+
+
+def _pva_view(val: Any) -> Any:
+    return _readonly_view(_pva_raw_array(val))
+
+
+def _pva_info(val: Any) -> FrameInfo:
+    arr = _pva_raw_array(val)
+    shape = None
+    try:
+        # NTNDArray dimension[] is fastest-varying first
+        dims = val['dimension']
+        if dims:
+            shape = tuple(int(d['size']) for d in reversed(dims))
+    except Exception:
+        pass
+    return _frame_info(arr, shape)
+
+
+def _ca_payload(payload: str) -> Callable[[Any], Any]:
+    if payload == "zerocopy":
+        return _readonly_view
+    if payload == "meta":
+        return _frame_info
+    return lambda value: value
+
+
+def _pva_extractor(payload: str, decoder: Optional[Any] = None) -> Tuple[bool, Optional[Callable[[Any], Any]]]:
+    """(nt, extract) for a PVA payload mode: whether the Context unwraps normative types,
+    and how a delivered value becomes the user payload."""
+    if decoder is not None:
+        # Raw Values: the codec fields are needed before any unwrapping
+        return False, None
+    if payload == "full":
+        return True, _pva_payload
+    return False, _pva_view if payload == "zerocopy" else _pva_info
+
+
+def _ca_callback(pvname: str, user_cb: Callable[..., None], with_meta: bool = False,
+                 payload: str = "full", overrun: Optional[Any] = None) -> Callable[..., None]:
+    """The pyepics callback for one PV, normalizing to user_cb(pvname, value, ts[, meta])."""
+    extract = _ca_payload(payload)
+    if with_meta:
+        def _cb(value=None, timestamp=None, pvname=pvname, posixseconds=None, nanoseconds=None, **k):
+            recv_mono = time.monotonic()
+            recv = time.time()
+            # form='time' subscriptions carry the IOC's DBR_TIME stamp
+            ioc = posixseconds + nanoseconds * 1e-9 if posixseconds is not None else timestamp
+            user_cb(pvname, extract(value), timestamp,
+                    FrameMeta(None, _valid_ioc_time(ioc), recv, recv_mono))
+    elif payload == "full":
+        # Wrap to normalize signature to user_callback(pvname, value, ts)
+        def _cb(value=None, timestamp=None, pvname=pvname, **k):  # pyepics passes pvname separately, but we bind here
+            user_cb(pvname, value, timestamp)
+    else:
+        def _cb(value=None, timestamp=None, pvname=pvname, **k):
+            user_cb(pvname, extract(value), timestamp)
+    if overrun is not None:
+        on_value = _cb
+
+        def _cb(value=None, timestamp=None, pvname=pvname, posixseconds=None, nanoseconds=None, **k):
+            ioc = posixseconds + nanoseconds * 1e-9 if posixseconds is not None else timestamp
+            overrun.observe(pvname, _valid_ioc_time(ioc))
+            on_value(value=value, timestamp=timestamp, pvname=pvname, posixseconds=posixseconds,
+                     nanoseconds=nanoseconds, **k)
+    return _cb
+
+
+def _pva_callback(pvname: str, user_cb: Callable[..., None], extract: Optional[Callable[[Any], Any]],
+                  with_meta: bool = False, payload: str = "full", decoder: Optional[Any] = None,
+                  overrun: Optional[Any] = None, tracker: Optional[Any] = None) -> Callable[[Any], None]:
+    """The p4p monitor callback for one PV; `extract` comes from _pva_extractor."""
+    if decoder is not None:
+        def _cb(val):
+            recv_mono = time.monotonic()
+            recv = time.time()
+            ts, uid = _pva_stamp(val)
+
+            def deliver(arr, shape):
+                if payload == "meta":
+                    arr = _frame_info(arr, shape)
+                elif payload == "zerocopy":
+                    arr = _readonly_view(arr)
+                if with_meta:
+                    user_cb(pvname, arr, ts, FrameMeta(uid, ts, recv, recv_mono))
+                else:
+                    user_cb(pvname, arr, ts)
+            decoder.submit(pvname, val, deliver)
+    elif with_meta:
+        def _cb(val):
+            recv_mono = time.monotonic()
+            recv = time.time()
+            ts, uid = _pva_stamp(val)
+            user_cb(pvname, extract(val), ts, FrameMeta(uid, ts, recv, recv_mono))
+    else:
+        def _cb(val):
+            # Attempt to extract timestamp (normative type)
+            ts, _ = _pva_stamp(val)
+            user_cb(pvname, extract(val), ts)
+    if overrun is not None:
+        counted = _cb
+
+        def _cb(val):
+            ts, uid = _pva_stamp(val)
+            overrun.observe(pvname, ts, uid)
+            counted(val)
+    if tracker is not None:
+        on_value = _cb
+
+        def _cb(val):
+            # notify_disconnect: channel loss arrives as an exception instance
+            if isinstance(val, Exception):
+                tracker.on_connection(pvname, False)
+                return
+            on_value(val)
+    return _cb
 
 
-def create_monitors(pv_names: List[str], protocol: str, user_callback: Callable[[str, Any, Optional[float]], None]) -> Tuple[List[Any], Optional[Any]]:
+def make_library_callback(pvname: str, protocol: str, user_callback: Callable[..., None],
+                          with_meta: bool = False, payload: str = "full",
+                          overrun: Optional[Any] = None) -> Callable[..., None]:
+    """The callable create_monitors hands to pyepics / p4p for one PV, without subscribing.
+
+    Lets benchmarks drive the exact per-update path (timestamping, payload
+    extraction, overrun accounting) with injected events. PVA values must be
+    shaped like the Context's output: NT-unwrapped for payload "full", raw
+    Values (nt=False) otherwise.
+    """
+    protocol = protocol.lower()
+    if protocol == "ca":
+        return _ca_callback(pvname, user_callback, with_meta, payload, overrun)
+    if protocol != "pva":
+        raise ValueError("protocol must be 'ca' or 'pva'")
+    _, extract = _pva_extractor(payload)
+    return _pva_callback(pvname, user_callback, extract, with_meta, payload, overrun=overrun)
+
+
+def create_monitors(pv_names: List[str], protocol: str, user_callback: Callable[..., None],
+                    with_meta: bool = False, payload: str = "full",
+                    profiler: Optional[Any] = None, decoder: Optional[Any] = None,
+                    tracker: Optional[Any] = None, options: Optional[Any] = None,
+                    overrun: Optional[Any] = None) -> Tuple[List[Any], Optional[Any]]:
     """Create monitors for given PV names using selected protocol.
 
+    Channels are created without waiting for any of them, so all PVs search
+    and connect in parallel; use a tracker's wait_live() to wait for them.
+
     Args:
         pv_names: list of PV names.
         protocol: 'ca' or 'pva'.
-        user_callback: callable(pvname, value, timestamp_seconds|None)
+        user_callback: callable(pvname, value, timestamp_seconds|None), or
+            callable(pvname, value, timestamp_seconds|None, FrameMeta) when with_meta is True.
+        with_meta: pass a FrameMeta as fourth argument.
+        payload: 'full', 'zerocopy' or 'meta' (see module docstring).
+        profiler: optional CallbackProfiler; wraps user_callback per PV.
+        decoder: optional ndcodec.NDArrayDecoder for compressed NTNDArrays (PVA only).
+        tracker: optional ConnectionTracker; records connect/first-update/reconnect
+            times and holds back updates until its gate opens.
+        options: optional MonitorOptions (PVA queueSize/pipeline, CA event mask,
+            EPICS_CA_MAX_ARRAY_BYTES).
+        overrun: optional OverrunCounter; sees every update, before the tracker's gate.
 
     Returns:
         (monitors, backend_context)
@@ -39,19 +333,36 @@ def create_monitors(pv_names: List[str], protocol: str, user_callback: Callable[
     protocol = protocol.lower()
     if protocol not in ("ca", "pva"):
         raise ValueError("protocol must be 'ca' or 'pva'")
+    if payload not in PAYLOAD_MODES:
+        raise ValueError(f"payload must be one of {PAYLOAD_MODES}")
+
+    if decoder is not None and protocol != "pva":
+        raise ValueError("decoder requires protocol 'pva'")
+
+    def callback_for(pv: str) -> Callable[..., None]:
+        cb = profiler.wrap(pv, user_callback) if profiler is not None else user_callback
+        return tracker.wrap(pv, cb, implicit_connect=protocol == "pva") if tracker is not None else cb
 
     if protocol == "ca":
+        if options is not None:
+            # libca reads it when pyepics creates the context, i.e. on the first channel
+            options.apply_environment()
         try:
             from epics import PV  # type: ignore
         except ImportError as e:
             raise RuntimeError("pyepics not installed. Install with: pip install pyepics") from e
 
+        auto_monitor = options.ca_auto_monitor() if options is not None else True
         monitors = []
         for pv in pv_names:
-            # Wrap to normalize signature to user_callback(pvname, value, ts)
-            def _cb(value=None, timestamp=None, pvname=pv, **k):  # pyepics passes pvname separately, but we bind here
-                user_callback(pvname, value, timestamp)
-            monitors.append(PV(pv, auto_monitor=True, callback=_cb))
+            _cb = _ca_callback(pv, callback_for(pv), with_meta, payload, overrun)
+            if tracker is not None:
+                tracker.mark_created(pv)
+                monitors.append(PV(pv, form='time', auto_monitor=auto_monitor, callback=_cb,
+                                   connection_callback=lambda pvname=None, conn=None, **k:
+                                   tracker.on_connection(pvname, bool(conn))))
+            else:
+                monitors.append(PV(pv, form='time', auto_monitor=auto_monitor, callback=_cb))
         return monitors, None
 
     # PVA path
@@ -60,31 +371,21 @@ def create_monitors(pv_names: List[str], protocol: str, user_callback: Callable[
     except ImportError as e:
         raise RuntimeError("p4p not installed. Install with: pip install p4p") from e
 
-    ctxt = Context('pva')  # you could also allow configuration via env
+    nt, extract = _pva_extractor(payload, decoder)
+    # nt=False: raw Values, skipping p4p's NT unwrapping (reshape, attribute dict) entirely
+    ctxt = Context('pva') if nt else Context('pva', nt=False)
     monitors = []
 
     def make_cb(pvname: str):
-        def _cb(val):
-            # Attempt to extract timestamp (normative type)
-            ts = None
-            try:
-                # val.timeStamp has (secondsPastEpoch, nanoseconds)
-                ts = val.timeStamp.secondsPastEpoch + val.timeStamp.nanoseconds * 1e-9  # type: ignore[attr-defined]
-            except Exception:
-                pass
-            # Extract actual numeric/array payload if nested
-            data = val
-            for key in ("value", "data"):  # common normative field names
-                if hasattr(data, key):
-                    try:
-                        data = getattr(data, key)
-                    except Exception:
-                        pass
-            user_callback(pvname, data, ts)
-        return _cb
+        return _pva_callback(pvname, callback_for(pvname), extract, with_meta, payload, decoder, overrun, tracker)
 
+    request = options.pva_request() if options is not None else None
     for pv in pv_names:
-        monitors.append(ctxt.monitor(pv, make_cb(pv)))
+        if tracker is not None:
+            tracker.mark_created(pv)
+            monitors.append(ctxt.monitor(pv, make_cb(pv), request=request, notify_disconnect=True))
+        else:
+            monitors.append(ctxt.monitor(pv, make_cb(pv), request=request))
 
     return monitors, ctxt
 
@@ -96,3 +397,147 @@ def cleanup_monitors(monitors: List[Any], backend: Optional[Any]) -> None:
             backend.close()
     except Exception:
         pass
+
+
+class PVStream:
+    """Bounded async stream of updates for one PV (used by create_monitors_async).
+
+    When the queue is full the oldest pending update is discarded and counted
+    in `dropped`, so a slow consumer only loses its own frames.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, pvname: str, queue_depth: int = 4):
+        self.pvname = pvname
+        self.subscription: Any = None  # pyepics PV or p4p Subscription feeding this stream
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_depth))
+        self.received = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item: Any) -> None:
+        """Enqueue an update; must run on the event loop thread."""
+        q = self.queue
+        self.received += 1
+        if q.full():
+            try:
+                q.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        q.put_nowait(item)
+        depth = q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(self._CLOSED)
+                return
+            except asyncio.QueueFull:
+                self.queue.get_nowait()
+
+    def __aiter__(self) -> "PVStream":
+        return self
+
+    async def __anext__(self) -> Tuple[str, Any, Optional[float], FrameMeta]:
+        item = await self.queue.get()
+        if item is self._CLOSED:
+            raise StopAsyncIteration
+        return item
+
+
+async def create_monitors_async(pv_names: List[str], protocol: str, queue_depth: int = 4,
+                                payload: str = "full",
+                                options: Optional[Any] = None) -> Tuple[Dict[str, PVStream], Optional[Any]]:
+    """Create one bounded async update stream per PV.
+
+    PVA uses `p4p.client.asyncio.Context`, whose callbacks already run on the
+    event loop. CA uses pyepics and hands each update from the CA callback
+    thread to the loop with `call_soon_threadsafe`.
+
+    Returns:
+        ({pvname: PVStream}, backend) where backend is the p4p Context for PVA or None for CA.
+    """
+    protocol = protocol.lower()
+    if protocol not in ("ca", "pva"):
+        raise ValueError("protocol must be 'ca' or 'pva'")
+    if payload not in PAYLOAD_MODES:
+        raise ValueError(f"payload must be one of {PAYLOAD_MODES}")
+
+    loop = asyncio.get_running_loop()
+    streams = {pv: PVStream(pv, queue_depth) for pv in pv_names}
+
+    if protocol == "ca":
+        if options is not None:
+            options.apply_environment()
+        try:
+            from epics import PV  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("pyepics not installed. Install with: pip install pyepics") from e
+
+        extract = _ca_payload(payload)
+        auto_monitor = options.ca_auto_monitor() if options is not None else True
+        for pv in pv_names:
+            def _cb(value=None, timestamp=None, pvname=pv, posixseconds=None, nanoseconds=None,
+                    _put=streams[pv].put, **k):
+                recv_mono = time.monotonic()
+                recv = time.time()
+                ioc = posixseconds + nanoseconds * 1e-9 if posixseconds is not None else timestamp
+                meta = FrameMeta(None, _valid_ioc_time(ioc), recv, recv_mono)
+                loop.call_soon_threadsafe(_put, (pvname, extract(value), timestamp, meta))
+            streams[pv].subscription = PV(pv, form='time', auto_monitor=auto_monitor, callback=_cb)
+        return streams, None
+
+    try:
+        from p4p.client.asyncio import Context  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("p4p not installed. Install with: pip install p4p") from e
+
+    if payload == "full":
+        ctxt = Context('pva')
+        extract = _pva_payload
+    else:
+        ctxt = Context('pva', nt=False)
+        extract = _pva_view if payload == "zerocopy" else _pva_info
+
+    def make_cb(pvname: str):
+        put = streams[pvname].put
+
+        async def _cb(val):
+            recv_mono = time.monotonic()
+            recv = time.time()
+            ts, uid = _pva_stamp(val)
+            put((pvname, extract(val), ts, FrameMeta(uid, ts, recv, recv_mono)))
+        return _cb
+
+    request = options.pva_request() if options is not None else None
+    for pv in pv_names:
+        streams[pv].subscription = ctxt.monitor(pv, make_cb(pv), request=request)
+    return streams, ctxt
+
+
+async def cleanup_monitors_async(streams: Dict[str, PVStream], backend: Optional[Any]) -> None:
+    """Close the PVA context / CA channels and end every stream."""
+    for stream in streams.values():
+        sub = stream.subscription
+        try:
+            if hasattr(sub, 'clear_callbacks'):  # pyepics PV
+                sub.clear_callbacks()
+                sub.disconnect()
+            elif sub is not None:  # p4p Subscription
+                sub.close()
+        except Exception:
+            pass
+        stream.close()
+    try:
+        if backend is not None:
+            backend.close()
+    except Exception:
+        pass
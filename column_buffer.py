@@ -0,0 +1,181 @@
+"""Preallocated, growable typed column buffer for per-update records.
+
+Replaces per-update dicts on a shared queue: each producer owns one buffer
+and appends a row with a few scalar writes into NumPy columns (through
+memoryviews, no Python objects are kept). When the buffer fills it either
+doubles its capacity or, if a spill file is configured, appends the filled
+chunk to that file as raw structured records and starts over, so memory
+stays bounded during long runs:
+
+    buf = ColumnBuffer([("timestamp", "f8"), ("pv_index", "i4"), ("size", "i8")],
+                       spill_path="results/client0.bin", spill_rows=1 << 20)
+    buf.append(time.time(), 3, 4194304)
+    arrays = buf.to_arrays()   # spilled chunks + in-memory rows, per column
+
+A producer that appends under its own lock can keep the file write out of
+that lock: `append_deferred` swaps a full buffer for an empty one and
+returns the filled chunk, which the caller passes to `write_chunk` after
+releasing the lock. Chunks are numbered when they are swapped out and
+written in that order (a later chunk waits for the earlier write), so the
+spill file stays in append order:
+
+    with lock:
+        full = buf.append_deferred(time.time(), 3, 4194304)
+    if full is not None:
+        buf.write_chunk(full)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class ColumnBuffer:
+    """Append-only columnar buffer with doubling growth and optional disk spill."""
+
+    def __init__(self, columns: Sequence[Tuple[str, Any]], capacity: int = 65536,
+                 spill_path: Optional[str] = None, spill_rows: Optional[int] = None):
+        """
+        Args:
+            columns: (name, numpy dtype) pairs.
+            capacity: initial number of rows.
+            spill_path: if set, full chunks are appended to this file instead of growing memory.
+            spill_rows: chunk size in rows when spilling (defaults to `capacity`).
+        """
+        self.dtype = np.dtype([(name, np.dtype(dt)) for name, dt in columns])
+        self.names = list(self.dtype.names)
+        self.spill_path = spill_path
+        self.spilled_rows = 0
+        self.spill_count = 0
+        if spill_path is not None:
+            capacity = spill_rows or capacity
+            os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+            open(spill_path, "wb").close()
+        self._cap = max(1, capacity)
+        self._n = 0
+        self._lock = threading.Lock()
+        # spill file writes happen in chunk order: chunk k waits until k chunks are written
+        self._spill_done = threading.Condition()
+        self._next_chunk = 0
+        self._written_chunks = 0
+        # columns of the last written chunk, reused by the next swap (one spare is enough)
+        self._spare: Optional[Dict[str, np.ndarray]] = None
+        self._alloc(self._cap)
+
+    def _alloc(self, cap: int, keep: int = 0) -> None:
+        old = getattr(self, "columns", None)
+        self.columns = {name: np.empty(cap, dtype=self.dtype[name]) for name in self.names}
+        if old is not None and keep:
+            for name in self.names:
+                self.columns[name][:keep] = old[name][:keep]
+        self._views = [memoryview(self.columns[name]) for name in self.names]
+        self._cap = cap
+
+    def __len__(self) -> int:
+        return self.spilled_rows + self._n
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes currently held in memory."""
+        return self._cap * self.dtype.itemsize
+
+    def append(self, *row: Any) -> None:
+        """Append one row; values in column order. Not thread-safe, see `append_locked`."""
+        n = self._n
+        if n == self._cap:
+            self._make_room()
+            n = self._n
+        for view, value in zip(self._views, row):
+            view[n] = value
+        self._n = n + 1
+
+    def append_locked(self, *row: Any) -> None:
+        with self._lock:
+            self.append(*row)
+
+    def append_deferred(self, *row: Any) -> Optional[Tuple[int, Dict[str, np.ndarray], int]]:
+        """Append one row; when spilling and full, swap the buffer instead of writing it.
+
+        Returns the filled chunk (or None) for `write_chunk`. Not thread-safe, like `append`.
+        """
+        full = None
+        if self._n == self._cap and self.spill_path is not None:
+            full = (self._next_chunk, self.columns, self._n)
+            self._next_chunk += 1
+            # a plain attribute swap: a chunk written concurrently at worst costs a fresh allocation
+            spare, self._spare = self._spare, None
+            if spare is None:
+                self._alloc(self._cap)
+            else:
+                self.columns = spare
+                self._views = [memoryview(spare[name]) for name in self.names]
+            self._n = 0
+        self.append(*row)
+        return full
+
+    def write_chunk(self, chunk: Tuple[int, Dict[str, np.ndarray], int]) -> None:
+        """Append a chunk returned by `append_deferred` to the spill file, after all earlier chunks."""
+        seq, columns, n = chunk
+        self._write(seq, columns, n)
+        self._spare = columns
+
+    def _make_room(self) -> None:
+        if self.spill_path is not None:
+            self.spill()
+        else:
+            self._alloc(self._cap * 2, keep=self._n)
+
+    def spill(self) -> None:
+        """Append the in-memory rows to the spill file and reset the buffer."""
+        n = self._n
+        if n == 0 or self.spill_path is None:
+            return
+        seq = self._next_chunk
+        self._next_chunk += 1
+        self._write(seq, self.columns, n)
+        self._n = 0
+
+    def _write(self, seq: int, columns: Dict[str, np.ndarray], n: int) -> None:
+        chunk = np.empty(n, dtype=self.dtype)
+        for name in self.names:
+            chunk[name] = columns[name][:n]
+        with self._spill_done:
+            self._spill_done.wait_for(lambda: self._written_chunks == seq)
+            try:
+                with open(self.spill_path, "ab") as f:
+                    chunk.tofile(f)
+                self.spilled_rows += n
+                self.spill_count += 1
+            finally:
+                # a failed write must not block the chunks after it
+                self._written_chunks += 1
+                self._spill_done.notify_all()
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """All rows (spilled + in memory) as one array per column."""
+        parts: List[np.ndarray] = []
+        if self.spill_path is not None and self.spilled_rows:
+            parts.append(np.fromfile(self.spill_path, dtype=self.dtype, count=self.spilled_rows))
+        n = self._n
+        out = {}
+        for name in self.names:
+            mem = self.columns[name][:n]
+            out[name] = np.concatenate([p[name] for p in parts] + [mem]) if parts else mem.copy()
+        return out
+
+    def clear(self) -> None:
+        self._n = 0
+        self.spilled_rows = 0
+        if self.spill_path is not None:
+            open(self.spill_path, "wb").close()
+
+    def close(self, remove_spill: bool = False) -> None:
+        if remove_spill and self.spill_path is not None:
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
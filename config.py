@@ -4,12 +4,21 @@ This file mirrors the contents of `05_config.py` so that modules can
 `import config` without renaming the original numbered file.
 
 Edit CAMERA_PVS here (and optionally delete 05_config.py to avoid duplication).
+The list can also be overridden with the CAMERA_PVS environment variable
+(comma separated), e.g. to point every script at `08_sim_ioc.py`.
+RESULTS_DIR can be overridden the same way (the sweep runner gives every
+point its own directory).
 """
 
+import os
+
 CAMERA_PVS = [
     "13ARV222:image1:ArrayData",
     "13ARV222:image2:ArrayData",
     "13ARV222:image3:ArrayData",
 ]
 
-RESULTS_DIR = "results"
+if os.environ.get("CAMERA_PVS"):
+    CAMERA_PVS = [pv.strip() for pv in os.environ["CAMERA_PVS"].split(",") if pv.strip()]
+
+RESULTS_DIR = os.environ.get("RESULTS_DIR") or "results"
@@ -0,0 +1,213 @@
+"""Connection, first-update and reconnect timing for a bulk subscription.
+
+`create_monitors(..., tracker=ConnectionTracker(pv_names))` creates every
+channel without waiting for any of them (pyepics and p4p both search and
+connect in the background), so all PVs connect in parallel. The tracker
+records per PV, relative to channel creation:
+
+- connect time (CA: connection callback; PVA: p4p has no connect event, so
+  the first update stands in for it),
+- time of the first update,
+- disconnects and reconnects, with the time from losing the channel to
+  getting it back (an IOC restart shows up here).
+
+The tracker also gates the user callback: updates are only passed on once
+`wait_live()` has seen every PV deliver (or its timeout expired) and the
+warm-up has elapsed, so connection-time intervals never reach the
+steady-state statistics:
+
+    tracker = ConnectionTracker(CAMERA_PVS, warmup=2.0)
+    monitors, backend = create_monitors(CAMERA_PVS, "ca", on_update, tracker=tracker)
+    missing = tracker.wait_live(timeout=10)   # blocks; opens the gate
+    ...
+    tracker.rows()    # per-PV connect/first-update/reconnect report
+
+Neither library reports the name-search reply separately from the
+connection, so "connect" covers search and connect together.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class ConnectionTracker:
+    """Per-PV connect/first-update/reconnect timestamps and a gate on the update callback."""
+
+    def __init__(self, pv_names: Sequence[str], warmup: float = 0.0, slow_factor: float = 3.0):
+        """
+        Args:
+            pv_names: PVs being subscribed; `index` maps names to rows.
+            warmup: seconds to keep the gate closed after all PVs are live.
+            slow_factor: a PV is reported 'slow' when its first update took longer than
+                this multiple of the median first-update time.
+        """
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        self.warmup = warmup
+        self.slow_factor = slow_factor
+        n = len(self.pv_names)
+        # monotonic times; NaN until the event happened
+        self.created = np.full(n, np.nan)
+        self.connected = np.full(n, np.nan)
+        self.first_update = np.full(n, np.nan)
+        self.lost_at = np.full(n, np.nan)
+        self.disconnects = np.zeros(n, dtype=np.int64)
+        self.reconnects = np.zeros(n, dtype=np.int64)
+        self.reconnect_sec: List[List[float]] = [[] for _ in range(n)]
+        self.updates_before_open = np.zeros(n, dtype=np.int64)
+        # plain-list flags read on every update (cheaper than numpy scalar indexing)
+        self._live = [False] * n
+        self._up = [False] * n
+        self.open = False
+        self.measure_start: Optional[float] = None
+        self._lock = threading.Lock()
+        self._remaining = n
+        self._all_live = threading.Event()
+        if n == 0:
+            self._all_live.set()
+
+    # ------------------------------------------------------------------
+    # Events (called from create_monitors' callbacks)
+    # ------------------------------------------------------------------
+    def mark_created(self, pvname: str) -> None:
+        self.created[self.index[pvname]] = time.monotonic()
+
+    def on_connection(self, pvname: str, connected: bool) -> None:
+        """Channel state change. For PVA `connected=True` is implied by an update after a loss."""
+        now = time.monotonic()
+        i = self.index[pvname]
+        with self._lock:
+            if connected:
+                if self.connected[i] != self.connected[i]:
+                    self.connected[i] = now
+                elif self.lost_at[i] == self.lost_at[i]:
+                    self.reconnects[i] += 1
+                    self.reconnect_sec[i].append(now - self.lost_at[i])
+                self.lost_at[i] = np.nan
+                self._up[i] = True
+            elif self._up[i]:
+                # a 'not connected yet' notice (p4p sends one before the first connect) is not a loss
+                self.disconnects[i] += 1
+                self.lost_at[i] = now
+                self._up[i] = False
+
+    def wrap(self, pvname: str, callback: Callable[..., None], implicit_connect: bool = False) -> Callable[..., None]:
+        """Return `callback` behind the gate; records the first update of `pvname`.
+
+        implicit_connect: treat an update as the (re)connect event (PVA).
+        """
+        i = self.index[pvname]
+        up = self._up
+        live = self._live
+
+        def _tracked(*args):
+            if implicit_connect and not up[i]:
+                self.on_connection(pvname, True)
+            if not live[i]:
+                self._first(i)
+            if self.open:
+                callback(*args)
+            else:
+                self.updates_before_open[i] += 1
+
+        return _tracked
+
+    def _first(self, i: int) -> None:
+        with self._lock:
+            if self._live[i]:
+                return
+            self.first_update[i] = time.monotonic()
+            self._live[i] = True
+            self._remaining -= 1
+            if self._remaining == 0:
+                self._all_live.set()
+
+    # ------------------------------------------------------------------
+    # Gate
+    # ------------------------------------------------------------------
+    def wait_live(self, timeout: Optional[float] = 10.0) -> List[str]:
+        """Block until every PV delivered an update (or `timeout`), wait the warm-up, open the gate.
+
+        Returns the PVs that had not delivered when the gate opened.
+        """
+        self._all_live.wait(timeout)
+        if self.warmup > 0:
+            time.sleep(self.warmup)
+        self.measure_start = time.monotonic()
+        self.open = True
+        return [pv for pv, t in zip(self.pv_names, self.first_update) if t != t]
+
+    # ------------------------------------------------------------------
+    # Report
+    # ------------------------------------------------------------------
+    def report(self) -> Dict[str, Any]:
+        """Per-PV timings in milliseconds since channel creation (dict of arrays/lists)."""
+        with self._lock:
+            connect = (self.connected - self.created) * 1e3
+            first = (self.first_update - self.created) * 1e3
+            rec = [list(r) for r in self.reconnect_sec]
+        finite = first[np.isfinite(first)]
+        median = float(np.median(finite)) if len(finite) else 0.0
+        status = np.where(~np.isfinite(first), "failed",
+                          np.where(np.isfinite(first) & (first > self.slow_factor * median) & (median > 0),
+                                   "slow", "ok"))
+        return {
+            'pv': list(self.pv_names),
+            'status': status.tolist(),
+            'connect_ms': connect,
+            'first_update_ms': first,
+            'updates_before_open': self.updates_before_open.copy(),
+            'disconnects': self.disconnects.copy(),
+            'reconnects': self.reconnects.copy(),
+            'reconnect_mean_ms': np.array([np.mean(r) * 1e3 if r else np.nan for r in rec]),
+            'reconnect_max_ms': np.array([np.max(r) * 1e3 if r else np.nan for r in rec]),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """All-PV totals: time until every PV connected / delivered, slow and failed PVs."""
+        rep = self.report()
+        first = rep['first_update_ms']
+        connect = rep['connect_ms']
+        t0 = np.nanmin(self.created) if np.isfinite(self.created).any() else np.nan
+        return {
+            'pvs': len(self.pv_names),
+            'connected': int(np.isfinite(connect).sum()),
+            'live': int(np.isfinite(first).sum()),
+            'all_connected_ms': float(np.nanmax(self.connected - t0) * 1e3) if np.isfinite(connect).any() else np.nan,
+            'all_live_ms': float(np.nanmax(self.first_update - t0) * 1e3) if np.isfinite(first).any() else np.nan,
+            'first_update_p50_ms': float(np.nanpercentile(first, 50)) if np.isfinite(first).any() else np.nan,
+            'first_update_max_ms': float(np.nanmax(first)) if np.isfinite(first).any() else np.nan,
+            'slow': [pv for pv, s in zip(rep['pv'], rep['status']) if s == "slow"],
+            'failed': [pv for pv, s in zip(rep['pv'], rep['status']) if s == "failed"],
+            'reconnects': int(rep['reconnects'].sum()),
+        }
+
+    def rows(self) -> List[List[Any]]:
+        """Report as CSV rows (header first)."""
+        rep = self.report()
+        keys = list(rep)
+        cols = [rep[k].tolist() if hasattr(rep[k], 'tolist') else rep[k] for k in keys]
+        return [keys] + [list(r) for r in zip(*cols)]
+
+    def print_summary(self) -> None:
+        s = self.summary()
+        print(f"Connected {s['connected']}/{s['pvs']} PVs, first update from {s['live']}/{s['pvs']}: "
+              f"all connected after {s['all_connected_ms']:.1f} ms, all live after {s['all_live_ms']:.1f} ms "
+              f"(first update p50 {s['first_update_p50_ms']:.1f} ms, max {s['first_update_max_ms']:.1f} ms)")
+        if s['slow']:
+            print(f"  Slow: {', '.join(s['slow'])}")
+        if s['failed']:
+            print(f"  Failed (no update): {', '.join(s['failed'])}")
+
+
+def add_connect_arguments(parser) -> None:
+    """--connect-timeout / --warmup options shared by the test scripts."""
+    parser.add_argument("--connect-timeout", type=float, default=10.0,
+                        help="等待所有 PV 连接并收到首帧的最长秒数，超时后未连接的 PV 记为 failed (default: 10)")
+    parser.add_argument("--warmup", type=float, default=0.0,
+                        help="所有 PV 都收到首帧后再预热的秒数，期间的更新不计入统计 (default: 0)")
@@ -0,0 +1,275 @@
+"""Constant-memory log-bucketed latency histogram (HdrHistogram layout).
+
+Values are recorded in integer units of `unit` seconds (default 1 us) into
+a fixed array of counters. Each power-of-two range is split into linear
+sub-buckets, so the relative error of any reported value is bounded by
+`significant_figures` regardless of magnitude. Recording is O(1) and never
+allocates; percentiles can be read at any time; histograms with the same
+layout can be merged (across PVs, clients or processes) and saved to disk.
+
+    h = LatencyHistogram()
+    h.record(0.0331)           # seconds
+    h.percentile(99.9)         # -> seconds
+    h.merge(other)
+    h.save("results/hist.json")
+    LatencyHistogram.load("results/hist.json")
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """Fixed-size HDR-style histogram of non-negative durations."""
+
+    def __init__(self, max_value: float = 60.0, significant_figures: int = 3, unit: float = 1e-6,
+                 counts: Optional[np.ndarray] = None):
+        """
+        Args:
+            max_value: largest value (seconds) resolved exactly; larger values are clamped into the last bucket.
+            significant_figures: decimal digits of precision (1-4).
+            unit: resolution of the integer recording unit in seconds.
+            counts: optional existing int64 array of length `counts_len_for(...)` to record into,
+                e.g. a slice of a multiprocessing.shared_memory block.
+        """
+        if not 1 <= significant_figures <= 4:
+            raise ValueError("significant_figures must be between 1 and 4")
+        self.max_value = max_value
+        self.significant_figures = significant_figures
+        self.unit = unit
+        self._scale = 1.0 / unit
+
+        largest = 2 * 10 ** significant_figures
+        self.sub_bucket_bits = max(1, math.ceil(math.log2(largest)))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        highest = max(int(max_value * self._scale), self.sub_bucket_count)
+        self.bucket_count = highest.bit_length() - self.sub_bucket_bits + 1
+        self.counts_len = (self.bucket_count + 1) * self.sub_bucket_half
+        self._max_index = self.counts_len - 1
+        self._max_raw = (1 << (self.bucket_count + self.sub_bucket_bits - 1)) - 1
+
+        if counts is None:
+            counts = np.zeros(self.counts_len, dtype=np.int64)
+        elif counts.shape != (self.counts_len,) or counts.dtype != np.int64:
+            raise ValueError(f"counts must be an int64 array of length {self.counts_len}")
+        self.counts = counts
+        # memoryview item updates are about twice as fast as numpy scalar indexing
+        self._cv = memoryview(self.counts)
+        self.total = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    @classmethod
+    def counts_len_for(cls, max_value: float = 60.0, significant_figures: int = 3, unit: float = 1e-6) -> int:
+        """Length of the counts array for a given layout (to size shared buffers)."""
+        return cls(max_value, significant_figures, unit).counts_len
+
+    def sync_from_counts(self) -> None:
+        """Recompute total/min/max from `counts` after another process wrote into it (sum is unknown and kept)."""
+        nz = np.nonzero(self.counts)[0]
+        self.total = int(self.counts.sum())
+        if len(nz):
+            self.min = self._lowest_raw(int(nz[0])) * self.unit
+            self.max = self.value_at_index(int(nz[-1]))
+        else:
+            self.min = float('inf')
+            self.max = 0.0
+
+    # ------------------------------------------------------------------
+    # Index arithmetic
+    # ------------------------------------------------------------------
+    def _index(self, raw: int) -> int:
+        shift = raw.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return raw
+        return (shift + 1) * self.sub_bucket_half + (raw >> shift) - self.sub_bucket_half
+
+    def _lowest_raw(self, index: int) -> int:
+        bucket = index // self.sub_bucket_half - 1
+        if bucket <= 0:
+            return index
+        sub = index % self.sub_bucket_half + self.sub_bucket_half
+        return sub << bucket
+
+    def _highest_raw(self, index: int) -> int:
+        bucket = max(index // self.sub_bucket_half - 1, 0)
+        return self._lowest_raw(index) + (1 << bucket) - 1
+
+    def value_at_index(self, index: int) -> float:
+        """Upper bound (seconds) of values that fall into counter `index`."""
+        return self._highest_raw(index) * self.unit
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+    def record(self, value: float, count: int = 1) -> None:
+        """Record a duration in seconds. Negative values are clamped to zero."""
+        raw = int(value * self._scale)
+        if raw < 0:
+            raw = 0
+        idx = self._index(raw) if raw <= self._max_raw else self._max_index
+        self._cv[idx] += count
+        self.total += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_many(self, values: Sequence[float]) -> None:
+        """Vectorized record of an array of durations (seconds)."""
+        v = np.asarray(values, dtype=np.float64)
+        if v.size == 0:
+            return
+        raw = np.clip((v * self._scale).astype(np.int64), 0, self._max_raw)
+        bits = np.zeros(raw.shape, dtype=np.int64)
+        nz = raw > 0
+        bits[nz] = np.floor(np.log2(raw[nz])).astype(np.int64) + 1
+        shift = np.maximum(bits - self.sub_bucket_bits, 0)
+        idx = np.where(shift == 0, raw,
+                       (shift + 1) * self.sub_bucket_half + (raw >> shift) - self.sub_bucket_half)
+        np.add.at(self.counts, idx, 1)
+        self.total += int(v.size)
+        self.sum += float(v.sum())
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+
+    def reset(self) -> None:
+        self.counts[:] = 0
+        self.total = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def percentile(self, q: float) -> float:
+        """Value (seconds) at or below which `q` percent of recordings fall."""
+        if self.total == 0:
+            return 0.0
+        target = max(1, math.ceil(q / 100.0 * self.total))
+        idx = int(np.searchsorted(np.cumsum(self.counts), target))
+        return min(self.value_at_index(min(idx, self._max_index)), self.max)
+
+    def percentiles(self, qs: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[float, float]:
+        """Several percentiles with a single cumulative pass."""
+        qs = list(qs)
+        if self.total == 0:
+            return {q: 0.0 for q in qs}
+        cum = np.cumsum(self.counts)
+        out = {}
+        for q in qs:
+            target = max(1, math.ceil(q / 100.0 * self.total))
+            idx = min(int(np.searchsorted(cum, target)), self._max_index)
+            out[q] = min(self.value_at_index(idx), self.max)
+        return out
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def stddev(self) -> float:
+        """Standard deviation estimated from bucket midpoints."""
+        if self.total < 2:
+            return 0.0
+        nz = np.nonzero(self.counts)[0]
+        mids = np.array([(self._lowest_raw(i) + self._highest_raw(i)) * 0.5 * self.unit for i in nz])
+        w = self.counts[nz]
+        mean = self.mean
+        return float(np.sqrt(np.sum(w * (mids - mean) ** 2) / self.total))
+
+    def summary(self, prefix: str = "") -> Dict[str, float]:
+        """Count, mean, min, max, stddev and the default percentiles, keyed with `prefix`."""
+        pct = self.percentiles()
+        out = {
+            f'{prefix}count': self.total,
+            f'{prefix}mean': self.mean,
+            f'{prefix}min': self.min if self.total else 0.0,
+            f'{prefix}max': self.max,
+            f'{prefix}stddev': self.stddev(),
+        }
+        for q, v in pct.items():
+            out[f'{prefix}p{q:g}'] = v
+        return out
+
+    # ------------------------------------------------------------------
+    # Merging and persistence
+    # ------------------------------------------------------------------
+    def layout(self) -> Dict[str, Any]:
+        return {'max_value': self.max_value, 'significant_figures': self.significant_figures, 'unit': self.unit}
+
+    def empty_copy(self) -> "LatencyHistogram":
+        return LatencyHistogram(**self.layout())
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Add `other` into this histogram in place. Layouts must match."""
+        if other.counts_len != self.counts_len or other.unit != self.unit:
+            raise ValueError("cannot merge histograms with different layouts")
+        self.counts += other.counts
+        self.total += other.total
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merged(cls, histograms: Iterable["LatencyHistogram"]) -> "LatencyHistogram":
+        """Sum of `histograms`; an empty default-layout histogram when there are none."""
+        out = None
+        for h in histograms:
+            if out is None:
+                out = h.empty_copy()
+            out.merge(h)
+        return out if out is not None else cls()
+
+    def to_dict(self) -> Dict[str, Any]:
+        nz = np.nonzero(self.counts)[0]
+        return {
+            'layout': self.layout(),
+            'total': int(self.total),
+            'sum': self.sum,
+            'min': self.min if self.total else None,
+            'max': self.max,
+            'index': nz.tolist(),
+            'counts': self.counts[nz].tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "LatencyHistogram":
+        h = cls(**d['layout'])
+        h.counts[np.asarray(d['index'], dtype=np.int64)] = np.asarray(d['counts'], dtype=np.int64)
+        h.total = int(d['total'])
+        h.sum = float(d['sum'])
+        h.min = float('inf') if d['min'] is None else float(d['min'])
+        h.max = float(d['max'])
+        return h
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "LatencyHistogram":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def save_histograms(path: str, histograms: Dict[str, LatencyHistogram]) -> None:
+    """Save a {name: histogram} mapping (e.g. one per PV) to a JSON file."""
+    with open(path, "w") as f:
+        json.dump({name: h.to_dict() for name, h in histograms.items()}, f)
+
+
+def load_histograms(path: str) -> Dict[str, LatencyHistogram]:
+    with open(path) as f:
+        return {name: LatencyHistogram.from_dict(d) for name, d in json.load(f).items()}
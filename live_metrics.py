@@ -0,0 +1,361 @@
+"""Rolling-window per-PV metrics, served in Prometheus text format while a test runs.
+
+The window is split into a fixed ring of time slots. Each update adds to
+the current slot's counters and histograms (O(1), no allocation); when the
+clock enters a new slot the oldest one is cleared and reused, so memory and
+per-update cost depend neither on run length nor on history. Snapshots sum
+the live slots vectorized over all PVs; only the current slot is copied under
+the lock that `record()` takes, the finished slots (no longer written) are
+summed outside it:
+
+    metrics = LiveMetrics(CAMERA_PVS, window=10.0)
+    server = MetricsServer(metrics, port=9108).start()   # GET /metrics
+    dashboard = Dashboard(metrics).start()               # optional terminal view
+
+    def on_update(pvname, value, timestamp):
+        metrics.record(metrics.index[pvname], time.monotonic(), value.nbytes,
+                       latency=time.time() - timestamp)
+
+Per PV: frame rate, MB/s, lost frames (from uniqueId gaps), frame-interval
+and IOC->client latency percentiles, seconds since the last frame and, for
+runners that queue updates, the callback backlog.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from histogram import LatencyHistogram
+
+QUANTILES = (50.0, 90.0, 99.0)
+# 272 buckets (~6% relative precision, 10 us resolution): about 22 KB per PV row
+# for both histograms of 5 slots, so 05's client x PV rows stay small
+HIST_LAYOUT = dict(max_value=10.0, significant_figures=1, unit=1e-5)
+
+
+class LiveMetrics:
+    """Ring of time slots holding per-PV counters and interval/latency histograms."""
+
+    def __init__(self, pv_names: Sequence[str], window: float = 10.0, slots: int = 5):
+        """
+        Args:
+            pv_names: PVs to track; `index` maps each name to its row.
+            window: length of the rolling window in seconds.
+            slots: number of slots the window is divided into (its time resolution).
+        """
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        self.window = window
+        self.slots = max(1, slots)
+        self.slot_sec = window / self.slots
+        n = len(self.pv_names)
+        self._n = n
+        counts_len = LatencyHistogram.counts_len_for(**HIST_LAYOUT)
+        # flat [slot * n + pv] counters; histograms are views into one block per kind
+        self.frames = np.zeros(self.slots * n, dtype=np.int64)
+        self.bytes = np.zeros(self.slots * n, dtype=np.int64)
+        self.lost = np.zeros(self.slots * n, dtype=np.int64)
+        self.interval_counts = np.zeros((self.slots, n, counts_len), dtype=np.int64)
+        self.latency_counts = np.zeros((self.slots, n, counts_len), dtype=np.int64)
+        self._intervals = [LatencyHistogram(**HIST_LAYOUT, counts=self.interval_counts[s, i])
+                           for s in range(self.slots) for i in range(n)]
+        self._latencies = [LatencyHistogram(**HIST_LAYOUT, counts=self.latency_counts[s, i])
+                           for s in range(self.slots) for i in range(n)]
+        self.slot_epoch = np.full(self.slots, -1, dtype=np.int64)
+        # cumulative counters (Prometheus counters) and per-PV state
+        self.frames_total = np.zeros(n, dtype=np.int64)
+        self.bytes_total = np.zeros(n, dtype=np.int64)
+        self.lost_total = np.zeros(n, dtype=np.int64)
+        self.last_arrival = np.full(n, np.nan)
+        self.backlog = np.zeros(n, dtype=np.int64)
+        self.has_backlog = False
+        self._last_uid: List[Optional[int]] = [None] * n
+        self._frames = memoryview(self.frames)
+        self._bytes = memoryview(self.bytes)
+        self._lost = memoryview(self.lost)
+        self._frames_total = memoryview(self.frames_total)
+        self._bytes_total = memoryview(self.bytes_total)
+        self._lost_total = memoryview(self.lost_total)
+        self._last = memoryview(self.last_arrival)
+        self._epoch = -1
+        self._slot = 0
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _advance(self, epoch: int) -> None:
+        """Enter slot `epoch`: clear the slot it reuses."""
+        s = epoch % self.slots
+        if self.slot_epoch[s] != epoch:
+            n = self._n
+            self.frames[s * n:(s + 1) * n] = 0
+            self.bytes[s * n:(s + 1) * n] = 0
+            self.lost[s * n:(s + 1) * n] = 0
+            for h in self._intervals[s * n:(s + 1) * n]:
+                h.reset()
+            for h in self._latencies[s * n:(s + 1) * n]:
+                h.reset()
+            self.slot_epoch[s] = epoch
+        self._epoch = epoch
+        self._slot = s
+
+    def record(self, i: int, now: float, nbytes: int = 0, latency: Optional[float] = None,
+               unique_id: Optional[int] = None) -> None:
+        """Record one update of PV `i` received at monotonic time `now`.
+
+        `latency` is the IOC->client delay in seconds when known; `unique_id`
+        (NTNDArray uniqueId) lets gaps be counted as lost frames.
+        """
+        with self.lock:
+            # `now` is read before the lock: a slightly stale one lands in the current slot,
+            # never in a finished slot that snapshot() sums outside the lock
+            if int(now / self.slot_sec) > self._epoch:
+                self._advance(int(now / self.slot_sec))
+            k = self._slot * self._n + i
+            self._frames[k] += 1
+            self._bytes[k] += nbytes
+            self._frames_total[i] += 1
+            self._bytes_total[i] += nbytes
+            last = self._last[i]
+            if last == last:
+                if now < last:
+                    now = last
+                self._intervals[k].record(now - last)
+            self._last[i] = now
+            if latency is not None:
+                self._latencies[k].record(latency)
+            if unique_id is not None:
+                prev = self._last_uid[i]
+                self._last_uid[i] = unique_id
+                if prev is not None and unique_id > prev + 1:
+                    gap = unique_id - prev - 1
+                    self._lost[k] += gap
+                    self._lost_total[i] += gap
+
+    def set_backlog(self, i: int, depth: int) -> None:
+        """Current number of updates of PV `i` waiting to be processed."""
+        self.backlog[i] = depth
+        self.has_backlog = True
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Per-PV rolling-window metrics (dict of arrays, one entry per PV)."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            epoch = int(now / self.slot_sec)
+            if epoch > self._epoch:
+                self._advance(epoch)
+            else:
+                epoch = self._epoch
+            live = self.slot_epoch > epoch - self.slots
+            n = self._n
+            frames = self.frames.reshape(self.slots, n)[live].sum(axis=0)
+            nbytes = self.bytes.reshape(self.slots, n)[live].sum(axis=0)
+            lost = self.lost.reshape(self.slots, n)[live].sum(axis=0)
+            cur = self._slot
+            interval = self.interval_counts[cur].copy()
+            latency = self.latency_counts[cur].copy()
+            finished = [(s, int(self.slot_epoch[s])) for s in np.nonzero(live)[0] if s != cur]
+            # the current slot is only partly filled
+            span = min(self.window - self.slot_sec + (now - epoch * self.slot_sec), now - self.start)
+            out = {
+                'pv': list(self.pv_names),
+                'window_sec': span,
+                'fps': frames / span if span > 0 else np.zeros(n),
+                'mb_per_sec': nbytes / (1024 * 1024) / span if span > 0 else np.zeros(n),
+                'lost': lost,
+                'loss_percent': np.divide(lost * 100.0, frames + lost, out=np.zeros(n), where=(frames + lost) > 0),
+                'age_sec': np.nan_to_num(now - self.last_arrival, nan=np.inf),
+                'backlog': self.backlog.copy() if self.has_backlog else None,
+                'frames_total': self.frames_total.copy(),
+                'bytes_total': self.bytes_total.copy(),
+                'lost_total': self.lost_total.copy(),
+            }
+        # finished slots are only cleared when reused, a whole window later
+        for s, _ in finished:
+            interval += self.interval_counts[s]
+            latency += self.latency_counts[s]
+        with self.lock:
+            if any(self.slot_epoch[s] != e for s, e in finished):
+                # summing took longer than a slot and one was reused: sum them again under the lock
+                interval = self.interval_counts[cur].copy()
+                latency = self.latency_counts[cur].copy()
+                for s, e in finished:
+                    if self.slot_epoch[s] == e:
+                        interval += self.interval_counts[s]
+                        latency += self.latency_counts[s]
+        out['interval'] = _quantiles(interval)
+        out['latency'] = _quantiles(latency)
+        return out
+
+    def prometheus(self, now: Optional[float] = None) -> str:
+        """Snapshot rendered in the Prometheus text exposition format."""
+        snap = self.snapshot(now)
+        labels = [f'pv="{_escape(pv)}"' for pv in snap['pv']]
+        lines: List[str] = []
+
+        def family(name, kind, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label, v in zip(labels, values):
+                lines.append(f"{name}{{{label}}} {_fmt(v)}")
+
+        family("epics_frames_per_second", "gauge", f"Frame rate over the last {self.window:g}s.", snap['fps'])
+        family("epics_throughput_mb_per_second", "gauge", f"MB/s over the last {self.window:g}s.", snap['mb_per_sec'])
+        family("epics_loss_percent", "gauge", f"Lost frames (uniqueId gaps) over the last {self.window:g}s, percent.",
+               snap['loss_percent'])
+        family("epics_last_update_age_seconds", "gauge", "Seconds since the last frame.", snap['age_sec'])
+        family("epics_frames_total", "counter", "Frames received.", snap['frames_total'])
+        family("epics_bytes_total", "counter", "Payload bytes received.", snap['bytes_total'])
+        family("epics_lost_frames_total", "counter", "Frames lost according to uniqueId gaps.", snap['lost_total'])
+        if snap['backlog'] is not None:
+            family("epics_callback_backlog", "gauge", "Updates queued and not yet processed.", snap['backlog'])
+        for key, name, help_text in (('interval', 'epics_frame_interval_seconds', 'Frame interval'),
+                                     ('latency', 'epics_latency_seconds', 'IOC timestamp to client receive delay')):
+            lines.append(f"# HELP {name} {help_text} over the last {self.window:g}s.")
+            lines.append(f"# TYPE {name} summary")
+            q = snap[key]
+            for j, label in enumerate(labels):
+                for p in QUANTILES:
+                    lines.append(f'{name}{{{label},quantile="{p / 100:g}"}} {_fmt(q[p][j])}')
+                lines.append(f"{name}_count{{{label}}} {int(q['count'][j])}")
+        return "\n".join(lines) + "\n"
+
+
+def _quantiles(counts: np.ndarray) -> Dict[Any, np.ndarray]:
+    """Per-row percentiles of a (n_pv, counts_len) block of histogram counters."""
+    h = LatencyHistogram(**HIST_LAYOUT)
+    out: Dict[Any, np.ndarray] = {p: np.zeros(len(counts)) for p in QUANTILES}
+    out['count'] = counts.sum(axis=1)
+    for j in range(len(counts)):
+        if out['count'][j]:
+            h.counts[:] = counts[j]
+            h.sync_from_counts()
+            for p, v in h.percentiles(QUANTILES).items():
+                out[p][j] = v
+    return out
+
+
+def _escape(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(v: float) -> str:
+    v = float(v)
+    if v != v:
+        return "NaN"
+    if v in (float('inf'), float('-inf')):
+        return "+Inf" if v > 0 else "-Inf"
+    return f"{v:.6g}"
+
+
+class MetricsServer:
+    """Serve `LiveMetrics.prometheus()` at http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, metrics: LiveMetrics, port: int = 9108, host: str = "127.0.0.1"):
+        self.metrics = metrics
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = outer.metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Dashboard:
+    """Redraw a per-PV table of the rolling-window metrics in the terminal every `interval` seconds."""
+
+    def __init__(self, metrics: LiveMetrics, interval: float = 1.0, stream=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def render(self) -> str:
+        snap = self.metrics.snapshot()
+        backlog = snap['backlog']
+        lines = [f"Rolling window {snap['window_sec']:.1f}s  ({time.strftime('%H:%M:%S')})",
+                 f"{'PV':40s} {'FPS':>7s} {'MB/s':>8s} {'loss%':>6s} {'int p50':>8s} {'int p99':>8s} "
+                 f"{'lat p50':>8s} {'lat p99':>8s} {'age':>6s}" + (f" {'queue':>5s}" if backlog is not None else "")]
+        for j, pv in enumerate(snap['pv']):
+            age = snap['age_sec'][j]
+            line = (f"{pv[-40:]:40s} {snap['fps'][j]:7.1f} {snap['mb_per_sec'][j]:8.2f} "
+                    f"{snap['loss_percent'][j]:6.2f} {snap['interval'][50.0][j] * 1e3:7.1f}m "
+                    f"{snap['interval'][99.0][j] * 1e3:7.1f}m {snap['latency'][50.0][j] * 1e3:7.1f}m "
+                    f"{snap['latency'][99.0][j] * 1e3:7.1f}m {age if age < 1e6 else float('nan'):6.1f}")
+            if backlog is not None:
+                line += f" {int(backlog[j]):5d}"
+            if age > 2 * max(snap['interval'][99.0][j], 0.5):
+                line += "  STALLED"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.stream.write("\033[H\033[J" + self.render() + "\n")
+                self.stream.flush()
+            except Exception as e:
+                print(f"Dashboard error: {e}")
+
+    def start(self) -> "Dashboard":
+        self._thread = threading.Thread(target=self._run, name="dashboard", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+
+def add_live_arguments(parser) -> None:
+    """Command-line options shared by the scripts that support live metrics."""
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="在该端口提供 Prometheus 格式的实时指标 (http://127.0.0.1:PORT/metrics)")
+    parser.add_argument("--dashboard", action="store_true", help="在终端显示实时刷新的每 PV 指标表")
+    parser.add_argument("--window", type=float, default=10.0, help="实时指标的滑动窗口秒数 (default 10)")
+
+
+def start_live(pv_names: Sequence[str], args) -> tuple:
+    """Create LiveMetrics plus the server/dashboard requested by `args`; (None, []) when neither is."""
+    if args.metrics_port is None and not args.dashboard:
+        return None, []
+    metrics = LiveMetrics(pv_names, window=args.window)
+    closers = []
+    if args.metrics_port is not None:
+        server = MetricsServer(metrics, port=args.metrics_port).start()
+        print(f"Live metrics: http://127.0.0.1:{server.port}/metrics")
+        closers.append(server)
+    if args.dashboard:
+        closers.append(Dashboard(metrics).start())
+    return metrics, closers
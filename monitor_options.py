@@ -0,0 +1,282 @@
+"""Per-run subscription settings and detection of updates lost to overruns.
+
+When a client falls behind, neither library tells the application: a PVA
+server (or p4p's client queue) squashes pending updates into the newest
+one, and a CA server collapses queued events of a channel whose client does
+not keep up. `MonitorOptions` makes the knobs that decide this configurable
+per run and `OverrunCounter` detects the updates that went missing:
+
+    options = MonitorOptions(queue_size=4, pipeline=True, ca_mask="value,alarm",
+                             max_array_bytes=20_000_000)
+    overrun = OverrunCounter(CAMERA_PVS)
+    monitors, backend = create_monitors(CAMERA_PVS, "pva", on_update, options=options, overrun=overrun)
+    ...
+    overrun.rows()      # per-PV missed updates, overrun events, largest gap
+    overrun.summary()
+
+PVA options become the pvRequest `record[queueSize=N,pipeline=true]`. With
+`pipeline` the server only sends as many updates as the client has
+acknowledged, so a slow client makes the server squash instead of its
+socket filling up. The CA event mask selects DBE_VALUE/LOG/ALARM/PROPERTY
+events (pyepics default: value|alarm). `max_array_bytes` sets
+EPICS_CA_MAX_ARRAY_BYTES; libca reads it once when pyepics creates its
+context, so it only takes effect before the first CA channel of the process.
+
+Missed updates are counted from NTNDArray `uniqueId` gaps when the server
+sends one (PVA areaDetector; a `sequence_tracker.SequenceTracker` per PV,
+so late frames fill their gap instead of counting as a reset), otherwise
+from gaps in the IOC timestamp longer than `gap_factor` frame periods, with
+the period of each PV tracked by a `period_estimator.PeriodEstimator`
+(`expected_period` only seeds it). Each open gap is one overrun event; the
+frames it spans count as missed. When the installed
+p4p exposes per-subscription queue statistics (pvxs `stats()`), the server
+and client squash counters are reported as well.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from period_estimator import PeriodEstimator
+from sequence_tracker import SequenceTracker
+
+# dbDefs.h DBE_* bits
+CA_EVENTS = {'value': 1, 'log': 2, 'archive': 2, 'alarm': 4, 'property': 8}
+
+
+def parse_event_mask(mask: Union[None, int, str]) -> Optional[int]:
+    """'value,alarm' / 'value|log' / 5 -> DBE bit mask; None keeps the pyepics default."""
+    if mask is None or mask == "":
+        return None
+    if isinstance(mask, int):
+        return mask
+    if str(mask).strip().isdigit():
+        return int(mask)
+    bits = 0
+    for name in str(mask).replace("|", ",").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in CA_EVENTS:
+            raise ValueError(f"unknown CA event '{name}'; use {', '.join(CA_EVENTS)}")
+        bits |= CA_EVENTS[name]
+    return bits
+
+
+class MonitorOptions(NamedTuple):
+    """Subscription settings passed to create_monitors; None keeps the library default."""
+
+    queue_size: Optional[int] = None  # PVA record[queueSize=N]
+    pipeline: bool = False  # PVA record[pipeline=true]
+    ca_mask: Union[None, int, str] = None  # CA DBE mask, int or 'value,alarm'
+    max_array_bytes: Optional[int] = None  # EPICS_CA_MAX_ARRAY_BYTES
+
+    def pva_request(self) -> Optional[str]:
+        """pvRequest string for p4p's monitor(), or None for the default request."""
+        opts = []
+        if self.queue_size is not None:
+            opts.append(f"queueSize={int(self.queue_size)}")
+        if self.pipeline:
+            opts.append("pipeline=true")
+        return f"record[{','.join(opts)}]field()" if opts else None
+
+    def ca_auto_monitor(self) -> Union[bool, int]:
+        """pyepics `auto_monitor` argument: True (default mask) or the DBE mask."""
+        mask = parse_event_mask(self.ca_mask)
+        return True if mask is None else mask
+
+    def apply_environment(self) -> None:
+        """Export EPICS_CA_MAX_ARRAY_BYTES; call before pyepics creates its CA context."""
+        if self.max_array_bytes:
+            os.environ['EPICS_CA_MAX_ARRAY_BYTES'] = str(int(self.max_array_bytes))
+
+    def metadata(self) -> Dict[str, Any]:
+        """Settings as recorded in run metadata and result files."""
+        return {
+            'pva_queue_size': self.queue_size,
+            'pva_pipeline': self.pipeline,
+            'ca_mask': parse_event_mask(self.ca_mask),
+            'ca_max_array_bytes': self.max_array_bytes or os.environ.get('EPICS_CA_MAX_ARRAY_BYTES'),
+        }
+
+
+class OverrunCounter:
+    """Per-PV missed-update counting from uniqueId or IOC timestamp gaps."""
+
+    def __init__(self, pv_names: Sequence[str], expected_period: Optional[float] = None,
+                 gap_factor: float = 1.5, window: int = 31):
+        """
+        Args:
+            pv_names: PVs being subscribed; `index` maps names to rows.
+            expected_period: nominal seconds between frames, used until the period is learned.
+            gap_factor: a timestamp interval longer than this many periods is an overrun.
+            window: intervals in each PV's running-median period estimate.
+        """
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        self.expected_period = expected_period
+        self.gap_factor = gap_factor
+        n = len(self.pv_names)
+        # plain lists: updated from the library callback threads on every update
+        self.received = [0] * n
+        self.events = [0] * n
+        self.max_gap = [0] * n
+        self.source = [""] * n
+        # IOC timestamp heuristic (no uniqueId); uniqueId accounting lives in `sequences`
+        self.missed = [0] * n
+        self.duplicates = [0] * n
+        self.resets = [0] * n
+        self.sequences = [SequenceTracker() for _ in range(n)]
+        self.periods = [PeriodEstimator(window, period=expected_period, gap_factor=gap_factor)
+                        for _ in range(n)]
+        self.library_stats: List[Dict[str, Any]] = [{} for _ in range(n)]
+
+    def reset(self) -> None:
+        """Zero the counters (after warm-up); learned periods are kept."""
+        n = len(self.pv_names)
+        self.received = [0] * n
+        self.events = [0] * n
+        self.max_gap = [0] * n
+        self.missed = [0] * n
+        self.duplicates = [0] * n
+        self.resets = [0] * n
+        for seq in self.sequences:
+            seq.reset_counts()
+
+    def observe(self, pvname: str, ioc_time: Optional[float], unique_id: Optional[int] = None) -> None:
+        """Record one update; called from create_monitors' callbacks."""
+        i = self.index[pvname]
+        self.received[i] += 1
+        if unique_id is not None:
+            self.source[i] = "uniqueId"
+            seq = self.sequences[i]
+            reordered = seq.reordered
+            lost = seq.update(unique_id)
+            if lost > 0:
+                self._event(i, lost)
+            elif seq.reordered != reordered:
+                # a late frame closes its gap when both neighbours arrived, splits it when neither did
+                before, after = seq.seen(unique_id - 1), seq.seen(unique_id + 1)
+                if before and after:
+                    self.events[i] -= 1
+                elif not (before or after):
+                    self.events[i] += 1
+            return
+        if ioc_time is None:
+            return
+        self.source[i] = "timestamp"
+        est = self.periods[i]
+        last = est.last
+        if last is not None and ioc_time <= last:
+            if ioc_time == last:
+                self.duplicates[i] += 1
+            else:
+                self.resets[i] += 1
+        # stalls (IOC paused) are not counted as missed updates
+        lost = est.update(ioc_time)
+        if lost > 0:
+            self.missed[i] += lost
+            self._event(i, lost)
+
+    def _event(self, i: int, lost: int) -> None:
+        self.events[i] += 1
+        if lost > self.max_gap[i]:
+            self.max_gap[i] = lost
+
+    def collect_library_stats(self, monitors: Sequence[Any]) -> None:
+        """Read p4p per-subscription queue/squash statistics when the installed p4p provides them."""
+        for i, sub in enumerate(monitors[:len(self.pv_names)]):
+            stats = getattr(sub, 'stats', None)
+            if not callable(stats):
+                continue
+            try:
+                st = stats()
+            except Exception:
+                continue
+            if isinstance(st, dict):
+                self.library_stats[i] = st
+            elif st is not None:
+                self.library_stats[i] = {k: getattr(st, k) for k in dir(st) if k.startswith(('n', 'max', 'limit'))}
+
+    def report(self) -> Dict[str, Any]:
+        """Per-PV counters (dict of arrays/lists)."""
+        received = np.array(self.received, dtype=np.int64)
+        seqs = self.sequences
+        missed = np.array([m + s.lost for m, s in zip(self.missed, seqs)], dtype=np.int64)
+        expected = received + missed
+        rep = {
+            'pv': list(self.pv_names),
+            'source': [s or "none" for s in self.source],
+            'received': received,
+            'missed': missed,
+            'missed_percent': np.divide(missed * 100.0, expected, out=np.zeros(len(expected)), where=expected > 0),
+            'overrun_events': np.array(self.events, dtype=np.int64),
+            # largest gap when it opened; late frames may fill it afterwards
+            'max_gap_frames': np.array(self.max_gap, dtype=np.int64),
+            'duplicates': np.array([d + s.duplicates for d, s in zip(self.duplicates, seqs)], dtype=np.int64),
+            'reordered': np.array([s.reordered for s in seqs], dtype=np.int64),
+            'resets': np.array([r + s.resets for r, s in zip(self.resets, seqs)], dtype=np.int64),
+            'period_ms': np.array([e.period * 1e3 if e.period else np.nan for e in self.periods]),
+        }
+        keys = sorted({k for st in self.library_stats for k in st})
+        for k in keys:
+            rep[f"lib_{k}"] = [st.get(k) for st in self.library_stats]
+        return rep
+
+    def summary(self) -> Dict[str, Any]:
+        rep = self.report()
+        received = int(rep['received'].sum())
+        missed = int(rep['missed'].sum())
+        return {
+            'received': received,
+            'missed': missed,
+            'missed_percent': missed * 100.0 / (received + missed) if received + missed else 0.0,
+            'overrun_events': int(rep['overrun_events'].sum()),
+            'max_gap_frames': int(rep['max_gap_frames'].max()) if len(rep['pv']) else 0,
+        }
+
+    def rows(self, settings: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+        """Report as CSV rows (header first); `settings` (e.g. MonitorOptions.metadata()) are
+        appended as constant columns so files from different runs can be compared directly."""
+        rep = self.report()
+        keys = list(rep)
+        cols = [rep[k].tolist() if hasattr(rep[k], 'tolist') else rep[k] for k in keys]
+        settings = settings or {}
+        extra = list(settings.values())
+        return [keys + list(settings)] + [list(r) + extra for r in zip(*cols)]
+
+    def print_summary(self) -> None:
+        s = self.summary()
+        print(f"Overruns: {s['missed']} updates missed of {s['received'] + s['missed']} "
+              f"({s['missed_percent']:.2f}%) in {s['overrun_events']} events, largest gap {s['max_gap_frames']} frames")
+        rep = self.report()
+        for j, pv in enumerate(rep['pv']):
+            if rep['overrun_events'][j]:
+                print(f"    {pv}: {rep['missed'][j]} missed in {rep['overrun_events'][j]} events "
+                      f"(by {rep['source'][j]}), max gap {rep['max_gap_frames'][j]}")
+
+
+def add_monitor_arguments(parser, overrun: bool = True) -> None:
+    """Subscription tuning options shared by the test scripts; `overrun` adds --expected-period."""
+    parser.add_argument("--pva-queue-size", type=int, default=None,
+                        help="PVA 监视队列长度 record[queueSize=N]（默认使用服务器/库的默认值）")
+    parser.add_argument("--pva-pipeline", action="store_true",
+                        help="PVA 流水线监视 record[pipeline=true]：客户端确认后服务器才继续发送，跟不上时由服务器合并更新")
+    parser.add_argument("--ca-mask", default=None,
+                        help="CA 事件掩码，如 value,alarm 或 value,log,alarm,property 或整数（默认 pyepics 的 value,alarm）")
+    parser.add_argument("--ca-max-array-bytes", type=int, default=None,
+                        help="设置 EPICS_CA_MAX_ARRAY_BYTES（需大于一帧的字节数，默认取环境变量）")
+    if not overrun:
+        return
+    parser.add_argument("--expected-period", type=float, default=None,
+                        help="无 uniqueId 时帧间隔的初始估计秒数（之后按每个 PV 最近帧间隔的滑动中位数自动跟踪）")
+
+
+def options_from_args(args) -> MonitorOptions:
+    options = MonitorOptions(queue_size=args.pva_queue_size, pipeline=args.pva_pipeline,
+                             ca_mask=args.ca_mask, max_array_bytes=args.ca_max_array_bytes)
+    parse_event_mask(options.ca_mask)  # fail early on a bad mask
+    return options
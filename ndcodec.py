@@ -0,0 +1,250 @@
+"""Decoding of compressed NTNDArray updates (areaDetector NDCodec: lz4, blosc, jpeg).
+
+An NTNDArray carries its compression in `codec.name` (empty when raw),
+the original element type in `codec.parameters` and both sizes in
+`compressedSize` / `uncompressedSize`. `NDArrayDecoder` takes raw
+(nt=False) p4p Values, decodes compressed ones on a pool of threads and
+hands the image to a callback. Frames of one PV are decoded in order, one
+at a time, into a buffer that is reused for that PV (blosc and jpeg write
+into it directly; the lz4 binding has no decompress-into API, so lz4 frames
+are wrapped without an extra copy instead). Different PVs decode in
+parallel; lz4/blosc/jpeg release the GIL while decompressing.
+
+    decoder = NDArrayDecoder(threads=4)
+    monitors, backend = create_monitors(CAMERA_PVS, "pva", on_update, decoder=decoder)
+    ...
+    decoder.report()   # per PV and codec: wire vs decoded bytes, decode time
+
+The array passed to the callback is only valid until the callback returns
+(the next frame of the same PV overwrites it); copy it to keep it.
+
+Codec libraries are optional and imported on first use:
+lz4 (`pip install lz4`), blosc (`pip install blosc`), jpeg (`pip install
+simplejpeg`, or Pillow as a slower fallback).
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# pvData ScalarType codes stored in codec.parameters by NDPluginCodec
+SCALAR_TYPES = {0: np.bool_, 1: np.int8, 2: np.int16, 3: np.int32, 4: np.int64, 5: np.uint8,
+                6: np.uint16, 7: np.uint32, 8: np.uint64, 9: np.float32, 10: np.float64}
+CODECS = ("lz4", "blosc", "jpeg")
+
+
+def codec_info(val: Any) -> Tuple[str, int, int]:
+    """(codec name, compressedSize, uncompressedSize) of a raw NTNDArray Value; name '' when uncompressed."""
+    try:
+        name = val['codec.name'] or ""
+    except Exception:
+        return "", 0, 0
+    try:
+        return name, int(val['compressedSize']), int(val['uncompressedSize'])
+    except Exception:
+        return name, 0, 0
+
+
+def _scalar_type(val: Any, nbytes: int, count: int) -> np.dtype:
+    try:
+        params = val['codec.parameters']
+        code = int(params) if not hasattr(params, 'keys') else int(params['value'])
+        return np.dtype(SCALAR_TYPES[code])
+    except Exception:
+        pass
+    # fall back to the size ratio: uncompressed bytes per pixel
+    for dt in (np.uint8, np.uint16, np.uint32, np.float64):
+        if count and np.dtype(dt).itemsize * count == nbytes:
+            return np.dtype(dt)
+    return np.dtype(np.uint8)
+
+
+def _shape(val: Any) -> Optional[Tuple[int, ...]]:
+    try:
+        dims = val['dimension']
+        if dims:
+            # NTNDArray dimension[] is fastest-varying first
+            return tuple(int(d['size']) for d in reversed(dims))
+    except Exception:
+        pass
+    return None
+
+
+def _lz4(data: Any, out: np.ndarray) -> np.ndarray:
+    try:
+        import lz4.block  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("lz4 not installed. Install with: pip install lz4") from e
+    # the binding reads any buffer; a memoryview avoids copying the compressed frame
+    raw = lz4.block.decompress(memoryview(data), uncompressed_size=out.nbytes)
+    return np.frombuffer(raw, dtype=out.dtype)
+
+
+def _blosc(data: Any, out: np.ndarray) -> np.ndarray:
+    try:
+        import blosc  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("blosc not installed. Install with: pip install blosc") from e
+    blosc.decompress_ptr(memoryview(data), out.ctypes.data)
+    return out
+
+
+def _jpeg(data: Any, out: np.ndarray) -> np.ndarray:
+    try:
+        import simplejpeg  # type: ignore
+    except ImportError:
+        simplejpeg = None
+    buf = np.ascontiguousarray(data, dtype=np.uint8)
+    if simplejpeg is not None:
+        img = simplejpeg.decode_jpeg(buf.tobytes(), colorspace='GRAY', buffer=out)
+        return np.asarray(img).reshape(-1)
+    try:
+        import io
+        from PIL import Image  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("simplejpeg not installed. Install with: pip install simplejpeg") from e
+    img = np.asarray(Image.open(io.BytesIO(buf.tobytes())))
+    np.copyto(out[:img.size], img.reshape(-1))
+    return out[:img.size]
+
+
+DECODERS: Dict[str, Callable[[Any, np.ndarray], np.ndarray]] = {"lz4": _lz4, "blosc": _blosc, "jpeg": _jpeg}
+
+
+class _PVState:
+    """Per-PV decode buffer, ordered backlog and statistics."""
+
+    def __init__(self):
+        self.buffer = np.empty(0, dtype=np.uint8)
+        self.pending: collections.deque = collections.deque()
+        self.scheduled = False
+        # codec -> [frames, wire bytes, decoded bytes, decode seconds, errors]
+        self.stats: Dict[str, List[float]] = {}
+
+
+class NDArrayDecoder:
+    """Thread-pooled NTNDArray codec decoder with per-PV reused output buffers."""
+
+    def __init__(self, threads: int = 4, max_pending: int = 4):
+        """
+        Args:
+            threads: decode threads shared by all PVs (one PV decodes on one thread at a time).
+            max_pending: frames of one PV allowed to wait for decoding; older ones are dropped.
+        """
+        self.threads = max(1, threads)
+        self.max_pending = max(1, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="ndcodec")
+        self._lock = threading.Lock()
+        self._pvs: Dict[str, _PVState] = {}
+        self.dropped = 0
+        self.start = time.monotonic()
+
+    def _state(self, pvname: str) -> _PVState:
+        st = self._pvs.get(pvname)
+        if st is None:
+            with self._lock:
+                st = self._pvs.setdefault(pvname, _PVState())
+        return st
+
+    def submit(self, pvname: str, val: Any, deliver: Callable[[np.ndarray, Optional[Tuple[int, ...]]], None]) -> None:
+        """Decode a raw NTNDArray Value and call deliver(array, shape).
+
+        Uncompressed frames are delivered immediately on the calling thread;
+        compressed ones on a decode thread.
+        """
+        st = self._state(pvname)
+        name, csize, usize = codec_info(val)
+        if not name:
+            arr = val['value']
+            self._count(st, "none", arr.nbytes, arr.nbytes, 0.0)
+            deliver(arr, _shape(val))
+            return
+        with self._lock:
+            if len(st.pending) >= self.max_pending:
+                st.pending.popleft()
+                self.dropped += 1
+            st.pending.append((val, name, csize, usize, deliver))
+            if st.scheduled:
+                return
+            st.scheduled = True
+        self._pool.submit(self._drain, st)
+
+    def _drain(self, st: _PVState) -> None:
+        while True:
+            with self._lock:
+                if not st.pending:
+                    st.scheduled = False
+                    return
+                val, name, csize, usize, deliver = st.pending.popleft()
+            t0 = time.perf_counter()
+            try:
+                data = val['value']
+                shape = _shape(val)
+                count = int(np.prod(shape)) if shape else 0
+                dtype = _scalar_type(val, usize, count)
+                n = usize // dtype.itemsize if usize else count
+                if st.buffer.dtype != dtype or st.buffer.size < n:
+                    st.buffer = np.empty(n, dtype=dtype)
+                decode = DECODERS.get(name)
+                if decode is None:
+                    raise ValueError(f"unsupported codec '{name}'")
+                arr = decode(data, st.buffer[:n])
+                if shape and arr.size == count:
+                    arr = arr.reshape(shape)
+            except Exception as e:
+                with self._lock:
+                    entry = st.stats.setdefault(name, [0, 0, 0, 0.0, 0])
+                    entry[4] += 1
+                    errors = entry[4]
+                if errors <= 3:
+                    print(f"Decode error ({name}): {e}")
+                continue
+            dt = time.perf_counter() - t0
+            self._count(st, name, csize or getattr(data, 'nbytes', 0), arr.nbytes, dt)
+            try:
+                deliver(arr, shape)
+            except Exception as e:
+                print(f"Callback error after decode: {e}")
+
+    def _count(self, st: _PVState, codec: str, wire: int, decoded: int, seconds: float) -> None:
+        # report() copies the stats under the same lock
+        with self._lock:
+            entry = st.stats.get(codec)
+            if entry is None:
+                entry = st.stats[codec] = [0, 0, 0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += wire
+            entry[2] += decoded
+            entry[3] += seconds
+
+    def report(self, elapsed: Optional[float] = None) -> List[Dict[str, Any]]:
+        """One dict per (PV, codec): wire/decoded bytes and rates, ratio, decode time and CPU share."""
+        elapsed = elapsed or (time.monotonic() - self.start)
+        out = []
+        with self._lock:
+            items = [(pv, codec, list(v)) for pv, st in self._pvs.items() for codec, v in st.stats.items()]
+        for pv, codec, (frames, wire, decoded, secs, errors) in items:
+            out.append({
+                'pv': pv,
+                'codec': codec,
+                'frames': int(frames),
+                'errors': int(errors),
+                'wire_mb': wire / 1024 / 1024,
+                'decoded_mb': decoded / 1024 / 1024,
+                'compression_ratio': decoded / wire if wire else 0.0,
+                'wire_mbps': wire / 1024 / 1024 / elapsed if elapsed > 0 else 0.0,
+                'decoded_mbps': decoded / 1024 / 1024 / elapsed if elapsed > 0 else 0.0,
+                'decode_ms_per_frame': secs / frames * 1e3 if frames else 0.0,
+                # fraction of one core spent decoding this PV
+                'decode_core_percent': secs / elapsed * 100 if elapsed > 0 else 0.0,
+            })
+        return out
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,150 @@
+"""Streaming per-PV frame-period estimate for loss detection without frame IDs.
+
+CA updates carry no uniqueId, so lost frames can only be inferred from gaps
+in the timestamps, relative to the camera's frame period. Instead of one
+global nominal period, `PeriodEstimator` learns the period of each PV as
+the median of its last `window` intervals: a sliding window kept as a ring
+plus a sorted copy, so an update costs one bisect insert/delete on a fixed
+number of floats (O(1) time and memory per PV). The median ignores the
+long intervals left by lost frames and the short ones of bursts as long as
+they are fewer than half the window, and follows a real rate change after
+about `window / 2` frames.
+
+Every interval is classified against the current estimate P:
+
+- `gap_factor`·P < dt <= `stall_factor`·P: round(dt / P) - 1 frames lost,
+- dt > `stall_factor`·P: a stall (camera or IOC paused); counted with its
+  duration, not as lost frames,
+- dt < `burst_factor`·P: a burst frame (back-to-back delivery); consecutive
+  burst frames form one burst.
+
+Intervals seen before `min_samples` have been collected only train the
+estimate, unless a prior `period` is given:
+
+    est = PeriodEstimator(period=0.1)
+    for t in (0.0, 0.1, 0.2, 0.3, 0.5, 0.6):
+        est.update(t)
+    est.lost, est.gaps   # -> 1, 1
+
+Without frame IDs a sustained drop in delivered rate is indistinguishable
+from the camera slowing down: it is reported as loss until the window
+adopts the new rate.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional
+
+
+class PeriodEstimator:
+    """O(1) running-median frame period and gap/burst/stall accounting for one PV."""
+
+    __slots__ = ('window', 'min_samples', 'gap_factor', 'stall_factor', 'burst_factor', 'period',
+                 'last', 'received', 'lost', 'gaps', 'max_gap', 'bursts', 'burst_frames', 'stalls',
+                 'stall_sec', 'unclassified', '_ring', '_sorted', '_pos', '_in_burst')
+
+    def __init__(self, window: int = 31, min_samples: int = 8, period: Optional[float] = None,
+                 gap_factor: float = 1.5, stall_factor: float = 10.0, burst_factor: float = 0.5):
+        """
+        Args:
+            window: intervals in the running median (odd keeps the median a sample).
+            min_samples: intervals to collect before classifying, when no prior period is given.
+            period: optional prior period in seconds, used until the window has min_samples.
+            gap_factor / stall_factor / burst_factor: classification thresholds in periods.
+        """
+        self.window = max(1, window)
+        self.min_samples = max(1, min(min_samples, self.window))
+        self.gap_factor = gap_factor
+        self.stall_factor = stall_factor
+        self.burst_factor = burst_factor
+        self.period: Optional[float] = period
+        self.last: Optional[float] = None
+        self.received = 0
+        self.lost = 0
+        self.gaps = 0
+        self.max_gap = 0
+        self.bursts = 0
+        self.burst_frames = 0
+        self.stalls = 0
+        self.stall_sec = 0.0
+        self.unclassified = 0
+        self._ring: List[float] = []
+        self._sorted: List[float] = []
+        self._pos = 0
+        self._in_burst = False
+
+    def update(self, t: float) -> int:
+        """Record one frame time (seconds). Returns the number of frames newly counted as lost."""
+        self.received += 1
+        last = self.last
+        self.last = t
+        if last is None:
+            return 0
+        dt = t - last
+        if dt <= 0:
+            # duplicate or out-of-order timestamp; nothing to learn from
+            return 0
+        period = self.period
+        lost = 0
+        if period is None:
+            self.unclassified += 1
+        elif dt > self.stall_factor * period:
+            self.stalls += 1
+            self.stall_sec += dt
+            self._in_burst = False
+        elif dt > self.gap_factor * period:
+            lost = int(round(dt / period)) - 1
+            if lost > 0:
+                self.lost += lost
+                self.gaps += 1
+                if lost > self.max_gap:
+                    self.max_gap = lost
+            self._in_burst = False
+        elif dt < self.burst_factor * period:
+            self.burst_frames += 1
+            if not self._in_burst:
+                self.bursts += 1
+                self._in_burst = True
+        else:
+            self._in_burst = False
+        self._learn(dt)
+        return lost
+
+    def _learn(self, dt: float) -> None:
+        ring = self._ring
+        s = self._sorted
+        if len(ring) < self.window:
+            ring.append(dt)
+        else:
+            old = ring[self._pos]
+            ring[self._pos] = dt
+            self._pos = (self._pos + 1) % self.window
+            del s[bisect_left(s, old)]
+        insort(s, dt)
+        if len(s) >= self.min_samples:
+            self.period = s[len(s) // 2]
+
+    @property
+    def fps(self) -> float:
+        return 1.0 / self.period if self.period else 0.0
+
+    @property
+    def expected(self) -> int:
+        """Frames the camera produced in the observed range by the estimate (received + lost)."""
+        return self.received + self.lost
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            'period': self.period if self.period is not None else float("nan"),
+            'fps': self.fps,
+            'received': self.received,
+            'lost': self.lost,
+            'gaps': self.gaps,
+            'max_gap': self.max_gap,
+            'bursts': self.bursts,
+            'burst_frames': self.burst_frames,
+            'stalls': self.stalls,
+            'stall_sec': self.stall_sec,
+            'unclassified': self.unclassified,
+        }
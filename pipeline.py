@@ -0,0 +1,207 @@
+"""Bounded per-PV work queues between transport callbacks and frame processing.
+
+The pyepics/p4p callback only enqueues a frame reference; a pool of worker
+threads (optionally forwarding to worker processes) runs the processing.
+Each PV has its own bounded queue, so a slow analysis stage shows up as
+queue depth, wait time and processing drops instead of stalling delivery
+and masquerading as network loss:
+
+    pipe = WorkerPipeline(CAMERA_PVS, process_frame, workers=4, queue_depth=8,
+                          policy="drop_oldest")
+    pipe.start()
+
+    def on_update(pvname, value, timestamp):
+        pipe.submit(pipe.index[pvname], value)
+
+    pipe.close()
+    pipe.report()   # per-PV enqueued/processed/dropped, depth, wait and service times
+
+Overflow policies: 'drop_oldest' discards the oldest queued frame,
+'drop_newest' rejects the incoming one, 'block' makes the callback wait for
+room (back-pressure onto the transport).
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from histogram import LatencyHistogram
+
+POLICIES = ("drop_oldest", "drop_newest", "block")
+EXECUTORS = ("thread", "process")
+
+
+class WorkerPipeline:
+    """Per-PV bounded queues drained by a shared pool of worker threads."""
+
+    def __init__(self, pv_names: Sequence[str], process: Callable[[Any], Any], workers: int = 2,
+                 queue_depth: int = 8, policy: str = "drop_oldest", executor: str = "thread",
+                 on_depth: Optional[Callable[[int, int], None]] = None):
+        """
+        Args:
+            pv_names: PVs with a queue each; `index` maps names to queue numbers.
+            process: callable(value) run for every frame. With executor='process'
+                it must be picklable (a module-level function) and frames are copied to the worker.
+            workers: number of worker threads (and processes for executor='process').
+            queue_depth: maximum queued frames per PV.
+            policy: overflow policy, one of POLICIES.
+            on_depth: optional callable(pv_index, depth) invoked on every enqueue/dequeue,
+                e.g. LiveMetrics.set_backlog.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        if executor not in EXECUTORS:
+            raise ValueError(f"executor must be one of {EXECUTORS}")
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        self.process = process
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self.policy = policy
+        self.executor = executor
+        self.on_depth = on_depth
+        n = len(self.pv_names)
+        self.queues = [collections.deque() for _ in range(n)]
+        # one entry per queued frame, in arrival order across PVs
+        self._ready: collections.deque = collections.deque()
+        self._cond = threading.Condition()
+        self._not_full = threading.Condition(self._cond)
+        self.enqueued = np.zeros(n, dtype=np.int64)
+        self.processed = np.zeros(n, dtype=np.int64)
+        self.dropped = np.zeros(n, dtype=np.int64)
+        self.errors = np.zeros(n, dtype=np.int64)
+        self.max_depth = np.zeros(n, dtype=np.int64)
+        self.blocked_sec = np.zeros(n)
+        self.wait = [LatencyHistogram() for _ in range(n)]
+        self.service = [LatencyHistogram() for _ in range(n)]
+        self._threads: List[threading.Thread] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._closing = False
+
+    def start(self) -> "WorkerPipeline":
+        if self.executor == "process":
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        for k in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"pipeline-{k}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(self, i: int, value: Any) -> bool:
+        """Queue a frame of PV `i`. Returns False if this frame was dropped."""
+        q = self.queues[i]
+        with self._cond:
+            if self._closing:
+                return False
+            if len(q) >= self.queue_depth:
+                if self.policy == "drop_newest":
+                    self.dropped[i] += 1
+                    return False
+                if self.policy == "drop_oldest":
+                    q.popleft()
+                    self.dropped[i] += 1
+                    # the _ready entry of the discarded frame is reused by the new one
+                    q.append((time.perf_counter(), value))
+                    self.enqueued[i] += 1
+                    return True
+                t0 = time.perf_counter()
+                while len(q) >= self.queue_depth and not self._closing:
+                    self._not_full.wait()
+                self.blocked_sec[i] += time.perf_counter() - t0
+            q.append((time.perf_counter(), value))
+            self._ready.append(i)
+            self.enqueued[i] += 1
+            depth = len(q)
+            if depth > self.max_depth[i]:
+                self.max_depth[i] = depth
+            self._cond.notify()
+        if self.on_depth is not None:
+            self.on_depth(i, depth)
+        return True
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._closing:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                i = self._ready.popleft()
+                t_enq, value = self.queues[i].popleft()
+                depth = len(self.queues[i])
+                if self.policy == "block":
+                    # wake producers blocked on a full queue
+                    self._not_full.notify_all()
+            if self.on_depth is not None:
+                self.on_depth(i, depth)
+            t0 = time.perf_counter()
+            try:
+                if self._pool is not None:
+                    self._pool.submit(self.process, value).result()
+                else:
+                    self.process(value)
+            except Exception as e:
+                self.errors[i] += 1
+                if self.errors[i] <= 3:
+                    print(f"Pipeline processing error on {self.pv_names[i]}: {e}")
+            t1 = time.perf_counter()
+            with self._cond:
+                self.wait[i].record(t0 - t_enq)
+                self.service[i].record(t1 - t0)
+                self.processed[i] += 1
+
+    def depths(self) -> np.ndarray:
+        with self._cond:
+            return np.array([len(q) for q in self.queues], dtype=np.int64)
+
+    def close(self, drain: bool = True, timeout: float = 5.0) -> None:
+        """Stop the workers; with `drain` the frames already queued are processed first."""
+        with self._cond:
+            if not drain:
+                for q in self.queues:
+                    q.clear()
+                self._ready.clear()
+            self._closing = True
+            self._cond.notify_all()
+            self._not_full.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def report(self) -> Dict[str, Any]:
+        """Per-PV pipeline statistics (dict of arrays/lists, one entry per PV)."""
+        with self._cond:
+            wait = [h.percentiles((50, 99)) for h in self.wait]
+            service = [h.percentiles((50, 99)) for h in self.service]
+            enq = self.enqueued.copy()
+            offered = enq + self.dropped if self.policy == "drop_newest" else enq
+            return {
+                'pv': list(self.pv_names),
+                'enqueued': enq,
+                'processed': self.processed.copy(),
+                'dropped': self.dropped.copy(),
+                'drop_percent': np.divide(self.dropped * 100.0, offered, out=np.zeros(len(enq)), where=offered > 0),
+                'errors': self.errors.copy(),
+                'depth': np.array([len(q) for q in self.queues], dtype=np.int64),
+                'max_depth': self.max_depth.copy(),
+                'blocked_sec': self.blocked_sec.copy(),
+                'wait_p50': np.array([w[50] for w in wait]),
+                'wait_p99': np.array([w[99] for w in wait]),
+                'service_p50': np.array([s[50] for s in service]),
+                'service_p99': np.array([s[99] for s in service]),
+            }
+
+    def rows(self) -> List[List[Any]]:
+        """Report as CSV rows (header first)."""
+        rep = self.report()
+        keys = list(rep)
+        cols = [rep[k].tolist() if hasattr(rep[k], 'tolist') else rep[k] for k in keys]
+        return [keys] + [list(r) for r in zip(*cols)]
@@ -0,0 +1,141 @@
+"""Compact per-PV statistics table backed by preallocated NumPy columns.
+
+One row per PV, addressed by its index in the PV list. The callback path
+does a single dict lookup for the index and then a handful of scalar
+updates; interval mean and variance are kept with Welford's method so no
+per-update Python objects are stored. Reports are computed vectorized over
+all PVs at once:
+
+    table = PVStatsTable(CAMERA_PVS)
+
+    def on_update(pvname, value, timestamp):
+        table.update(table.index[pvname], time.monotonic(), value.nbytes)
+
+    table.report(elapsed)  # dict of per-PV arrays
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+COLUMNS = ("count", "bytes", "first_arrival", "last_arrival", "n_intervals",
+           "min_interval", "max_interval", "mean_interval", "m2_interval")
+
+
+class PVStatsTable:
+    """Per-PV counters, byte totals and Welford interval statistics."""
+
+    def __init__(self, pv_names: Sequence[str]):
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        n = len(self.pv_names)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.bytes = np.zeros(n, dtype=np.int64)
+        self.first_arrival = np.full(n, np.nan)
+        self.last_arrival = np.full(n, np.nan)
+        self.n_intervals = np.zeros(n, dtype=np.int64)
+        self.min_interval = np.full(n, np.inf)
+        self.max_interval = np.zeros(n)
+        self.mean_interval = np.zeros(n)
+        self.m2_interval = np.zeros(n)
+        # memoryviews: scalar updates from the callback avoid numpy indexing overhead
+        self._count = memoryview(self.count)
+        self._bytes = memoryview(self.bytes)
+        self._first = memoryview(self.first_arrival)
+        self._last = memoryview(self.last_arrival)
+        self._n = memoryview(self.n_intervals)
+        self._min = memoryview(self.min_interval)
+        self._max = memoryview(self.max_interval)
+        self._mean = memoryview(self.mean_interval)
+        self._m2 = memoryview(self.m2_interval)
+
+    def __len__(self) -> int:
+        return len(self.pv_names)
+
+    def update(self, i: int, now: float, nbytes: int = 0) -> Optional[float]:
+        """Record one arrival of PV `i` at time `now`. Returns the interval since its previous arrival."""
+        self._count[i] += 1
+        self._bytes[i] += nbytes
+        last = self._last[i]
+        self._last[i] = now
+        if last != last:  # NaN: first arrival
+            self._first[i] = now
+            return None
+        x = now - last
+        k = self._n[i] + 1
+        self._n[i] = k
+        mean = self._mean[i]
+        delta = x - mean
+        mean += delta / k
+        self._mean[i] = mean
+        self._m2[i] += delta * (x - mean)
+        if x < self._min[i]:
+            self._min[i] = x
+        if x > self._max[i]:
+            self._max[i] = x
+        return x
+
+    def reset(self) -> None:
+        self.count[:] = 0
+        self.bytes[:] = 0
+        self.first_arrival[:] = np.nan
+        self.last_arrival[:] = np.nan
+        self.n_intervals[:] = 0
+        self.min_interval[:] = np.inf
+        self.max_interval[:] = 0
+        self.mean_interval[:] = 0
+        self.m2_interval[:] = 0
+
+    def report(self, elapsed: float) -> Dict[str, np.ndarray]:
+        """Vectorized per-PV summary over `elapsed` seconds."""
+        n = self.n_intervals
+        has = n > 0
+        var = np.divide(self.m2_interval, n, out=np.zeros(len(n)), where=has)
+        active = self.last_arrival - self.first_arrival
+        mb = self.bytes / (1024 * 1024)
+        return {
+            'pv': np.asarray(self.pv_names, dtype=object),
+            'updates': self.count.copy(),
+            'total_mb': mb,
+            'update_rate_hz': self.count / elapsed if elapsed > 0 else np.zeros(len(n)),
+            'throughput_mbps': mb / elapsed if elapsed > 0 else np.zeros(len(n)),
+            # 1 / mean interval, i.e. rate while the camera was actually delivering
+            'effective_fps': np.divide(1.0, self.mean_interval, out=np.zeros(len(n)), where=has & (self.mean_interval > 0)),
+            'active_sec': np.nan_to_num(active),
+            'avg_interval': np.where(has, self.mean_interval, 0.0),
+            'min_interval': np.where(has, self.min_interval, 0.0),
+            'max_interval': np.where(has, self.max_interval, 0.0),
+            'interval_stddev': np.sqrt(var),
+        }
+
+    def totals(self) -> Dict[str, Any]:
+        """Aggregate over all PVs, combining the per-PV Welford states exactly."""
+        n = self.n_intervals
+        N = int(n.sum())
+        if N > 0:
+            mean = float((self.mean_interval * n).sum() / N)
+            m2 = float((self.m2_interval + n * (self.mean_interval - mean) ** 2).sum())
+            has = n > 0
+            mn = float(self.min_interval[has].min())
+            mx = float(self.max_interval[has].max())
+        else:
+            mean = m2 = mn = mx = 0.0
+        return {
+            'updates': int(self.count.sum()),
+            'bytes': int(self.bytes.sum()),
+            'intervals': N,
+            'avg_interval': mean,
+            'min_interval': mn,
+            'max_interval': mx,
+            'interval_stddev': math.sqrt(m2 / N) if N > 0 else 0.0,
+        }
+
+    def rows(self, elapsed: float) -> List[List[Any]]:
+        """Report as CSV rows (header first)."""
+        rep = self.report(elapsed)
+        keys = list(rep)
+        cols = [rep[k].tolist() for k in keys]
+        return [keys] + [list(r) for r in zip(*cols)]
@@ -0,0 +1,281 @@
+"""Local PVA fan-out relay: one upstream subscription per camera PV, many viewers.
+
+Every direct viewer opens its own monitor on the camera IOC, so IOC CPU and
+uplink bandwidth grow with the number of viewers. `PvaRelay` subscribes once
+to each upstream PV (raw Values, nt=False) and republishes the received
+Value through a local p4p server. The Value is posted as is, so downstream
+clients get the same array buffer the upstream connection delivered; the
+relay never copies frame data.
+
+    relay = PvaRelay(CAMERA_PVS, prefix="RELAY:", slots=8, queue_depth=4, policy="drop_oldest")
+    relay.start()
+    names = relay.downstream_names(slot=3)   # RELAY:c3:image1:ArrayData, ...
+    ...
+    relay.close()
+    relay.rows()       # per slot/PV: posted, backlog drops, queue depth, added latency
+
+Downstream layout:
+
+- `slots=0` (shared): one served PV per camera, `prefix` replacing the first
+  name component (`13SIM1:image1:ArrayData` -> `RELAY:image1:ArrayData`).
+  Any number of clients may subscribe; each gets the p4p server's own
+  per-subscription queue (sized by the client's pvRequest queueSize), which
+  squashes updates for a slow client without affecting the others. Drops
+  are then only visible to the clients (uniqueId gaps).
+- `slots=N`: client k gets its own names under `<prefix>c<k>:` fed from a
+  relay-side bounded queue per PV (`pipeline.WorkerPipeline`, one worker
+  thread per slot) with the overflow `policy`. `SharedPV.post()` does not
+  wait for downstream clients and p4p exposes neither acknowledgements nor
+  its per-subscription squash counts, so this queue only backs up when the
+  relay itself falls behind (posting costs relay CPU time):
+  `backlog_dropped` counts those frames. Frames the p4p server squashes
+  for a slow viewer are, as in the shared layout, only visible to that
+  client (uniqueId gaps). 'block' applies back-pressure to the upstream
+  callback and therefore stalls every slot.
+
+Added latency is measured from the upstream callback to the return of the
+downstream post. Upstream disconnects close the served PVs (clients see a
+disconnect) until the next upstream update reopens them.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from capture import replay_name
+from histogram import LatencyHistogram
+from pipeline import POLICIES, WorkerPipeline
+
+
+def _nbytes(V: Any) -> int:
+    try:
+        return int(V['value'].nbytes)
+    except Exception:
+        return 0
+
+
+class PvaRelay:
+    """Single upstream subscription per PV republished to shared or per-client downstream PVs."""
+
+    def __init__(self, pv_names: Sequence[str], prefix: str = "RELAY:", slots: int = 0, queue_depth: int = 4,
+                 policy: str = "drop_oldest", options: Optional[Any] = None):
+        """
+        Args:
+            pv_names: upstream PVA PVs (normally config.CAMERA_PVS).
+            prefix: replaces the first name component of the served PVs.
+            slots: 0 serves one shared PV per camera; N > 0 serves N per-client name sets.
+            queue_depth / policy: relay-side queue per slot and PV (slots > 0), see pipeline.POLICIES.
+            options: optional monitor_options.MonitorOptions for the upstream pvRequest.
+        """
+        try:
+            from p4p.server import Server  # type: ignore
+            from p4p.server.thread import SharedPV  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("p4p not installed. Install with: pip install p4p") from e
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.pv_names: List[str] = list(pv_names)
+        self.index: Dict[str, int] = {pv: i for i, pv in enumerate(self.pv_names)}
+        self.prefix = prefix
+        self.slots = max(0, int(slots))
+        self.queue_depth = queue_depth
+        self.policy = policy
+        self.options = options
+        n = len(self.pv_names)
+        groups = self.slots or 1
+        self.names: List[List[str]] = [self._names(s) for s in range(groups)]
+        for names in self.names:
+            if len(set(names)) != n:
+                raise ValueError("upstream PVs differ only in their first name component; use distinct prefixes")
+        # plain lists: updated from the upstream callback threads on every update
+        self.upstream_frames = [0] * n
+        self.upstream_bytes = [0] * n
+        self.disconnects = [0] * n
+        self.posted = [[0] * n for _ in range(groups)]
+        self.post_errors = [[0] * n for _ in range(groups)]
+        self.added = [[LatencyHistogram(max_value=10.0) for _ in range(n)] for _ in range(groups)]
+        self._open = [[False] * n for _ in range(groups)]
+        self._lock = threading.Lock()
+        self._pvs = [[SharedPV() for _ in range(n)] for _ in range(groups)]
+        providers = {name: pv for names, pvs in zip(self.names, self._pvs) for name, pv in zip(names, pvs)}
+        self._server = Server(providers=[providers])
+        self.pipes: List[WorkerPipeline] = []
+        if self.slots:
+            for s in range(self.slots):
+                self.pipes.append(WorkerPipeline(self.pv_names, self._slot_process(s), workers=1,
+                                                 queue_depth=queue_depth, policy=policy))
+        self._ctxt = None
+        self._subs: List[Any] = []
+        self.start_time: Optional[float] = None
+
+    def _names(self, slot: int) -> List[str]:
+        prefix = f"{self.prefix}c{slot}:" if self.slots else self.prefix
+        return [replay_name(pv, prefix) for pv in self.pv_names]
+
+    def downstream_names(self, slot: Optional[int] = None, pvs: Optional[Sequence[str]] = None) -> List[str]:
+        """Served names for upstream `pvs` (default: all); `slot` is required when slots > 0."""
+        if self.slots and slot is None:
+            raise ValueError("slot is required when the relay serves per-client slots")
+        names = self.names[slot % self.slots if self.slots else 0]
+        return [names[self.index[pv]] for pv in (self.pv_names if pvs is None else pvs)]
+
+    def start(self) -> "PvaRelay":
+        try:
+            from p4p.client.thread import Context  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("p4p not installed. Install with: pip install p4p") from e
+        for pipe in self.pipes:
+            pipe.start()
+        # raw Values: republished unchanged, no NT unwrapping on the way through
+        self._ctxt = Context('pva', nt=False)
+        request = self.options.pva_request() if self.options is not None else None
+        self.start_time = time.time()
+        for i, pv in enumerate(self.pv_names):
+            self._subs.append(self._ctxt.monitor(pv, self._upstream_cb(i), request=request, notify_disconnect=True))
+        return self
+
+    def _upstream_cb(self, i: int):
+        def _cb(V):
+            t = time.perf_counter()
+            if isinstance(V, Exception):
+                # notify_disconnect: channel loss (or the initial "not yet connected") arrives as an exception
+                self._close_pv(i)
+                return
+            self.upstream_frames[i] += 1
+            self.upstream_bytes[i] += _nbytes(V)
+            if self.slots:
+                for pipe in self.pipes:
+                    pipe.submit(i, (V, t, i))
+            else:
+                self._post(0, i, V, t)
+        return _cb
+
+    def _slot_process(self, slot: int):
+        def process(item):
+            V, t, i = item
+            self._post(slot, i, V, t)
+        return process
+
+    def _post(self, slot: int, i: int, V: Any, t: float) -> None:
+        pv = self._pvs[slot][i]
+        try:
+            if self._open[slot][i]:
+                pv.post(V)
+            else:
+                with self._lock:
+                    pv.open(V)
+                    self._open[slot][i] = True
+            self.posted[slot][i] += 1
+        except Exception as e:
+            self.post_errors[slot][i] += 1
+            if self.post_errors[slot][i] <= 3:
+                print(f"Relay post error on {self.names[slot][i]}: {e}")
+            return
+        self.added[slot][i].record(time.perf_counter() - t)
+
+    def _close_pv(self, i: int) -> None:
+        if self.upstream_frames[i]:
+            self.disconnects[i] += 1
+        with self._lock:
+            for slot, pvs in enumerate(self._pvs):
+                if self._open[slot][i]:
+                    self._open[slot][i] = False
+                    try:
+                        pvs[i].close()
+                    except Exception:
+                        pass
+
+    def close(self) -> None:
+        if self._ctxt is not None:
+            try:
+                self._ctxt.close()
+            except Exception:
+                pass
+            self._ctxt = None
+        for pipe in self.pipes:
+            pipe.close(drain=False)
+        try:
+            self._server.stop()
+        except Exception:
+            pass
+
+    def report(self) -> Dict[str, Any]:
+        """Per slot and PV (slot -1 for the shared layout): served name, posted, backlog drops, added latency."""
+        rep: Dict[str, List[Any]] = {k: [] for k in (
+            'slot', 'pv', 'served_as', 'upstream_frames', 'upstream_bytes', 'upstream_disconnects', 'posted',
+            'backlog_dropped', 'backlog_drop_percent', 'max_queue_depth', 'post_errors', 'added_p50_ms',
+            'added_p99_ms', 'added_max_ms')}
+        for slot in range(self.slots or 1):
+            pipe = self.pipes[slot].report() if self.slots else None
+            for i, pv in enumerate(self.pv_names):
+                h = self.added[slot][i]
+                rep['slot'].append(slot if self.slots else -1)
+                rep['pv'].append(pv)
+                rep['served_as'].append(self.names[slot][i])
+                rep['upstream_frames'].append(self.upstream_frames[i])
+                rep['upstream_bytes'].append(self.upstream_bytes[i])
+                rep['upstream_disconnects'].append(self.disconnects[i])
+                rep['posted'].append(self.posted[slot][i])
+                rep['backlog_dropped'].append(int(pipe['dropped'][i]) if pipe else 0)
+                rep['backlog_drop_percent'].append(float(pipe['drop_percent'][i]) if pipe else 0.0)
+                rep['max_queue_depth'].append(int(pipe['max_depth'][i]) if pipe else 0)
+                rep['post_errors'].append(self.post_errors[slot][i])
+                rep['added_p50_ms'].append(h.percentile(50) * 1e3)
+                rep['added_p99_ms'].append(h.percentile(99) * 1e3)
+                rep['added_max_ms'].append(h.max * 1e3 if h.total else 0.0)
+        return rep
+
+    def summary(self) -> Dict[str, Any]:
+        rep = self.report()
+        posted = int(sum(rep['posted']))
+        frames = sum(self.upstream_frames)
+        mean_bytes = sum(self.upstream_bytes) / frames if frames else 0.0
+        added = LatencyHistogram.merged(h for hs in self.added for h in hs)
+        return {
+            'upstream_subscriptions': len(self.pv_names),
+            'upstream_frames': frames,
+            'upstream_bytes': sum(self.upstream_bytes),
+            'downstream_posts': posted,
+            'downstream_bytes': int(posted * mean_bytes),
+            'backlog_dropped': int(sum(rep['backlog_dropped'])),
+            'added_p50_ms': added.percentile(50) * 1e3,
+            'added_p99_ms': added.percentile(99) * 1e3,
+        }
+
+    def rows(self) -> List[List[Any]]:
+        """Report as CSV rows (header first)."""
+        rep = self.report()
+        keys = list(rep)
+        return [keys] + [list(r) for r in zip(*(rep[k] for k in keys))]
+
+    def print_summary(self) -> None:
+        s = self.summary()
+        elapsed = time.time() - self.start_time if self.start_time else 0.0
+        print(f"Relay: {s['upstream_subscriptions']} upstream subscriptions, {s['upstream_frames']} frames "
+              f"({s['upstream_bytes'] / 1024 / 1024:.1f} MB) in, {s['downstream_posts']} posts "
+              f"({s['downstream_bytes'] / 1024 / 1024:.1f} MB) out over {elapsed:.0f} s")
+        print(f"    added latency p50 {s['added_p50_ms']:.3f} ms, p99 {s['added_p99_ms']:.3f} ms, "
+              f"{s['backlog_dropped']} frames dropped from slot backlogs")
+        if self.slots:
+            rep = self.report()
+            dropped = np.zeros(self.slots, dtype=np.int64)
+            for slot, d in zip(rep['slot'], rep['backlog_dropped']):
+                dropped[slot] += d
+            for slot in np.nonzero(dropped)[0]:
+                print(f"    slot {slot}: {dropped[slot]} frames dropped (relay backlog)")
+
+
+def add_relay_arguments(parser) -> None:
+    """Relay layout options shared by 16_relay.py and 05_concurrent_test.py --route relay."""
+    parser.add_argument("--relay-prefix", default="RELAY:",
+                        help="转发 PV 名前缀，替换原 PV 名的第一段 (default: RELAY:)")
+    parser.add_argument("--relay-slots", type=int, default=None,
+                        help="每客户端独立名称组的数量 (RELAY:c<k>:...)，每组每 PV 一个有界队列，统计转发器自身积压导致的丢帧；"
+                             "0 为所有客户端共享一个 PV（由 p4p 服务器按订阅排队）")
+    parser.add_argument("--relay-queue", type=int, default=4, help="每个名称组每 PV 的转发队列长度 (default: 4)")
+    parser.add_argument("--relay-policy", choices=POLICIES, default="drop_oldest",
+                        help="队列满时的策略 (default: drop_oldest)；block 会阻塞上游回调，拖慢所有客户端")
@@ -0,0 +1,276 @@
+"""Process, thread and network-interface sampling to separate protocol overhead from payload.
+
+`ResourceSampler` runs one background thread that every `interval` seconds
+reads our own process CPU time (user/system) and RSS, the NIC byte/packet
+counters, and the payload bytes/frames the callbacks have seen (through
+caller-supplied counters, so nothing is added to the callback path). Every
+`thread_every` samples it also reads each thread's CPU time. Samples go
+into a preallocated ColumnBuffer; rates are derived vectorized afterwards.
+
+    sampler = ResourceSampler(interval=0.1, nic="eth0", protocol="pva",
+                              payload_source=lambda: monitor.total_data_size,
+                              frames_source=lambda: monitor.update_count).start()
+    ...
+    sampler.stop()
+    sampler.summary()   # CPU %, RSS, wire vs payload bytes, overhead, packets per frame
+    sampler.save(os.path.join(RESULTS_DIR, "stress"))
+
+Wire overhead is NIC bytes received divided by callback payload bytes: the
+protocol headers, segmentation and any other traffic on that interface. With
+`nic=None` all interfaces are summed (including loopback, which carries the
+traffic of a local simulated IOC), so pass the camera network interface when
+other traffic matters. A sample is one os.times() call and two small /proc
+reads (per-thread times only every `thread_every` samples), well under 1% of
+a core at the default 10 Hz; the sampler measures its own CPU time and
+reports it as `sampler_cpu_percent`.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from column_buffer import ColumnBuffer
+
+SAMPLE_COLUMNS = [("timestamp", "f8"), ("cpu_user", "f8"), ("cpu_system", "f8"), ("rss_mb", "f8"),
+                  ("threads", "i4"), ("net_bytes_recv", "i8"), ("net_packets_recv", "i8"),
+                  ("net_bytes_sent", "i8"), ("net_packets_sent", "i8"), ("net_drop_in", "i8"),
+                  ("payload_bytes", "i8"), ("frames", "i8")]
+
+
+class ResourceSampler:
+    """Background sampler of own-process CPU/RSS, per-thread CPU, NIC counters and payload counters."""
+
+    def __init__(self, interval: float = 0.1, nic: Optional[str] = None, thread_every: int = 10,
+                 include_children: bool = False, protocol: Optional[str] = None,
+                 payload_source: Optional[Callable[[], float]] = None,
+                 frames_source: Optional[Callable[[], float]] = None, spill_path: Optional[str] = None):
+        """
+        Args:
+            interval: seconds between samples.
+            nic: interface name to count ('lo' for a local simulator); None sums all interfaces.
+            thread_every: read per-thread CPU times every N samples (they cost one /proc read per thread).
+            include_children: add child processes' CPU and RSS (05 process mode).
+            protocol: recorded in the summary for CA vs PVA comparison.
+            payload_source / frames_source: callables returning cumulative payload bytes / frames.
+            spill_path: append full sample chunks to this file instead of keeping them in memory (soak runs).
+        """
+        try:
+            import psutil  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("psutil not installed. Install with: pip install psutil") from e
+        self._psutil = psutil
+        self.proc = psutil.Process()
+        self.interval = interval
+        self.nic = nic
+        self.thread_every = max(1, thread_every)
+        self.include_children = include_children
+        self.protocol = protocol
+        self.payload_source = payload_source
+        self.frames_source = frames_source
+        if nic is not None and nic not in psutil.net_io_counters(pernic=True):
+            raise ValueError(f"unknown network interface '{nic}'")
+        self.samples = ColumnBuffer(SAMPLE_COLUMNS, capacity=4096, spill_path=spill_path)
+        # native thread id -> [name, first (user, system), last (user, system), first seen, last seen]
+        self.threads: Dict[int, List[Any]] = {}
+        self._children: List[Any] = []
+        self._n_threads = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sampler_cpu = 0.0
+
+    def set_sources(self, payload: Optional[Callable[[], float]] = None,
+                    frames: Optional[Callable[[], float]] = None) -> None:
+        self.payload_source = payload
+        self.frames_source = frames
+
+    def start(self) -> "ResourceSampler":
+        self._sample(threads=True)
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop sampling (takes one final sample). Safe to call more than once."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._sample(threads=True)
+
+    def _run(self) -> None:
+        k = 0
+        while not self._stop.wait(self.interval):
+            t0 = time.thread_time()
+            k += 1
+            try:
+                self._sample(threads=k % self.thread_every == 0)
+            except Exception as e:
+                print(f"Resource sampling error: {e}")
+            self.sampler_cpu += time.thread_time() - t0
+
+    def _net(self):
+        if self.nic is None:
+            c = self._psutil.net_io_counters()
+        else:
+            c = self._psutil.net_io_counters(pernic=True)[self.nic]
+        return c.bytes_recv, c.packets_recv, c.bytes_sent, c.packets_sent, c.dropin
+
+    def _sample(self, threads: bool = False) -> None:
+        now = time.time()
+        # os.times() is a single syscall; psutil's cpu_times() parses /proc
+        cpu = os.times()
+        rss = self.proc.memory_info().rss
+        tinfo = self.proc.threads() if threads else None
+        if tinfo is not None:
+            self._n_threads = len(tinfo)
+        user, system = cpu.user, cpu.system
+        if self.include_children:
+            # exited and reaped children are in children_user/children_system
+            user += cpu.children_user
+            system += cpu.children_system
+            if threads or not self._children:
+                self._children = self.proc.children(recursive=True)
+            for child in self._children:
+                try:
+                    c = child.cpu_times()
+                    user += c.user
+                    system += c.system
+                    rss += child.memory_info().rss
+                except self._psutil.Error:
+                    pass
+        payload = self.payload_source() if self.payload_source is not None else 0
+        frames = self.frames_source() if self.frames_source is not None else 0
+        self.samples.append_locked(now, user, system, rss / 1024 / 1024, self._n_threads, *self._net(),
+                                   int(payload), int(frames))
+        if tinfo is not None:
+            names = {t.native_id: t.name for t in threading.enumerate()}
+            for t in tinfo:
+                entry = self.threads.get(t.id)
+                if entry is None:
+                    self.threads[t.id] = [names.get(t.id, f"thread-{t.id}"), (t.user_time, t.system_time),
+                                          (t.user_time, t.system_time), now, now]
+                else:
+                    entry[0] = names.get(t.id, entry[0])
+                    entry[2] = (t.user_time, t.system_time)
+                    entry[4] = now
+
+    # ------------------------------------------------------------------
+    # Reports
+    # ------------------------------------------------------------------
+    def arrays(self) -> Dict[str, np.ndarray]:
+        with self.samples._lock:
+            return self.samples.to_arrays()
+
+    def rows(self) -> List[List[Any]]:
+        """Per-interval rates (header first): CPU %, RSS, NIC MB/s and packets/s, payload MB/s, fps."""
+        a = self.arrays()
+        dt = np.diff(a['timestamp'])
+        dt[dt <= 0] = np.nan
+        mb = 1024 * 1024
+        cols = {
+            'timestamp': a['timestamp'][1:],
+            'process_cpu_percent': (np.diff(a['cpu_user']) + np.diff(a['cpu_system'])) / dt * 100,
+            'user_percent': np.diff(a['cpu_user']) / dt * 100,
+            'system_percent': np.diff(a['cpu_system']) / dt * 100,
+            'rss_mb': a['rss_mb'][1:],
+            'threads': a['threads'][1:],
+            'net_rx_mbps': np.diff(a['net_bytes_recv']) / dt / mb,
+            'net_rx_packets_per_sec': np.diff(a['net_packets_recv']) / dt,
+            'net_tx_mbps': np.diff(a['net_bytes_sent']) / dt / mb,
+            'net_drop_in': np.diff(a['net_drop_in']),
+            'payload_mbps': np.diff(a['payload_bytes']) / dt / mb,
+            'frames_per_sec': np.diff(a['frames']) / dt,
+        }
+        keys = list(cols)
+        return [keys] + [list(r) for r in zip(*(cols[k].tolist() for k in keys))]
+
+    def thread_rows(self) -> List[List[Any]]:
+        """CPU time of each thread seen during the run (header first), busiest first."""
+        out = []
+        for tid, (name, first, last, t_first, t_last) in self.threads.items():
+            user, system = last[0] - first[0], last[1] - first[1]
+            span = t_last - t_first
+            out.append([tid, name, user, system, (user + system) / span * 100 if span > 0 else 0.0])
+        out.sort(key=lambda r: -(r[2] + r[3]))
+        return [["thread_id", "name", "cpu_user_sec", "cpu_system_sec", "cpu_percent"]] + out
+
+    def summary(self) -> Dict[str, Any]:
+        """Whole-run totals, including wire overhead relative to callback payload."""
+        a = self.arrays()
+        if len(a['timestamp']) < 2:
+            return {'protocol': self.protocol, 'samples': len(a['timestamp'])}
+        span = float(a['timestamp'][-1] - a['timestamp'][0])
+        d = {k: float(a[k][-1] - a[k][0]) for k in ('cpu_user', 'cpu_system', 'net_bytes_recv', 'net_packets_recv',
+                                                      'net_bytes_sent', 'net_packets_sent', 'net_drop_in',
+                                                      'payload_bytes', 'frames')}
+        wire, payload, frames = d['net_bytes_recv'], d['payload_bytes'], d['frames']
+        return {
+            'protocol': self.protocol,
+            'nic': self.nic or "all",
+            'samples': len(a['timestamp']),
+            'duration_sec': span,
+            'process_cpu_percent': (d['cpu_user'] + d['cpu_system']) / span * 100 if span > 0 else 0.0,
+            'user_percent': d['cpu_user'] / span * 100 if span > 0 else 0.0,
+            'system_percent': d['cpu_system'] / span * 100 if span > 0 else 0.0,
+            'rss_max_mb': float(a['rss_mb'].max()),
+            'rss_growth_mb': float(a['rss_mb'][-1] - a['rss_mb'][0]),
+            'wire_mb': wire / 1024 / 1024,
+            'wire_packets': int(d['net_packets_recv']),
+            'payload_mb': payload / 1024 / 1024,
+            'frames': int(frames),
+            'wire_overhead_ratio': wire / payload if payload else np.nan,
+            'wire_overhead_percent': (wire - payload) / payload * 100 if payload else np.nan,
+            'wire_bytes_per_frame': wire / frames if frames else np.nan,
+            'payload_bytes_per_frame': payload / frames if frames else np.nan,
+            'packets_per_frame': d['net_packets_recv'] / frames if frames else np.nan,
+            'tx_mb': d['net_bytes_sent'] / 1024 / 1024,
+            'drop_in': int(d['net_drop_in']),
+            # CPU per delivered payload: protocol + client cost per MB
+            'cpu_ms_per_mb': (d['cpu_user'] + d['cpu_system']) * 1e3 / (payload / 1024 / 1024) if payload else np.nan,
+            'sampler_cpu_percent': self.sampler_cpu / span * 100 if span > 0 else 0.0,
+        }
+
+    def save(self, prefix: str) -> List[str]:
+        """Write <prefix>_resources.csv, <prefix>_threads.csv and <prefix>_resources_summary.csv."""
+        paths = [f"{prefix}_resources.csv", f"{prefix}_threads.csv", f"{prefix}_resources_summary.csv"]
+        with open(paths[0], "w", newline="") as f:
+            csv.writer(f).writerows(self.rows())
+        with open(paths[1], "w", newline="") as f:
+            csv.writer(f).writerows(self.thread_rows())
+        s = self.summary()
+        with open(paths[2], "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(list(s))
+            writer.writerow(list(s.values()))
+        return paths
+
+    def print_summary(self) -> None:
+        s = self.summary()
+        if 'duration_sec' not in s:
+            return
+        print(f"  Process CPU {s['process_cpu_percent']:.1f}% (user {s['user_percent']:.1f}%, "
+              f"system {s['system_percent']:.1f}%), RSS max {s['rss_max_mb']:.1f} MB "
+              f"(growth {s['rss_growth_mb']:+.1f} MB)")
+        print(f"  NIC {s['nic']}: {s['wire_mb']:.1f} MB / {s['wire_packets']} packets received; payload "
+              f"{s['payload_mb']:.1f} MB in {s['frames']} frames")
+        if s['payload_mb'] > 0:
+            print(f"  Wire overhead {s['wire_overhead_percent']:+.2f}% ({s['wire_bytes_per_frame']:.0f} wire bytes, "
+                  f"{s['packets_per_frame']:.1f} packets per frame), {s['cpu_ms_per_mb']:.2f} CPU ms per MB")
+        print(f"  Sampler cost: {s['sampler_cpu_percent']:.3f}% CPU ({s['samples']} samples)")
+        for tid, name, user, system, pct in self.thread_rows()[1:6]:
+            print(f"    thread {name} ({tid}): {user + system:.2f} s CPU, {pct:.1f}%")
+
+
+def add_resource_arguments(parser) -> None:
+    """--sample-interval / --nic options shared by the test scripts."""
+    parser.add_argument("--sample-interval", type=float, default=0.1,
+                        help="进程/线程 CPU、RSS 和网卡计数器的采样间隔秒数 (default: 0.1)")
+    parser.add_argument("--nic", default=None,
+                        help="统计的网卡名（本机模拟 IOC 用 lo）；默认合计所有网卡")
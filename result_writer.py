@@ -0,0 +1,230 @@
+"""Non-blocking batched result sink for the monitoring scripts.
+
+Opening the CSV file and building a `csv.writer` inside a CA/PVA callback
+adds file-system latency to the very intervals we are measuring. This
+module moves the file I/O onto a background thread:
+
+    from result_writer import ResultWriter
+
+    writer = ResultWriter(results_file, ["pv", "frame_interval_sec"])
+
+    def on_update(pvname, value, timestamp):
+        writer.push((pvname, dt))   # O(1), never touches the file
+
+    ...
+    writer.close()                  # flushes the remaining records
+    print(writer.format_stats())
+
+Records go into a preallocated ring buffer of fixed capacity. The writer
+thread drains it in bulk when `batch_size` records are pending or when
+`flush_interval` seconds have passed, whichever comes first. If the buffer
+is full the new record is dropped and counted, so the callback thread is
+never blocked by a slow disk.
+
+A `.parquet` or `.h5` path (with `dtypes` for the columns) writes through a
+`results_store.ResultStore` instead of CSV.
+"""
+
+from __future__ import annotations
+
+import csv
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from results_store import ResultStore, format_of
+
+
+class ResultWriter:
+    """Ring-buffered CSV (or columnar) writer flushed by a background thread."""
+
+    def __init__(self, path: str, header: Optional[Sequence[str]] = None, capacity: int = 65536,
+                 batch_size: int = 1024, flush_interval: float = 1.0, mode: str = "w",
+                 dtypes: Optional[Sequence[str]] = None):
+        """
+        Args:
+            path: output file; CSV unless the extension selects a ResultStore format.
+            header: column names written once when the file is opened in 'w' mode.
+            capacity: ring buffer size in records; pushes beyond this are dropped.
+            batch_size: wake the writer as soon as this many records are pending.
+            flush_interval: maximum seconds a record waits before being written.
+            mode: 'w' to truncate (and write header) or 'a' to append.
+            dtypes: column types for columnar formats (numpy dtype strings or 'category').
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = max(1, min(batch_size, capacity))
+        self.flush_interval = flush_interval
+
+        # Preallocated ring: slots are overwritten in place, never appended.
+        self._buf: List[Any] = [None] * capacity
+        self._head = 0  # index of the oldest pending record
+        self._count = 0  # number of pending records
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        # Statistics (read under the lock or after close)
+        self.pushed = 0
+        self.dropped = 0
+        self.written = 0
+        self.flush_count = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+        self.max_pending = 0
+
+        self._store: Optional[ResultStore] = None
+        self._file = None
+        if format_of(path) != "csv":
+            if header is None or dtypes is None:
+                raise ValueError("columnar result files need header and dtypes")
+            self._store = ResultStore(path, list(zip(header, dtypes)))
+        else:
+            self._file = open(path, mode, newline="")
+            self._csv = csv.writer(self._file)
+            if header is not None and mode == "w":
+                self._csv.writerow(header)
+                self._file.flush()
+
+        self._thread = threading.Thread(target=self._run, name=f"ResultWriter({path})", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Producer side (callback threads)
+    # ------------------------------------------------------------------
+    def push(self, record: Sequence[Any]) -> bool:
+        """Queue one record. Returns False if it was dropped because the buffer is full."""
+        with self._lock:
+            if self._count >= self.capacity or self._closed:
+                self.dropped += 1
+                return False
+            self._buf[(self._head + self._count) % self.capacity] = record
+            self._count += 1
+            self.pushed += 1
+            if self._count > self.max_pending:
+                self.max_pending = self._count
+            wake = self._count >= self.batch_size
+        if wake:
+            self._wake.set()
+        return True
+
+    def push_many(self, records: Sequence[Sequence[Any]]) -> int:
+        """Queue several records at once. Returns the number accepted."""
+        accepted = 0
+        for record in records:
+            if self.push(record):
+                accepted += 1
+        return accepted
+
+    # ------------------------------------------------------------------
+    # Consumer side (writer thread)
+    # ------------------------------------------------------------------
+    def _drain(self) -> List[Any]:
+        with self._lock:
+            n = self._count
+            if n == 0:
+                return []
+            head = self._head
+            end = head + n
+            if end <= self.capacity:
+                batch = self._buf[head:end]
+            else:
+                batch = self._buf[head:] + self._buf[:end - self.capacity]
+            # Release references so large rows can be collected.
+            for i in range(n):
+                self._buf[(head + i) % self.capacity] = None
+            self._head = end % self.capacity
+            self._count = 0
+        return batch
+
+    def _flush_batch(self, batch: List[Any]) -> None:
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        if self._store is not None:
+            self._store.append_rows(batch)
+        else:
+            self._csv.writerows(batch)
+            self._file.flush()
+        dt = time.perf_counter() - t0
+        self.written += len(batch)
+        self.flush_count += 1
+        self.flush_time_total += dt
+        if dt > self.flush_time_max:
+            self.flush_time_max = dt
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._flush_batch(self._drain())
+            except Exception as e:
+                print(f"ResultWriter({self.path}) flush error: {e}")
+            if self._closed:
+                # Final drain after close() so nothing pushed before it is lost.
+                try:
+                    self._flush_batch(self._drain())
+                except Exception as e:
+                    print(f"ResultWriter({self.path}) flush error: {e}")
+                return
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Ask the writer thread to flush now and wait until the buffer is empty."""
+        self._wake.set()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if self._count == 0:
+                    return
+            time.sleep(0.01)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop accepting records, flush what is pending and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout)
+        try:
+            if self._store is not None:
+                self._store.close()
+            else:
+                self._file.close()
+        except Exception as e:
+            print(f"ResultWriter({self.path}) close error: {e}")
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._count
+        flushes = self.flush_count
+        return {
+            'path': self.path,
+            'pushed': self.pushed,
+            'written': self.written,
+            'dropped': self.dropped,
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'capacity': self.capacity,
+            'flush_count': flushes,
+            'flush_time_total_sec': self.flush_time_total,
+            'flush_time_avg_sec': self.flush_time_total / flushes if flushes else 0.0,
+            'flush_time_max_sec': self.flush_time_max,
+        }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"{s['path']}: written={s['written']} dropped={s['dropped']} "
+                f"max_pending={s['max_pending']}/{s['capacity']} flushes={s['flush_count']} "
+                f"avg_flush={s['flush_time_avg_sec'] * 1e3:.2f} ms max_flush={s['flush_time_max_sec'] * 1e3:.2f} ms")
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,353 @@
+"""Columnar result files: Parquet or HDF5 with run metadata, CSV kept for export.
+
+Writers append typed columns in chunks instead of formatting one CSV line
+per record. String columns that repeat (PV names) are stored dictionary
+encoded (Parquet) or as fixed-width strings (HDF5; integer columns are stored
+as float64 there, NaN for missing values), and every file carries the run
+metadata (protocol, PV list, host, start time, command line):
+
+    from results_store import ResultStore, read_results, result_path
+
+    RUN_METADATA.update(run_metadata("pva", CAMERA_PVS))
+    store = ResultStore(result_path("results", "latency", "parquet"),
+                        [("pv", "category"), ("frame_interval_sec", "f8"), ("recv_time", "f8")])
+    store.append({"pv": pvs, "frame_interval_sec": dt, "recv_time": t})   # arrays or lists
+    store.close()
+
+    df = read_results("results/latency.parquet", columns=["pv", "frame_interval_sec"],
+                      start=t0, end=t0 + 60, time_column="recv_time")
+    export_csv("results/latency.parquet", "latency.csv")
+
+The format follows the file extension: `.parquet` (needs pyarrow), `.h5`
+(needs PyTables) or `.csv` (metadata goes to `<file>.meta.json`). The
+default format for scripts is taken from the RESULTS_FORMAT environment
+variable (csv when unset).
+"""
+
+from __future__ import annotations
+
+import getpass
+import json
+import os
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "hdf5": ".h5"}
+DEFAULT_FORMAT = os.environ.get("RESULTS_FORMAT", "csv")
+HDF_KEY = "data"
+# Width of HDF5 string columns: a table fixes it on the first append, so it is
+# sized up front (PV names, method names) and longer strings are truncated.
+HDF_MIN_ITEMSIZE = 128
+META_KEY = "pva_run"
+# Shared by all stores of this process; runners fill it in before data is written.
+RUN_METADATA: Dict[str, Any] = {}
+
+
+def run_metadata(protocol: Optional[str], pv_names: Sequence[str], **extra: Any) -> Dict[str, Any]:
+    """Metadata describing the current run."""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = None
+    meta = {
+        'protocol': protocol,
+        'pv_names': list(pv_names),
+        'host': socket.gethostname(),
+        'user': user,
+        'pid': os.getpid(),
+        'start_time': time.time(),
+        'start_time_iso': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'argv': list(sys.argv),
+        'python': sys.version.split()[0],
+    }
+    meta.update(extra)
+    return meta
+
+
+def format_of(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    for fmt, e in FORMATS.items():
+        if ext == e or (fmt == "hdf5" and ext in (".hdf5", ".hdf")):
+            return fmt
+    raise ValueError(f"unknown results format for '{path}'; use one of {', '.join(FORMATS.values())}")
+
+
+def result_path(results_dir: str, stem: str, fmt: Optional[str] = None) -> str:
+    """`results_dir/stem.<ext>` for `fmt` (default: RESULTS_FORMAT)."""
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"results format must be one of {', '.join(FORMATS)}")
+    return os.path.join(results_dir, stem + FORMATS[fmt])
+
+
+def find_result(results_dir: str, stem: str) -> Optional[str]:
+    """Most recently written `stem.*` result file in any supported format, or None."""
+    found = [os.path.join(results_dir, stem + ext) for ext in FORMATS.values()]
+    found = [p for p in found if os.path.exists(p)]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # type: ignore
+        import pyarrow.parquet  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("pyarrow not installed. Install with: pip install pyarrow") from e
+    return pyarrow, pyarrow.parquet
+
+
+def _require_pandas():
+    try:
+        import pandas  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("pandas not installed. Install with: pip install pandas") from e
+    return pandas
+
+
+class ResultStore:
+    """Chunked, typed, appendable result file (Parquet row groups / HDF5 table / CSV)."""
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str]], metadata: Optional[Dict[str, Any]] = None,
+                 chunk_rows: int = 65536):
+        """
+        Args:
+            path: output file; the extension selects the format.
+            columns: (name, dtype) pairs; dtype is a numpy dtype string or 'category'
+                (strings stored dictionary encoded) or 'str'.
+            metadata: run metadata; defaults to the shared RUN_METADATA, read when the
+                file is first written (Parquet) or closed (HDF5/CSV).
+            chunk_rows: rows buffered before a chunk is written.
+        """
+        self.path = path
+        self.format = format_of(path)
+        self.columns = list(columns)
+        self.names = [name for name, _ in self.columns]
+        self.metadata = RUN_METADATA if metadata is None else metadata
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_rows = 0
+        self._writer = None
+        self._csv_header = False
+        self._itemsize: Dict[str, int] = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if self.format == "parquet":
+            _require_pyarrow()
+        for p in (path, path + ".meta.json"):
+            if os.path.exists(p):
+                os.remove(p)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, data: Dict[str, Any]) -> None:
+        """Append a chunk given as {column: array or list}; all columns the same length."""
+        n = len(data[self.names[0]])
+        if n == 0:
+            return
+        self._pending.append(data)
+        self._pending_rows += n
+        if self._pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def append_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        """Append row tuples in column order (e.g. a ResultWriter batch)."""
+        if rows:
+            self.append({name: list(col) for name, col in zip(self.names, zip(*rows))})
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        frame = self._frame(self._pending)
+        self._pending = []
+        self._pending_rows = 0
+        getattr(self, f"_write_{self.format}")(frame)
+        self.rows_written += len(frame)
+
+    def _frame(self, chunks: List[Dict[str, Any]]):
+        pd = _require_pandas()
+        cols = {}
+        for name, dtype in self.columns:
+            parts = [c[name] for c in chunks]
+            if dtype in ("category", "str"):
+                values = np.concatenate([np.asarray(p, dtype=object) for p in parts])
+                cols[name] = pd.Categorical(values) if dtype == "category" else values
+                continue
+            try:
+                # None becomes NaN in float columns
+                cols[name] = np.concatenate([np.asarray(p, dtype=dtype) for p in parts])
+            except (TypeError, ValueError):
+                # None in an integer column (e.g. missing uniqueId): nullable integers
+                cols[name] = pd.array(np.concatenate([np.asarray(p, dtype=object) for p in parts]), dtype="Int64")
+        return pd.DataFrame(cols)
+
+    def _arrow_schema(self):
+        pa, _ = _require_pyarrow()
+        fields = []
+        for name, dtype in self.columns:
+            if dtype == "category":
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            elif dtype == "str":
+                fields.append(pa.field(name, pa.string()))
+            else:
+                fields.append(pa.field(name, pa.from_numpy_dtype(np.dtype(dtype))))
+        meta = {META_KEY: json.dumps(self.metadata, default=str)}
+        return pa.schema(fields, metadata=meta)
+
+    def _write_parquet(self, frame) -> None:
+        pa, pq = _require_pyarrow()
+        if self._writer is None:
+            self._schema = self._arrow_schema()
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._writer.write_table(pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+
+    def _write_hdf5(self, frame) -> None:
+        pd = _require_pandas()
+        if self._writer is None:
+            try:
+                self._writer = pd.HDFStore(self.path, mode="w", complevel=5, complib="blosc:lz4")
+            except ImportError as e:
+                raise RuntimeError("PyTables not installed. Install with: pip install tables") from e
+        for name, dtype in self.columns:
+            if dtype not in ("category", "str") and np.dtype(dtype).kind in "iu":
+                # PyTables tables have no nullable integers and fix a column's type on the
+                # first append: any chunk may carry None (e.g. missing uniqueId), so integer
+                # columns are always stored as float64 with NaN for missing values
+                frame[name] = frame[name].astype("float64")
+            elif dtype in ("category", "str"):
+                # Per-chunk categoricals cannot be appended to each other (their categories differ),
+                # so strings are stored with a width fixed by the first chunk
+                values = frame[name].astype(object).where(frame[name].notna(), "").astype(str)
+                if name not in self._itemsize:
+                    self._itemsize[name] = max(HDF_MIN_ITEMSIZE, int(values.str.len().max() or 0))
+                frame[name] = values.str.slice(0, self._itemsize[name])
+        self._writer.append(HDF_KEY, frame, format="table", data_columns=True, index=False,
+                            min_itemsize=self._itemsize or None)
+
+    def _write_csv(self, frame) -> None:
+        frame.to_csv(self.path, mode="a", header=not self._csv_header, index=False)
+        self._csv_header = True
+
+    def close(self) -> None:
+        self.flush()
+        if self.format == "parquet":
+            if self._writer is None:
+                self._write_parquet(self._frame([{name: [] for name in self.names}]))
+            self._writer.close()
+        elif self.format == "hdf5":
+            if self._writer is not None:
+                self._writer.get_storer(HDF_KEY).attrs.pva_run = json.dumps(self.metadata, default=str)
+                self._writer.close()
+        else:
+            if not self._csv_header:
+                with open(self.path, "w", newline="") as f:
+                    f.write(",".join(self.names) + "\n")
+            with open(self.path + ".meta.json", "w") as f:
+                json.dump(self.metadata, f, default=str)
+        self._writer = None
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_frame(path: str, frame, metadata: Optional[Dict[str, Any]] = None, categorical: Sequence[str] = ()) -> None:
+    """Write a whole DataFrame in the format given by `path`'s extension."""
+    columns = [(c, "category" if c in categorical else ("str" if frame[c].dtype == object else frame[c].dtype.str))
+               for c in frame.columns]
+    with ResultStore(path, columns, metadata=metadata, chunk_rows=max(1, len(frame))) as store:
+        store.append({c: frame[c].to_numpy() for c in frame.columns})
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+def read_results(path: str, columns: Optional[Sequence[str]] = None, start: Optional[float] = None,
+                 end: Optional[float] = None, time_column: str = "timestamp"):
+    """Load a result file as a DataFrame, optionally only `columns` and rows with start <= time_column < end."""
+    pd = _require_pandas()
+    fmt = format_of(path)
+    cols = list(columns) if columns else None
+    need_time = (start is not None or end is not None)
+    if cols and need_time and time_column not in cols:
+        load = cols + [time_column]
+    else:
+        load = cols
+    if fmt == "parquet":
+        _, pq = _require_pyarrow()
+        filters = []
+        if start is not None:
+            filters.append((time_column, ">=", start))
+        if end is not None:
+            filters.append((time_column, "<", end))
+        df = pq.read_table(path, columns=load, filters=filters or None).to_pandas()
+    elif fmt == "hdf5":
+        where = []
+        if start is not None:
+            where.append(f"{time_column} >= {start!r}")
+        if end is not None:
+            where.append(f"{time_column} < {end!r}")
+        df = pd.read_hdf(path, HDF_KEY, columns=load, where=" & ".join(where) or None)
+    else:
+        df = pd.read_csv(path, usecols=load)
+        if start is not None:
+            df = df[df[time_column] >= start]
+        if end is not None:
+            df = df[df[time_column] < end]
+    if cols and load is not cols:
+        df = df[cols]
+    return df.reset_index(drop=True)
+
+
+def read_metadata(path: str) -> Dict[str, Any]:
+    """Run metadata stored with a result file ({} if none)."""
+    fmt = format_of(path)
+    if fmt == "parquet":
+        _, pq = _require_pyarrow()
+        meta = pq.read_schema(path).metadata or {}
+        raw = meta.get(META_KEY.encode())
+        return json.loads(raw) if raw else {}
+    if fmt == "hdf5":
+        pd = _require_pandas()
+        with pd.HDFStore(path, mode="r") as store:
+            raw = getattr(store.get_storer(HDF_KEY).attrs, "pva_run", None)
+        return json.loads(raw) if raw else {}
+    side = path + ".meta.json"
+    if os.path.exists(side):
+        with open(side) as f:
+            return json.load(f)
+    return {}
+
+
+def export_csv(path: str, csv_path: str, columns: Optional[Sequence[str]] = None, start: Optional[float] = None,
+               end: Optional[float] = None, time_column: str = "timestamp") -> int:
+    """Export (a selection of) a result file to CSV. Returns the number of rows written."""
+    df = read_results(path, columns, start, end, time_column)
+    df.to_csv(csv_path, index=False)
+    return len(df)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or export a results file (parquet/h5/csv) to CSV")
+    parser.add_argument("path")
+    parser.add_argument("--csv", help="导出到该 CSV 文件；不指定时打印元数据和前几行")
+    parser.add_argument("--columns", default=None, help="逗号分隔的列名")
+    parser.add_argument("--start", type=float, default=None)
+    parser.add_argument("--end", type=float, default=None)
+    parser.add_argument("--time-column", default="timestamp")
+    args = parser.parse_args()
+    cols = [c for c in args.columns.split(",") if c] if args.columns else None
+    if args.csv:
+        n = export_csv(args.path, args.csv, cols, args.start, args.end, args.time_column)
+        print(f"Exported {n} rows to {args.csv}")
+    else:
+        print(json.dumps(read_metadata(args.path), indent=2, default=str))
+        print(read_results(args.path, cols, args.start, args.end, args.time_column).head(20))
@@ -0,0 +1,321 @@
+"""Batch analysis of many result files: per-PV and per-run summaries, CA vs PVA deltas.
+
+Each input file (latency, stress_cpu, stress_test, throughput or packetloss
+results in CSV/Parquet/HDF5) is parsed once and reduced to a small summary;
+summaries are cached as JSON keyed by the file's content hash and the
+analysis parameters, so re-running over hundreds of runs only re-parses the
+files that changed. Files are summarized in parallel worker processes:
+
+    per_pv, per_run = analyze(paths, info=load_run_info("data/runs.csv"), jobs=8)
+    deltas = protocol_deltas(per_run)
+
+Run attributes (protocol, nominal fps, label) come from, in order: the
+`info` mapping (file name -> dict), the run metadata stored with the file
+(results_store), or a `ca`/`pva` token in the file name.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from results_store import format_of, read_metadata, read_results
+
+CACHE_VERSION = 1
+PERCENTILES = (50, 90, 99, 99.9)
+_PROTOCOL_TOKEN = re.compile(r"(?:^|[_\-.])(ca|pva)(?:[_\-.]|$)", re.IGNORECASE)
+
+
+def file_hash(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def detect_kind(columns: Sequence[str]) -> Optional[str]:
+    cols = set(columns)
+    if "frame_interval_sec" in cols:
+        return "latency"
+    if {"metric", "value"} <= cols:
+        return "stress_test"
+    if "cpu_percent" in cols:
+        return "stress_cpu"
+    if "mb_per_sec" in cols:
+        return "throughput"
+    if "loss_rate_percent" in cols:
+        return "packetloss"
+    if "wire_overhead_percent" in cols:
+        return "resources"
+    return None
+
+
+def interval_stats(x: np.ndarray, outlier_factor: float = 2.0) -> Dict[str, float]:
+    """Percentiles, jitter, effective FPS and outlier bursts of one series of frame intervals."""
+    n = len(x)
+    if n == 0:
+        return {'samples': 0}
+    pct = np.percentile(x, PERCENTILES)
+    mean = float(x.mean())
+    median = float(pct[0])
+    # outliers: intervals longer than outlier_factor x the median; a burst is a run of consecutive outliers
+    out = x > outlier_factor * median if median > 0 else np.zeros(n, dtype=bool)
+    edges = np.diff(np.concatenate(([0], out.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    stats = {
+        'samples': n,
+        'mean': mean,
+        'std': float(x.std()),
+        'min': float(x.min()),
+        'max': float(x.max()),
+        # mean absolute difference of consecutive intervals (RFC 3550 style jitter)
+        'jitter': float(np.abs(np.diff(x)).mean()) if n > 1 else 0.0,
+        'effective_fps': 1.0 / mean if mean > 0 else 0.0,
+        'outliers': int(out.sum()),
+        'outlier_percent': float(out.mean() * 100),
+        'bursts': int(len(lengths)),
+        'max_burst_len': int(lengths.max()) if len(lengths) else 0,
+        'max_burst_sec': float(max(x[s:e].sum() for s, e in zip(starts, ends))) if len(lengths) else 0.0,
+    }
+    for q, v in zip(PERCENTILES, pct):
+        stats[f'p{q:g}'] = float(v)
+    return stats
+
+
+def _summarize_latency(df, skip: int, outlier_factor: float) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    df = df.copy()
+    df["frame_interval_sec"] = np.asarray(df["frame_interval_sec"], dtype=np.float64)
+    df = df[np.isfinite(df["frame_interval_sec"])]
+    per_pv = []
+    all_x = []
+    for pv, g in df.groupby("pv", sort=True, observed=True):
+        x = g["frame_interval_sec"].to_numpy()[skip:]
+        row = {'pv': str(pv), **interval_stats(x, outlier_factor)}
+        if "ioc_latency_sec" in g.columns:
+            lat = np.asarray(g["ioc_latency_sec"], dtype=np.float64)[skip:]
+            lat = lat[np.isfinite(lat)]
+            if len(lat):
+                row['e2e_mean'] = float(lat.mean())
+                row['e2e_p50'], row['e2e_p99'] = (float(v) for v in np.percentile(lat, (50, 99)))
+        per_pv.append(row)
+        all_x.append(x)
+    x = np.concatenate(all_x) if all_x else np.zeros(0)
+    run = {'pvs': len(per_pv), **interval_stats(x, outlier_factor)}
+    return per_pv, run
+
+
+def _summarize_stress_cpu(df, skip: int) -> Dict[str, Any]:
+    df = df.iloc[skip:]
+    run = {'samples': len(df)}
+    for col in ("cpu_percent", "memory_percent", "memory_used_mb", "process_cpu_percent", "process_rss_mb"):
+        if col in df.columns and len(df):
+            v = np.asarray(df[col], dtype=np.float64)
+            run[f'{col}_mean'] = float(np.nanmean(v))
+            run[f'{col}_max'] = float(np.nanmax(v))
+    if {"timestamp", "update_count"} <= set(df.columns) and len(df) > 1:
+        dt = float(df["timestamp"].iloc[-1] - df["timestamp"].iloc[0])
+        if dt > 0:
+            run['update_rate_hz'] = float(df["update_count"].iloc[-1] - df["update_count"].iloc[0]) / dt
+    return run
+
+
+def summarize_file(path: str, skip: int = 5, outlier_factor: float = 2.0) -> Dict[str, Any]:
+    """Parse one result file and reduce it to {'kind', 'per_pv': [...], 'run': {...}}."""
+    df = read_results(path)
+    kind = detect_kind(df.columns)
+    per_pv: List[Dict[str, Any]] = []
+    if kind == "latency":
+        per_pv, run = _summarize_latency(df, skip, outlier_factor)
+    elif kind == "stress_cpu":
+        run = _summarize_stress_cpu(df, skip)
+    elif kind == "stress_test":
+        run = {str(m): float(v) for m, v in zip(df["metric"], df["value"]) if _is_number(v)}
+    elif kind == "resources":
+        # one-row ResourceSampler summary
+        run = {k: float(v) for k, v in df.iloc[0].items() if k != "protocol" and _is_number(v)}
+    elif kind == "throughput":
+        for pv, g in df.groupby("pv", sort=True, observed=True):
+            v = np.asarray(g["mb_per_sec"], dtype=np.float64)[skip:]
+            per_pv.append({'pv': str(pv), 'samples': len(v), 'mb_per_sec_mean': float(v.mean()) if len(v) else 0.0,
+                           'mb_per_sec_min': float(v.min()) if len(v) else 0.0})
+        run = {'pvs': len(per_pv), 'mb_per_sec_total': sum(r['mb_per_sec_mean'] for r in per_pv)}
+    elif kind == "packetloss":
+        # cumulative counters: the last report of each PV is the run total
+        last = df.groupby("pv", sort=True, observed=True).tail(1)
+        for _, r in last.iterrows():
+            per_pv.append({'pv': str(r["pv"]), 'total_frames': int(r["total_frames"]),
+                           'lost_frames': int(r["lost_frames"]), 'loss_rate_percent': float(r["loss_rate_percent"])})
+        total = sum(r['total_frames'] for r in per_pv)
+        lost = sum(r['lost_frames'] for r in per_pv)
+        run = {'pvs': len(per_pv), 'total_frames': total, 'lost_frames': lost,
+               'loss_rate_percent': lost / total * 100 if total else 0.0}
+    else:
+        raise ValueError(f"unrecognized result file: {path}")
+    return {'kind': kind, 'per_pv': per_pv, 'run': run}
+
+
+def _is_number(v: Any) -> bool:
+    try:
+        float(v)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+class SummaryCache:
+    """JSON summaries in `directory`, keyed by file content hash and analysis parameters."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, digest: str, **params: Any) -> str:
+        p = json.dumps(params, sort_keys=True)
+        return hashlib.sha1(f"{CACHE_VERSION}:{digest}:{p}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, key + ".json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        tmp = os.path.join(self.directory, f"{key}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, os.path.join(self.directory, key + ".json"))
+
+
+def _summarize_cached(path: str, skip: int, outlier_factor: float, cache_dir: Optional[str]) -> Tuple[Dict[str, Any], bool]:
+    if cache_dir is None:
+        return summarize_file(path, skip, outlier_factor), False
+    cache = SummaryCache(cache_dir)
+    key = cache.key(file_hash(path), skip=skip, outlier_factor=outlier_factor)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit, True
+    summary = summarize_file(path, skip, outlier_factor)
+    cache.put(key, summary)
+    return summary, False
+
+
+def load_run_info(path: str) -> Dict[str, Dict[str, Any]]:
+    """Run attributes from a CSV (columns: file, protocol, fps, label...) or JSON {file: {...}} mapping."""
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    import pandas as pd
+    df = pd.read_csv(path)
+    return {str(r.pop("file")): {k: v for k, v in r.items() if v == v} for r in df.to_dict("records")}
+
+
+def run_info(path: str, info: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    name = os.path.basename(path)
+    out: Dict[str, Any] = {'run': name, 'protocol': None, 'fps': None}
+    try:
+        meta = read_metadata(path)
+    except Exception:
+        meta = {}
+    if meta.get('protocol'):
+        out['protocol'] = meta['protocol']
+    m = _PROTOCOL_TOKEN.search(os.path.splitext(name)[0])
+    if out['protocol'] is None and m:
+        out['protocol'] = m.group(1).lower()
+    if info:
+        out.update(info.get(name) or info.get(path) or {})
+    return out
+
+
+def analyze(paths: Sequence[str], info: Optional[Dict[str, Dict[str, Any]]] = None, jobs: int = 0,
+            cache_dir: Optional[str] = None, skip: int = 5, outlier_factor: float = 2.0):
+    """Summarize `paths` in parallel. Returns (per_pv, per_run) DataFrames."""
+    import pandas as pd
+
+    paths = [p for p in paths if _supported(p)]
+    results: Dict[str, Any] = {}
+    hits = 0
+    jobs = jobs or min(len(paths), os.cpu_count() or 1) or 1
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {p: pool.submit(_summarize_cached, p, skip, outlier_factor, cache_dir) for p in paths}
+            for p, fut in futures.items():
+                try:
+                    results[p], hit = fut.result()
+                    hits += hit
+                except Exception as e:
+                    print(f"Skipping {p}: {e}")
+    else:
+        for p in paths:
+            try:
+                results[p], hit = _summarize_cached(p, skip, outlier_factor, cache_dir)
+                hits += hit
+            except Exception as e:
+                print(f"Skipping {p}: {e}")
+    if cache_dir is not None:
+        print(f"Summarized {len(results)} file(s): {hits} from cache, {len(results) - hits} parsed")
+
+    pv_rows, run_rows = [], []
+    for p, summary in results.items():
+        attrs = run_info(p, info)
+        attrs['kind'] = summary['kind']
+        run_rows.append({**attrs, **summary['run']})
+        for row in summary['per_pv']:
+            pv_rows.append({**attrs, **row})
+    per_pv, per_run = pd.DataFrame(pv_rows), pd.DataFrame(run_rows)
+    for df in (per_pv, per_run):
+        if {"fps", "mean"} <= set(df.columns):
+            # frame interval versus the nominal one (1/fps)
+            fps = pd.to_numeric(df["fps"], errors="coerce")
+            df["nominal_interval"] = 1.0 / fps
+            df["interval_error_ms"] = (df["mean"] - df["nominal_interval"]) * 1e3
+            df["fps_ratio"] = df["effective_fps"] / fps
+    return per_pv, per_run
+
+
+def _supported(path: str) -> bool:
+    try:
+        format_of(path)
+        return not path.endswith(".meta.json")
+    except ValueError:
+        return False
+
+
+LATENCY_DELTA_METRICS = ("mean", "p50", "p99", "jitter", "effective_fps", "outlier_percent")
+RESOURCE_DELTA_METRICS = ("wire_overhead_percent", "wire_bytes_per_frame", "packets_per_frame",
+                          "process_cpu_percent", "cpu_ms_per_mb")
+
+
+def protocol_deltas(per_run, metrics: Sequence[str] = LATENCY_DELTA_METRICS, kind: str = "latency"):
+    """PVA minus CA for runs of `kind` with the same nominal fps (mean over repeated runs).
+
+    Runs without a known fps are compared with each other (fps NaN in the result).
+    """
+    import pandas as pd
+
+    if len(per_run) == 0 or not {"kind", "protocol"} <= set(per_run.columns):
+        return pd.DataFrame()
+    lat = per_run[(per_run["kind"] == kind) & per_run["protocol"].isin(["ca", "pva"])]
+    lat = lat.assign(fps=pd.to_numeric(lat["fps"], errors="coerce").fillna(-1) if "fps" in lat.columns else -1)
+    metrics = [m for m in metrics if m in lat.columns]
+    pivot = lat.groupby(["fps", "protocol"])[metrics].mean().unstack("protocol")
+    if len(pivot) == 0 or not {"ca", "pva"} <= set(pivot.columns.get_level_values(1)):
+        return pd.DataFrame()
+    out = pd.DataFrame({'fps': np.where(pivot.index == -1, np.nan, pivot.index)})
+    for m in metrics:
+        ca, pva = pivot[(m, "ca")].to_numpy(), pivot[(m, "pva")].to_numpy()
+        out[f'{m}_ca'] = ca
+        out[f'{m}_pva'] = pva
+        out[f'{m}_delta'] = pva - ca
+        out[f'{m}_ratio'] = np.divide(pva, ca, out=np.full(len(ca), np.nan), where=ca != 0)
+    # fps values measured with only one of the protocols have nothing to compare
+    return out.dropna(subset=[f'{metrics[0]}_delta']).reset_index(drop=True) if metrics else out
@@ -0,0 +1,103 @@
+"""Exact frame loss / duplicate / reorder accounting from NTNDArray uniqueId.
+
+areaDetector increments `uniqueId` by one for every array it produces, so
+gaps in the sequence seen by a client are frames that never arrived. A
+64-frame bitmask of recently seen IDs tells a late (reordered) frame apart
+from a duplicate without keeping any history beyond one integer. An ID
+older than that window (e.g. ArrayCounter restarting at 1 when acquisition
+is restarted) is a counter reset, not a late frame:
+
+    tracker = SequenceTracker()
+    for uid in (1, 2, 4, 3, 3):
+        tracker.update(uid)
+    tracker.lost, tracker.reordered, tracker.duplicates  # -> 0, 1, 1
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+WINDOW = 64
+_MASK = (1 << WINDOW) - 1
+
+
+class SequenceTracker:
+    """O(1) per-frame uniqueId sequence accounting for one PV."""
+
+    __slots__ = ('last', 'received', 'lost', 'duplicates', 'reordered', 'resets', '_seen')
+
+    def __init__(self):
+        self.last: Optional[int] = None
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.resets = 0
+        self._seen = 0  # bit k set => ID (last - k) has been received
+
+    def update(self, uid: int) -> int:
+        """Record one received uniqueId. Returns the number of frames newly counted as lost."""
+        self.received += 1
+        last = self.last
+        if last is None:
+            self.last = uid
+            self._seen = 1
+            return 0
+        d = uid - last
+        if d > 0:
+            self.last = uid
+            self._seen = ((self._seen << d) | 1) & _MASK if d < WINDOW else 1
+            self.lost += d - 1
+            return d - 1
+        if d == 0:
+            self.duplicates += 1
+            return 0
+        back = -d
+        if back >= WINDOW:
+            # Older than the seen window: IOC restart or counter reset
+            self.resets += 1
+            self.last = uid
+            self._seen = 1
+            return 0
+        bit = 1 << back
+        if self._seen & bit:
+            self.duplicates += 1
+            return 0
+        self._seen |= bit
+        # A late frame that was already counted as lost
+        self.reordered += 1
+        if self.lost > 0:
+            self.lost -= 1
+        return 0
+
+    def seen(self, uid: int) -> bool:
+        """Whether `uid` was received; IDs older than the window count as seen."""
+        if self.last is None:
+            return False
+        back = self.last - uid
+        if back < 0:
+            return False
+        return back >= WINDOW or bool(self._seen >> back & 1)
+
+    def reset_counts(self) -> None:
+        """Zero the counters (after warm-up); the sequence position is kept."""
+        self.received = self.lost = self.duplicates = self.reordered = self.resets = 0
+
+    @property
+    def expected(self) -> int:
+        """Frames the IOC produced in the observed range (received + lost - duplicates)."""
+        return self.received - self.duplicates + self.lost
+
+    @property
+    def loss_rate(self) -> float:
+        expected = self.expected
+        return self.lost / expected if expected > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'resets': self.resets,
+        }
@@ -0,0 +1,309 @@
+"""Synthetic camera IOC for hardware-free benchmarking.
+
+Serves N image PVs shaped like the areaDetector `imageN:ArrayData` PVs in
+`config.CAMERA_PVS`:
+
+- PVA via a p4p server: NTNDArray with `uniqueId`, `timeStamp` and
+  `dataTimeStamp` set for every frame.
+- CA via a pcaspy server: a waveform `imageN:ArrayData` (DBR_TIME stamps are
+  set by pcaspy on every `setParam`) plus `imageN:UniqueId_RBV`.
+
+Frame timing is driven by one scheduler thread for all cameras, with
+configurable rate, Gaussian jitter, random drops (the uniqueId still
+advances so clients see a gap) and periodic bursts.
+
+Frames are never allocated per update. Each camera owns a small pool of
+preallocated images; for PVA a prebuilt NTNDArray Value is kept per pool
+slot so posting only rewrites the scalar `uniqueId`/timestamp fields and
+the array buffer is shared with the server without a copy.
+
+Library usage (the CLI is `08_sim_ioc.py`):
+
+    cams = make_cameras(4, prefix="SIM:", width=1024, height=1024, fps=30)
+    sim = Simulator(cams, protocols=("pva",))
+    sim.run(duration=60)
+"""
+
+from __future__ import annotations
+
+import heapq
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+DTYPES = ("uint8", "int8", "uint16", "int16", "uint32", "int32", "float32", "float64")
+
+# numpy dtype -> pcaspy waveform type
+CA_TYPES = {
+    "uint8": "char", "int8": "char",
+    "uint16": "short", "int16": "short",
+    "uint32": "int", "int32": "int",
+    "float32": "float", "float64": "double",
+}
+
+
+def sim_pv_names(n: int, prefix: str = "SIM:") -> List[str]:
+    """PV names in the same layout as the beamline cameras."""
+    return [f"{prefix}image{i + 1}:ArrayData" for i in range(n)]
+
+
+class FramePool:
+    """A fixed ring of preallocated frames, reused for every update."""
+
+    def __init__(self, width: int, height: int, dtype: str = "uint8", depth: int = 4, seed: int = 0):
+        self.dtype = np.dtype(dtype)
+        rng = np.random.default_rng(seed)
+        self.frames: List[np.ndarray] = []
+        for _ in range(max(1, depth)):
+            if self.dtype.kind == "f":
+                frame = rng.random((height, width), dtype=np.float64).astype(self.dtype)
+            else:
+                hi = min(np.iinfo(self.dtype).max, 4095)
+                frame = rng.integers(0, hi, size=(height, width), dtype=self.dtype)
+            self.frames.append(frame)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames[0].nbytes
+
+    def get(self, unique_id: int) -> np.ndarray:
+        return self.frames[unique_id % len(self.frames)]
+
+
+class SimCamera:
+    """Timing model and frame source for one simulated camera."""
+
+    def __init__(self, name: str, width: int = 1024, height: int = 1024, dtype: str = "uint8",
+                 fps: float = 10.0, jitter: float = 0.0, drop_prob: float = 0.0,
+                 burst_every: float = 0.0, burst_len: int = 0, pool_depth: int = 4, seed: int = 0):
+        """
+        Args:
+            name: full PV name, e.g. 'SIM:image1:ArrayData'.
+            fps: nominal frame rate.
+            jitter: standard deviation of the send time, in seconds.
+            drop_prob: probability that a frame is skipped (uniqueId still advances).
+            burst_every: every this many seconds send `burst_len` extra frames back-to-back (0 = off).
+        """
+        if fps <= 0:
+            raise ValueError("fps must be positive")
+        self.name = name
+        self.base = name[:-len(":ArrayData")] if name.endswith(":ArrayData") else name
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.jitter = jitter
+        self.drop_prob = drop_prob
+        self.burst_every = burst_every
+        self.burst_len = burst_len
+        self.pool = FramePool(width, height, dtype, pool_depth, seed)
+        self.rng = random.Random(seed)
+
+        self.unique_id = 0
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self._nominal = 0.0
+        self._next_burst = 0.0
+        self._burst_left = 0
+
+    def start(self, t0: float) -> float:
+        self._nominal = t0
+        self._next_burst = t0 + self.burst_every if self.burst_every > 0 else float("inf")
+        return t0
+
+    def next_time(self, now: float) -> float:
+        """Schedule the next frame. Bursts go out immediately, others on the nominal grid plus jitter."""
+        if self._burst_left > 0:
+            self._burst_left -= 1
+            return now
+        if now >= self._next_burst:
+            self._burst_left = self.burst_len
+            self._next_burst += self.burst_every
+        self._nominal += self.period
+        if self._nominal < now - self.period:
+            # Fell behind (host overloaded); re-anchor instead of catching up in a burst.
+            self._nominal = now
+        t = self._nominal
+        if self.jitter > 0:
+            t += self.rng.gauss(0.0, self.jitter)
+        return t
+
+    def advance(self) -> bool:
+        """Advance uniqueId; returns False if this frame should be dropped."""
+        self.unique_id += 1
+        if self.drop_prob > 0 and self.rng.random() < self.drop_prob:
+            self.dropped += 1
+            return False
+        return True
+
+
+def make_cameras(n: int, prefix: str = "SIM:", **kwargs) -> List[SimCamera]:
+    seed = kwargs.pop("seed", 0)
+    return [SimCamera(name, seed=seed + i, **kwargs) for i, name in enumerate(sim_pv_names(n, prefix))]
+
+
+# ----------------------------------------------------------------------
+# Protocol publishers
+# ----------------------------------------------------------------------
+class PvaPublisher:
+    """p4p server publishing NTNDArray frames."""
+
+    def __init__(self, cameras: Sequence[SimCamera]):
+        try:
+            from p4p.nt import NTNDArray  # type: ignore
+            from p4p.server import Server  # type: ignore
+            from p4p.server.thread import SharedPV  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("p4p not installed. Install with: pip install p4p") from e
+
+        nt = NTNDArray()
+        self._pvs: Dict[str, Any] = {}
+        # One prebuilt Value per pool slot: posting reuses its array buffer.
+        self._values: Dict[str, List[Any]] = {}
+        for cam in cameras:
+            values = [nt.wrap(frame) for frame in cam.pool.frames]
+            # nt=None: post() publishes our prebuilt Values unchanged.
+            self._pvs[cam.name] = SharedPV(initial=values[0])
+            self._values[cam.name] = values
+        self._server = Server(providers=[self._pvs])
+
+    def publish(self, cam: SimCamera, ts: float) -> None:
+        V = self._values[cam.name][cam.unique_id % len(cam.pool)]
+        sec = int(ts)
+        nsec = int((ts - sec) * 1e9)
+        V['uniqueId'] = cam.unique_id & 0x7FFFFFFF
+        V['timeStamp.secondsPastEpoch'] = sec
+        V['timeStamp.nanoseconds'] = nsec
+        V['dataTimeStamp.secondsPastEpoch'] = sec
+        V['dataTimeStamp.nanoseconds'] = nsec
+        self._pvs[cam.name].post(V)
+
+    def close(self) -> None:
+        try:
+            self._server.stop()
+        except Exception:
+            pass
+
+
+class CaPublisher:
+    """pcaspy server publishing waveform frames plus a UniqueId_RBV counter."""
+
+    def __init__(self, cameras: Sequence[SimCamera], prefix: str = ""):
+        try:
+            from pcaspy import SimpleServer, Driver  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("pcaspy not installed. Install with: pip install pcaspy") from e
+
+        pvdb: Dict[str, Dict[str, Any]] = {}
+        for cam in cameras:
+            frame = cam.pool.frames[0]
+            pvdb[cam.name] = {'type': CA_TYPES[frame.dtype.name], 'count': int(frame.size)}
+            pvdb[cam.base + ":UniqueId_RBV"] = {'type': 'int'}
+        self._server = SimpleServer()
+        self._server.createPV(prefix, pvdb)
+        self._driver = Driver()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._process, name="pcaspy", daemon=True)
+        self._thread.start()
+
+    def _process(self) -> None:
+        while not self._stop.is_set():
+            self._server.process(0.01)
+
+    def publish(self, cam: SimCamera, ts: float) -> None:
+        # Flat view of the pooled frame; pcaspy copies it into the gdd on updatePVs.
+        frame = cam.pool.get(cam.unique_id).reshape(-1)
+        with self._lock:
+            self._driver.setParam(cam.name, frame)
+            self._driver.setParam(cam.base + ":UniqueId_RBV", cam.unique_id & 0x7FFFFFFF)
+            self._driver.updatePVs()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(1.0)
+
+
+# ----------------------------------------------------------------------
+# Scheduler
+# ----------------------------------------------------------------------
+class Simulator:
+    """Drive all cameras from one scheduler thread and publish on the chosen protocols."""
+
+    def __init__(self, cameras: Sequence[SimCamera], protocols: Iterable[str] = ("pva",),
+                 publishers: Optional[Sequence[Any]] = None):
+        self.cameras = list(cameras)
+        if publishers is None:
+            publishers = []
+            for proto in protocols:
+                proto = proto.lower()
+                if proto == "pva":
+                    publishers.append(PvaPublisher(self.cameras))
+                elif proto == "ca":
+                    publishers.append(CaPublisher(self.cameras))
+                else:
+                    raise ValueError("protocol must be 'ca' or 'pva'")
+        self.publishers = list(publishers)
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, duration: Optional[float] = None, report_interval: float = 5.0,
+            report: Optional[Callable[[str], None]] = print) -> None:
+        t0 = time.monotonic()
+        wall0 = time.time() - t0  # monotonic -> wall clock offset for timestamps
+        heap = [(cam.start(t0), i) for i, cam in enumerate(self.cameras)]
+        heapq.heapify(heap)
+        end = t0 + duration if duration else float("inf")
+        next_report = t0 + report_interval
+        last_bytes = 0
+        last_report = t0
+
+        while not self._stop.is_set() and heap:
+            t, i = heap[0]
+            now = time.monotonic()
+            if now >= end:
+                break
+            if t > now:
+                self._stop.wait(min(t - now, end - now))
+                continue
+            heapq.heapreplace(heap, (self.cameras[i].next_time(now), i))
+
+            cam = self.cameras[i]
+            if cam.advance():
+                ts = wall0 + now
+                for pub in self.publishers:
+                    pub.publish(cam, ts)
+                cam.sent += 1
+                cam.bytes_sent += cam.pool.nbytes
+
+            if report is not None and now >= next_report:
+                total = sum(c.bytes_sent for c in self.cameras)
+                rate = (total - last_bytes) / (now - last_report) / (1024 * 1024)
+                sent = sum(c.sent for c in self.cameras)
+                dropped = sum(c.dropped for c in self.cameras)
+                report(f"[sim] frames sent={sent} dropped={dropped} rate={rate:.1f} MB/s")
+                last_bytes, last_report = total, now
+                next_report = now + report_interval
+
+    def close(self) -> None:
+        self.stop()
+        for pub in self.publishers:
+            pub.close()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [{
+            'pv': cam.name,
+            'last_unique_id': cam.unique_id,
+            'sent': cam.sent,
+            'dropped': cam.dropped,
+            'mb_sent': cam.bytes_sent / 1024 / 1024,
+        } for cam in self.cameras]
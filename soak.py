@@ -0,0 +1,455 @@
+"""Long-running soak runs: periodic checkpoints, flat memory and leak detection.
+
+A soak run lives in one directory. `SoakRun` calls the registered window
+sources every `checkpoint_interval` seconds and writes what they return
+(counter deltas, window histograms; nothing that grows with run time) to
+`ckpt_<n>.json`, so a crash after 20 hours loses at most one interval.
+Every `memory_interval` seconds it appends process RSS and, with
+`tracemalloc_frames > 0`, the Python heap traced by tracemalloc to
+`memory.csv`; each checkpoint also records the top allocators and the top
+growth since the run started, labelled by origin (this client's modules,
+the EPICS libraries' Python code, stdlib/other).
+
+    soak = SoakRun("results/soak/night1", CAMERA_PVS, duration=72 * 3600)
+    soak.add_source("stress", monitor.checkpoint_window)
+    soak.start()
+    time.sleep(soak.remaining)
+    soak.stop()
+    print_summary(summarize("results/soak/night1"))   # also works while the run is going
+
+A leak is flagged when the least-squares RSS growth of the current process
+(after the first `settle_fraction` of its samples, at least 8 left) exceeds
+`leak_threshold` MB/hour with R^2 >= 0.5. If the traced Python heap grows
+at a comparable rate the growth is in Python objects and the top growth
+allocators name the code; otherwise it is native memory (libca, pvxs,
+allocator fragmentation), outside what tracemalloc sees.
+
+Restarting with the same directory resumes the run: the checkpoint numbers
+continue, each process is a new `segment` (RSS fits are per segment) and
+`remaining` is the rest of the total `duration`. State and checkpoint files
+are replaced atomically, so `summarize` can read them at any time.
+"""
+
+from __future__ import annotations
+
+import csv
+import gc
+import glob
+import json
+import os
+import sysconfig
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from histogram import LatencyHistogram
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MEMORY_COLUMNS = ["timestamp", "segment", "elapsed_sec", "rss_mb", "traced_mb", "traced_peak_mb"]
+LIBRARY_PACKAGES = ("epics", "p4p", "pvaccess", "pcaspy", "numpy")
+_STDLIB = os.path.normcase(sysconfig.get_paths()["stdlib"])
+
+
+def origin(filename: str) -> str:
+    """'client' (this repository), 'library' (EPICS/numpy packages), 'stdlib' or 'other'."""
+    path = os.path.normcase(os.path.abspath(filename))
+    parts = path.replace("\\", "/").split("/")
+    if "site-packages" in parts or "dist-packages" in parts:
+        return "library" if any(p in parts for p in LIBRARY_PACKAGES) else "other"
+    if path.startswith(os.path.normcase(HERE) + os.sep):
+        return "client"
+    if path.startswith(_STDLIB):
+        return "stdlib"
+    return "other"
+
+
+def fit_growth(t: Sequence[float], y: Sequence[float]) -> Dict[str, float]:
+    """Least-squares slope (units per hour) of y over t (seconds), with R^2."""
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ok = np.isfinite(t) & np.isfinite(y)
+    t, y = t[ok], y[ok]
+    if len(t) < 3 or np.ptp(t) <= 0:
+        return {'slope_per_hour': float("nan"), 'r2': float("nan"), 'samples': int(len(t))}
+    h = (t - t[0]) / 3600.0
+    slope, intercept = np.polyfit(h, y, 1)
+    resid = y - (slope * h + intercept)
+    var = float(((y - y.mean()) ** 2).sum())
+    r2 = 1.0 - float((resid ** 2).sum()) / var if var > 0 else 0.0
+    return {'slope_per_hour': float(slope), 'r2': r2, 'samples': int(len(t))}
+
+
+class GrowthSeries:
+    """(t, y) samples for trend fits in fixed memory: when full, every other sample is dropped."""
+
+    def __init__(self, capacity: int = 512):
+        self.capacity = max(8, capacity)
+        self.t: List[float] = []
+        self.y: List[float] = []
+        self._stride = 1
+        self._skip = 0
+
+    def add(self, t: float, y: float) -> None:
+        self._skip += 1
+        if self._skip < self._stride:
+            return
+        self._skip = 0
+        self.t.append(t)
+        self.y.append(y)
+        if len(self.t) >= self.capacity:
+            del self.t[1::2]
+            del self.y[1::2]
+            self._stride *= 2
+
+    def fit(self, settle_fraction: float = 0.2) -> Dict[str, float]:
+        k = int(len(self.t) * settle_fraction)
+        return fit_growth(self.t[k:], self.y[k:])
+
+
+def leak_verdict(rss: Dict[str, float], traced: Optional[Dict[str, float]], threshold: float) -> Dict[str, Any]:
+    """Combine the RSS and traced-heap fits into a leak flag and where the growth is."""
+    slope, r2 = rss.get('slope_per_hour', float("nan")), rss.get('r2', float("nan"))
+    suspected = bool(rss.get('samples', 0) >= 8 and np.isfinite(slope) and slope > threshold and r2 >= 0.5)
+    where = None
+    if suspected:
+        py = traced.get('slope_per_hour') if traced else None
+        if py is None or not np.isfinite(py):
+            where = "unknown (tracemalloc off)"
+        else:
+            where = "python heap" if py >= 0.5 * slope else "native (outside tracemalloc)"
+    return {'leak_suspected': suspected, 'rss_mb_per_hour': slope, 'rss_r2': r2,
+            'traced_mb_per_hour': traced.get('slope_per_hour') if traced else None, 'growth_in': where}
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1, default=lambda o: o.tolist() if hasattr(o, "tolist") else float(o))
+    os.replace(tmp, path)
+
+
+class SoakRun:
+    """Checkpoints window sources and samples memory for one process of a (resumable) soak run."""
+
+    def __init__(self, soak_dir: str, pv_names: Sequence[str], duration: float, checkpoint_interval: float = 300.0,
+                 memory_interval: float = 30.0, tracemalloc_frames: int = 1, top: int = 10,
+                 leak_threshold: float = 1.0, settle_fraction: float = 0.2, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            soak_dir: run directory; an existing run in it is resumed.
+            pv_names: PVs of the run (checked on resume).
+            duration: total soak seconds over all segments.
+            checkpoint_interval: seconds between checkpoint files.
+            memory_interval: seconds between RSS / traced-heap samples.
+            tracemalloc_frames: traceback depth for tracemalloc; 0 disables it (it slows allocations).
+            top: allocators listed per checkpoint.
+            leak_threshold: RSS growth in MB/hour above which a fitted trend is flagged.
+            settle_fraction: leading share of a segment's samples ignored by the fit (warm-up, caches).
+        """
+        self.dir = soak_dir
+        os.makedirs(soak_dir, exist_ok=True)
+        self.state_path = os.path.join(soak_dir, "state.json")
+        self.memory_path = os.path.join(soak_dir, "memory.csv")
+        self.pv_names = list(pv_names)
+        self.checkpoint_interval = checkpoint_interval
+        self.memory_interval = memory_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self.leak_threshold = leak_threshold
+        self.settle_fraction = settle_fraction
+        self.state: Dict[str, Any] = {'pv_names': self.pv_names, 'duration_sec': duration, 'elapsed_sec': 0.0,
+                                      'segments': 0, 'checkpoints': 0, 'created': time.time(),
+                                      'metadata': metadata or {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                prev = json.load(f)
+            if prev.get('pv_names') != self.pv_names:
+                raise ValueError(f"{soak_dir} holds a soak run of different PVs; use another directory")
+            self.state.update(prev, duration_sec=duration or prev.get('duration_sec', 0))
+        self.resumed = self.state['segments'] > 0
+        self.segment = self.state['segments'] + 1
+        self.state['segments'] = self.segment
+        self._elapsed_before = float(self.state['elapsed_sec'])
+        self.sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.rss = GrowthSeries()
+        self.traced = GrowthSeries()
+        try:
+            import psutil  # type: ignore
+        except ImportError as e:
+            raise RuntimeError("psutil not installed. Install with: pip install psutil") from e
+        self._proc = psutil.Process()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._t0 = 0.0
+        self._last_ckpt = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        """Soak seconds over all segments, including the running one."""
+        return self._elapsed_before + (time.time() - self._t0 if self._t0 else 0.0)
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, float(self.state['duration_sec']) - self.elapsed)
+
+    def add_source(self, name: str, window: Callable[[], Dict[str, Any]]) -> None:
+        """`window()` returns a JSON-able dict for the interval since its previous call."""
+        self.sources[name] = window
+
+    def start(self) -> "SoakRun":
+        if self.tracemalloc_frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+        if tracemalloc.is_tracing():
+            self._baseline = tracemalloc.take_snapshot()
+        if not os.path.exists(self.memory_path):
+            with open(self.memory_path, "w", newline="") as f:
+                csv.writer(f).writerow(MEMORY_COLUMNS)
+        self._t0 = self._last_ckpt = time.time()
+        self.state['last_start'] = self._t0
+        _write_json(self.state_path, self.state)
+        self._sample_memory()
+        self._thread = threading.Thread(target=self._run, name="soak", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.memory_interval):
+            try:
+                self._sample_memory()
+                if time.time() - self._last_ckpt >= self.checkpoint_interval:
+                    self.checkpoint()
+            except Exception as e:
+                print(f"Soak checkpoint error: {e}")
+
+    def _sample_memory(self) -> Tuple[float, float]:
+        now = time.time()
+        rss = self._proc.memory_info().rss / 1024 / 1024
+        traced = peak = float("nan")
+        if tracemalloc.is_tracing():
+            cur, top = tracemalloc.get_traced_memory()
+            traced, peak = cur / 1024 / 1024, top / 1024 / 1024
+            self.traced.add(now, traced)
+        self.rss.add(now, rss)
+        with open(self.memory_path, "a", newline="") as f:
+            csv.writer(f).writerow([now, self.segment, self.elapsed, rss, traced, peak])
+        return rss, traced
+
+    def _allocators(self) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            return {}
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+        def entry(stat, diff=False):
+            frame = stat.traceback[0]
+            d = {'where': f"{frame.filename}:{frame.lineno}", 'origin': origin(frame.filename),
+                 'size_mb': stat.size / 1024 / 1024, 'count': stat.count}
+            if diff:
+                d.update(size_diff_mb=stat.size_diff / 1024 / 1024, count_diff=stat.count_diff)
+            return d
+
+        out: Dict[str, Any] = {'top': [entry(s) for s in snap.statistics("lineno")[:self.top]]}
+        if self._baseline is not None:
+            growth = [s for s in snap.compare_to(self._baseline, "lineno") if s.size_diff > 0][:self.top]
+            out['growth'] = [entry(s, diff=True) for s in growth]
+            by_origin: Dict[str, float] = {}
+            for s in snap.compare_to(self._baseline, "filename"):
+                o = origin(s.traceback[0].filename)
+                by_origin[o] = by_origin.get(o, 0.0) + s.size_diff / 1024 / 1024
+            out['growth_by_origin_mb'] = by_origin
+        return out
+
+    def checkpoint(self, final: bool = False) -> str:
+        """Write the next checkpoint file now; returns its path."""
+        with self._lock:
+            now = time.time()
+            rss, traced = self._sample_memory() if final else (self.rss.y[-1], self.traced.y[-1] if self.traced.y else None)
+            rss_fit = self.rss.fit(self.settle_fraction)
+            traced_fit = self.traced.fit(self.settle_fraction) if self.traced.y else None
+            n = self.state['checkpoints'] + 1
+            ckpt = {
+                'checkpoint': n,
+                'segment': self.segment,
+                'start': self._last_ckpt,
+                'end': now,
+                'elapsed_sec': self.elapsed,
+                'final': final,
+                'memory': {'rss_mb': rss, 'traced_mb': traced, 'rss_fit': rss_fit, 'traced_fit': traced_fit,
+                           'gc_objects': len(gc.get_objects()) if final else None},
+                'leak': leak_verdict(rss_fit, traced_fit, self.leak_threshold),
+                'allocators': self._allocators(),
+            }
+            for name, window in self.sources.items():
+                try:
+                    ckpt[name] = window()
+                except Exception as e:
+                    ckpt[name] = {'error': str(e)}
+            path = os.path.join(self.dir, f"ckpt_{n:06d}.json")
+            _write_json(path, ckpt)
+            self.state.update(checkpoints=n, elapsed_sec=self.elapsed, last_checkpoint=now)
+            _write_json(self.state_path, self.state)
+            self._last_ckpt = now
+            return path
+
+    def stop(self) -> Optional[str]:
+        """Final checkpoint and stop sampling. Safe to call more than once."""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        path = self.checkpoint(final=True)
+        if self.tracemalloc_frames > 0:
+            tracemalloc.stop()
+        return path
+
+
+# ----------------------------------------------------------------------
+# Reading a run (finished or in progress)
+# ----------------------------------------------------------------------
+def load_checkpoints(soak_dir: str) -> List[Dict[str, Any]]:
+    out = []
+    for path in sorted(glob.glob(os.path.join(soak_dir, "ckpt_*.json"))):
+        try:
+            with open(path) as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def load_memory(soak_dir: str) -> Dict[str, np.ndarray]:
+    path = os.path.join(soak_dir, "memory.csv")
+    if not os.path.exists(path):
+        return {c: np.array([]) for c in MEMORY_COLUMNS}
+    import pandas as pd
+    df = pd.read_csv(path)
+    return {c: df[c].to_numpy(dtype=np.float64) for c in MEMORY_COLUMNS}
+
+
+def summarize(soak_dir: str, leak_threshold: float = 1.0, settle_fraction: float = 0.2) -> Dict[str, Any]:
+    """Totals, merged window histograms, per-segment memory trends and the leak verdict of a soak run."""
+    with open(os.path.join(soak_dir, "state.json")) as f:
+        state = json.load(f)
+    ckpts = load_checkpoints(soak_dir)
+    mem = load_memory(soak_dir)
+    segments = []
+    for seg in sorted(set(mem['segment'].astype(int).tolist())):
+        sel = mem['segment'] == seg
+        t, rss, traced = mem['timestamp'][sel], mem['rss_mb'][sel], mem['traced_mb'][sel]
+        k = int(len(t) * settle_fraction)
+        rss_fit = fit_growth(t[k:], rss[k:])
+        traced_fit = fit_growth(t[k:], traced[k:]) if np.isfinite(traced).any() else None
+        segments.append({'segment': seg, 'start': float(t[0]), 'end': float(t[-1]),
+                         'rss_start_mb': float(rss[0]), 'rss_end_mb': float(rss[-1]), 'rss_max_mb': float(rss.max()),
+                         **{f"verdict_{k2}": v for k2, v in leak_verdict(rss_fit, traced_fit, leak_threshold).items()}})
+
+    updates = np.zeros(len(state['pv_names']), dtype=np.int64)
+    nbytes = np.zeros(len(state['pv_names']), dtype=np.int64)
+    hists: Dict[str, LatencyHistogram] = {}
+    windows = []
+    for c in ckpts:
+        stress = c.get('stress') or {}
+        if 'updates' in stress:
+            updates += np.asarray(stress['updates'], dtype=np.int64)
+            nbytes += np.asarray(stress['bytes'], dtype=np.int64)
+        for name, d in (stress.get('histograms') or {}).items():
+            h = LatencyHistogram.from_dict(d)
+            if name in hists:
+                hists[name].merge(h)
+            else:
+                hists[name] = h
+        span = c['end'] - c['start']
+        n = int(sum(stress.get('updates', [])))
+        windows.append({'checkpoint': c['checkpoint'], 'segment': c['segment'], 'end': c['end'],
+                        'elapsed_sec': c['elapsed_sec'], 'updates': n,
+                        'rate_hz': n / span if span > 0 else 0.0, 'rss_mb': c['memory']['rss_mb'],
+                        'traced_mb': c['memory']['traced_mb'],
+                        'interval_p99': LatencyHistogram.from_dict(stress['histograms']['interval']).percentile(99)
+                        if 'histograms' in stress else None,
+                        'leak_suspected': c['leak']['leak_suspected']})
+    last = ckpts[-1] if ckpts else {}
+    return {
+        'dir': soak_dir,
+        'elapsed_sec': state.get('elapsed_sec', 0.0),
+        'duration_sec': state.get('duration_sec', 0.0),
+        'segments': state.get('segments', 0),
+        'checkpoints': len(ckpts),
+        'last_checkpoint': state.get('last_checkpoint'),
+        'pv_names': state['pv_names'],
+        'updates': updates,
+        'bytes': nbytes,
+        'histograms': hists,
+        'windows': windows,
+        'memory_segments': segments,
+        'leak': segments[-1] if segments else {},
+        'growth': (last.get('allocators') or {}).get('growth', []),
+        'growth_by_origin_mb': (last.get('allocators') or {}).get('growth_by_origin_mb', {}),
+    }
+
+
+def print_summary(s: Dict[str, Any]) -> None:
+    print(f"Soak run {s['dir']}: {s['elapsed_sec'] / 3600:.2f} h of {s['duration_sec'] / 3600:.2f} h, "
+          f"{s['segments']} segment(s), {s['checkpoints']} checkpoint(s)")
+    if s['last_checkpoint']:
+        print(f"  Last checkpoint {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(s['last_checkpoint']))}")
+    total = int(s['updates'].sum())
+    print(f"  {total} updates, {s['bytes'].sum() / 1024 ** 3:.2f} GB")
+    for pv, n in zip(s['pv_names'], s['updates']):
+        print(f"    {pv}: {int(n)} updates")
+    for name, h in s['histograms'].items():
+        pct = h.percentiles((50, 99, 99.9))
+        print(f"  {name} p50/p99/p99.9: {pct[50]:.4f} / {pct[99]:.4f} / {pct[99.9]:.4f} s (max {h.max:.4f} s)")
+    for seg in s['memory_segments']:
+        traced = seg['verdict_traced_mb_per_hour']
+        traced = f", traced heap {traced:+.2f} MB/h" if traced is not None and np.isfinite(traced) else ""
+        flag = f" LEAK SUSPECTED ({seg['verdict_growth_in']})" if seg['verdict_leak_suspected'] else ""
+        print(f"  Segment {seg['segment']}: RSS {seg['rss_start_mb']:.1f} -> {seg['rss_end_mb']:.1f} MB "
+              f"(max {seg['rss_max_mb']:.1f}), trend {seg['verdict_rss_mb_per_hour']:+.2f} MB/h "
+              f"(R^2 {seg['verdict_rss_r2']:.2f}){traced}{flag}")
+    if s['growth_by_origin_mb']:
+        parts = ", ".join(f"{k} {v:+.2f} MB" for k, v in sorted(s['growth_by_origin_mb'].items()))
+        print(f"  Traced heap growth since segment start by origin: {parts}")
+    for g in s['growth'][:5]:
+        print(f"    {g['size_diff_mb']:+.2f} MB ({g['count_diff']:+d} blocks) {g['where']} [{g['origin']}]")
+
+
+def write_report(s: Dict[str, Any], prefix: str) -> List[str]:
+    """<prefix>_windows.csv (one row per checkpoint) and <prefix>_summary.csv; returns the paths."""
+    paths = [f"{prefix}_windows.csv", f"{prefix}_summary.csv"]
+    with open(paths[0], "w", newline="") as f:
+        keys = list(s['windows'][0]) if s['windows'] else ['checkpoint']
+        writer = csv.DictWriter(f, fieldnames=keys)
+        writer.writeheader()
+        writer.writerows(s['windows'])
+    leak = s['leak']
+    row = {'elapsed_sec': s['elapsed_sec'], 'segments': s['segments'], 'checkpoints': s['checkpoints'],
+           'updates': int(s['updates'].sum()), 'gb': s['bytes'].sum() / 1024 ** 3,
+           **{k: v for k, v in leak.items()}}
+    for name, h in s['histograms'].items():
+        row.update({f"{name}_p50": h.percentile(50), f"{name}_p99": h.percentile(99), f"{name}_max": h.max})
+    with open(paths[1], "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        writer.writeheader()
+        writer.writerow(row)
+    return paths
+
+
+def add_soak_arguments(parser) -> None:
+    parser.add_argument("--soak", default=None, metavar="DIR",
+                        help="长时间浸泡测试目录：定期写检查点、内存保持平稳、检测泄漏；同一目录再次运行时续跑，"
+                             "--duration 为总时长")
+    parser.add_argument("--checkpoint-interval", type=float, default=300,
+                        help="soak 检查点间隔秒数 (default: 300)")
+    parser.add_argument("--memory-interval", type=float, default=30, help="soak RSS/堆内存采样间隔秒数 (default: 30)")
+    parser.add_argument("--tracemalloc", type=int, default=1,
+                        help="soak 时 tracemalloc 记录的调用栈深度，0 关闭（开启会使 Python 内存分配变慢） (default: 1)")
+    parser.add_argument("--leak-threshold", type=float, default=1.0,
+                        help="RSS 增长趋势超过该值 (MB/小时) 且拟合 R^2>=0.5 时判为疑似泄漏 (default: 1.0)")
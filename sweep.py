@@ -0,0 +1,383 @@
+"""Parameter sweeps over the test scripts, run against the simulated IOC.
+
+A sweep point fixes protocol, camera count, client count, frame size and
+frame rate. `SweepRunner.run_point` starts `08_sim_ioc.py` with that
+configuration, waits for it to settle, runs `04_stress_test.py` (one
+client) or `05_concurrent_test.py` (several clients), both with `--warmup`,
+with `CAMERA_PVS` and `RESULTS_DIR` pointing at the simulator and
+a per-point directory, reads the point's metrics from the result files,
+stops the simulator and cools down before the next point.
+
+    runner = SweepRunner("results/sweep", duration=30, warmup=5, max_loss=1.0, max_latency=0.2)
+    rows = runner.run_grid(grid({'protocol': ['ca', 'pva'], 'cameras': [1, 2, 4, 8]}))
+    rows, first_bad = runner.run_adaptive(base_point(protocol="pva"), "cameras", 1, 64)
+
+Every finished point is appended to `<out_dir>/sweep.csv`; a rerun reuses
+those rows instead of measuring again, so an interrupted sweep resumes where
+it stopped (adaptive searches replay their decisions from the stored rows;
+points that failed with an error are measured again).
+
+A point is saturated when the delivered frame rate falls short of the
+nominal one by more than `max_loss` percent, or the IOC-to-callback latency
+p99 exceeds `max_latency` seconds (04 only; 05 does not measure latency).
+"""
+
+from __future__ import annotations
+
+import csv
+import itertools
+import math
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+AXES = ("protocol", "cameras", "clients", "size", "fps")
+ADAPTIVE_AXES = ("cameras", "clients", "fps")
+TARGETS = ("sim", "external")
+METRICS = ("delivered_fps", "loss_percent", "latency_p50", "latency_p99", "interval_p99",
+           "throughput_mbps", "cpu_percent", "saturated", "status")
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_size(size: str) -> Tuple[int, int]:
+    w, _, h = str(size).lower().partition("x")
+    return int(w), int(h or w)
+
+
+def base_point(protocol: str = "pva", cameras: int = 1, clients: int = 1, size: str = "1024x1024",
+               fps: float = 10.0) -> Dict[str, Any]:
+    return {'protocol': protocol, 'cameras': int(cameras), 'clients': int(clients), 'size': size, 'fps': float(fps)}
+
+
+def grid(axes: Dict[str, Sequence[Any]], base: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Cartesian product of the given axis values, other axes taken from `base`."""
+    base = dict(base or base_point())
+    names = [a for a in AXES if a in axes]
+    return [normalize({**base, **dict(zip(names, values))})
+            for values in itertools.product(*(axes[a] for a in names))]
+
+
+def normalize(point: Dict[str, Any]) -> Dict[str, Any]:
+    return base_point(point['protocol'], point['cameras'], point['clients'], point['size'], point['fps'])
+
+
+def point_id(point: Dict[str, Any]) -> str:
+    return (f"{point['protocol']}_cam{point['cameras']}_cli{point['clients']}_"
+            f"{point['size']}_fps{point['fps']:g}")
+
+
+def _read_kv(path: str) -> Dict[str, float]:
+    with open(path, newline="") as f:
+        return {r['metric']: float(r['value']) for r in csv.DictReader(f)}
+
+
+def _mean_column(path: str, column: str) -> float:
+    values = []
+    if os.path.exists(path):
+        with open(path, newline="") as f:
+            values = [float(r[column]) for r in csv.DictReader(f) if r.get(column)]
+    return sum(values) / len(values) if values else math.nan
+
+
+def start_sim(protocol: str, cameras: int, width: int, height: int, fps: float, dtype: str = "uint8",
+              prefix: str = "SIM:", env: Optional[Dict[str, str]] = None, log_path: Optional[str] = None,
+              settle: float = 1.0) -> subprocess.Popen:
+    """Start 08_sim_ioc.py in a child process and wait `settle` seconds for it to serve."""
+    cmd = [sys.executable, os.path.join(HERE, "08_sim_ioc.py"), "--protocol", protocol,
+           "--cameras", str(cameras), "--width", str(width), "--height", str(height),
+           "--dtype", dtype, "--fps", str(fps), "--prefix", prefix]
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=HERE)
+    if log_path:
+        log.close()
+    # the server needs a moment before clients can connect
+    time.sleep(settle)
+    if proc.poll() is not None:
+        raise RuntimeError(f"simulator exited with code {proc.returncode}"
+                           + (f", see {log_path}" if log_path else ""))
+    return proc
+
+
+def stop_sim(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+class SweepRunner:
+    """Runs sweep points one after another and keeps a resumable table of results."""
+
+    def __init__(self, out_dir: str, duration: int = 30, warmup: float = 5.0, cooldown: float = 3.0,
+                 target: str = "sim", dtype: str = "uint8", prefix: str = "SIM:", max_loss: float = 1.0,
+                 max_latency: float = 0.5, test_args: Sequence[str] = ()):
+        """
+        Args:
+            out_dir: sweep directory (sweep.csv plus one subdirectory per point).
+            duration: measured seconds per point.
+            warmup: seconds between starting a point and measuring (simulator settle + test --warmup).
+            cooldown: pause after each point so the host is idle before the next one.
+            target: 'sim' starts 08_sim_ioc.py per point; 'external' uses the first N of
+                config.CAMERA_PVS and trusts `size`/`fps` to describe the real cameras.
+            max_loss / max_latency: saturation thresholds (percent / seconds).
+            test_args: extra arguments passed to the test script.
+        """
+        if target not in TARGETS:
+            raise ValueError(f"target must be one of {TARGETS}")
+        self.out_dir = out_dir
+        self.duration = int(duration)
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.target = target
+        self.dtype = dtype
+        self.prefix = prefix
+        self.max_loss = max_loss
+        self.max_latency = max_latency
+        self.test_args = list(test_args)
+        self.state_path = os.path.join(out_dir, "sweep.csv")
+        os.makedirs(out_dir, exist_ok=True)
+        self.done: Dict[str, Dict[str, Any]] = self._load()
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        done: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.state_path):
+            return done
+        with open(self.state_path, newline="") as f:
+            for r in csv.DictReader(f):
+                row: Dict[str, Any] = dict(r)
+                for k in ('cameras', 'clients'):
+                    row[k] = int(row[k])
+                for k in ('fps',) + METRICS[:-2]:
+                    row[k] = float(row[k]) if row.get(k) not in (None, "") else math.nan
+                # thresholds may differ from the run that stored the row
+                row['saturated'] = self.saturated(row)
+                # points that failed to run at all are measured again
+                if not row.get('status', '').startswith("error"):
+                    done[row['id']] = row
+        return done
+
+    def _append(self, row: Dict[str, Any]) -> None:
+        keys = ['id', *AXES, *METRICS]
+        new = not os.path.exists(self.state_path)
+        with open(self.state_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=keys, extrasaction="ignore")
+            if new:
+                writer.writeheader()
+            writer.writerow(row)
+
+    # ------------------------------------------------------------------
+    # One point
+    # ------------------------------------------------------------------
+    def pv_names(self, point: Dict[str, Any]) -> List[str]:
+        if self.target == "sim":
+            from sim_ioc import sim_pv_names
+            return sim_pv_names(point['cameras'], self.prefix)
+        from config import CAMERA_PVS
+        if point['cameras'] > len(CAMERA_PVS):
+            raise ValueError(f"only {len(CAMERA_PVS)} PVs in CAMERA_PVS, point needs {point['cameras']}")
+        return CAMERA_PVS[:point['cameras']]
+
+    def run_point(self, point: Dict[str, Any]) -> Dict[str, Any]:
+        """Measure one point (or return its stored row). Never raises for a failed run."""
+        point = normalize(point)
+        pid = point_id(point)
+        if pid in self.done:
+            return self.done[pid]
+        point_dir = os.path.join(self.out_dir, pid)
+        os.makedirs(point_dir, exist_ok=True)
+        print(f"[sweep] {pid}: {point['cameras']} camera(s) x {point['clients']} client(s), "
+              f"{point['size']} @ {point['fps']:g} FPS over {point['protocol'].upper()}")
+        sim = None
+        row: Dict[str, Any] = {'id': pid, **point}
+        try:
+            width, height = parse_size(point['size'])
+            env = dict(os.environ, CAMERA_PVS=",".join(self.pv_names(point)), RESULTS_DIR=point_dir)
+            if point['protocol'] == "ca":
+                # large waveforms need a bigger CA array limit on both ends
+                import numpy as np
+                frame_bytes = width * height * np.dtype(self.dtype).itemsize
+                env['EPICS_CA_MAX_ARRAY_BYTES'] = str(max(frame_bytes + 4096,
+                                                          int(env.get('EPICS_CA_MAX_ARRAY_BYTES', 0))))
+            if self.target == "sim":
+                sim = self._start_sim(point, width, height, env, point_dir)
+            status = self._run_test(point, env, point_dir)
+            row.update(self._collect(point, point_dir))
+            row['status'] = status
+        except Exception as e:
+            row['status'] = f"error: {e}"
+        finally:
+            if sim is not None:
+                self._stop_sim(sim)
+        for k in METRICS[:-2]:
+            row.setdefault(k, math.nan)
+        row['saturated'] = self.saturated(row)
+        print(f"[sweep]   delivered {row['delivered_fps']:.2f} FPS/PV, loss {row['loss_percent']:.2f}%, "
+              f"latency p99 {row['latency_p99'] * 1e3:.1f} ms, CPU {row['cpu_percent']:.1f}%"
+              f"{' SATURATED' if row['saturated'] else ''} ({row['status']})")
+        self._append(row)
+        self.done[pid] = row
+        time.sleep(self.cooldown)
+        return row
+
+    def _start_sim(self, point, width, height, env, point_dir) -> subprocess.Popen:
+        return start_sim(point['protocol'], point['cameras'], width, height, point['fps'], dtype=self.dtype,
+                         prefix=self.prefix, env=env, log_path=os.path.join(point_dir, "sim.log"),
+                         settle=min(self.warmup, 2.0) or 1.0)
+
+    @staticmethod
+    def _stop_sim(proc: subprocess.Popen) -> None:
+        stop_sim(proc)
+
+    def _run_test(self, point, env, point_dir) -> str:
+        if point['clients'] <= 1:
+            script = "04_stress_test.py"
+            args = ["--warmup", str(self.warmup)]
+        else:
+            script = "05_concurrent_test.py"
+            args = ["--clients", str(point['clients']), "--warmup", str(self.warmup)]
+        cmd = [sys.executable, os.path.join(HERE, script), "--protocol", point['protocol'],
+               "--duration", str(self.duration), *args, *self.test_args]
+        with open(os.path.join(point_dir, "test.log"), "w") as log:
+            try:
+                rc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=HERE,
+                                    timeout=self.duration + self.warmup + 120).returncode
+            except subprocess.TimeoutExpired:
+                return "timeout"
+        return "ok" if rc == 0 else f"exit {rc}"
+
+    def _collect(self, point, point_dir) -> Dict[str, Any]:
+        n_pvs = point['cameras']
+        if point['clients'] <= 1:
+            stats = _read_kv(os.path.join(point_dir, "stress_test.csv"))
+            delivered = stats['avg_update_rate'] / n_pvs
+            out = {
+                'latency_p50': stats.get('latency_p50', math.nan),
+                'latency_p99': stats.get('latency_p99', math.nan),
+                'interval_p99': stats.get('interval_p99', math.nan),
+                'throughput_mbps': stats.get('avg_throughput_mbps', math.nan),
+                'cpu_percent': _mean_column(os.path.join(point_dir, "stress_cpu.csv"), "cpu_percent"),
+            }
+        else:
+            with open(os.path.join(point_dir, "concurrent_test.csv"), newline="") as f:
+                rates = [float(r['avg_rate_hz']) for r in csv.DictReader(f)]
+            # every client monitors every camera
+            delivered = sum(rates) / (point['clients'] * n_pvs) if rates else 0.0
+            out = {}
+        out['delivered_fps'] = delivered
+        out['loss_percent'] = max(0.0, 1.0 - delivered / point['fps']) * 100 if point['fps'] > 0 else math.nan
+        return out
+
+    def saturated(self, row: Dict[str, Any]) -> bool:
+        if row.get('status') != "ok":
+            return True
+        loss, lat = row.get('loss_percent', math.nan), row.get('latency_p99', math.nan)
+        return bool((loss == loss and loss > self.max_loss) or (lat == lat and lat > self.max_latency))
+
+    # ------------------------------------------------------------------
+    # Strategies
+    # ------------------------------------------------------------------
+    def run_grid(self, points: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.run_point(p) for p in points]
+
+    def run_adaptive(self, base: Dict[str, Any], axis: str, lo: float, hi: float,
+                     tolerance: float = 0.1) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """Double `axis` from `lo` until saturation (or `hi`), then bisect the boundary.
+
+        Returns the measured rows (ordered by axis value) and the smallest saturated value,
+        or None when `hi` was reached without saturating. Integer axes bisect down to 1;
+        fps to `tolerance` relative width.
+        """
+        if axis not in ADAPTIVE_AXES:
+            raise ValueError(f"adaptive axis must be one of {ADAPTIVE_AXES}")
+        integer = axis != "fps"
+
+        def measure(v):
+            return self.run_point({**base, axis: int(v) if integer else float(v)})
+
+        rows = []
+        good, bad = None, None
+        v = lo
+        while True:
+            row = measure(v)
+            rows.append(row)
+            if row['saturated']:
+                bad = v
+                break
+            good = v
+            if v >= hi:
+                break
+            v = min(hi, v * 2 if v > 0 else 1)
+        if bad is not None and good is not None:
+            while (bad - good > 1) if integer else (bad - good > tolerance * good):
+                mid = (good + bad) // 2 if integer else (good + bad) / 2
+                row = measure(mid)
+                rows.append(row)
+                if row['saturated']:
+                    bad = mid
+                else:
+                    good = mid
+        rows.sort(key=lambda r: r[axis])
+        return rows, bad
+
+
+def series_key(row: Dict[str, Any], axis: str) -> Tuple:
+    return tuple(row[a] for a in AXES if a != axis)
+
+
+def saturation_table(rows: Sequence[Dict[str, Any]], axis: str) -> List[Dict[str, Any]]:
+    """Per series (all axes but `axis` fixed): last unsaturated and first saturated value along `axis`."""
+    series: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for r in rows:
+        series.setdefault(series_key(r, axis), []).append(r)
+    out = []
+    for key, rs in series.items():
+        rs = sorted(rs, key=lambda r: r[axis])
+        first_bad = next((r for r in rs if r['saturated']), None)
+        ok = [r for r in rs if not r['saturated'] and (first_bad is None or r[axis] < first_bad[axis])]
+        entry = dict(zip([a for a in AXES if a != axis], key))
+        entry.update({
+            'axis': axis,
+            'max_ok': ok[-1][axis] if ok else None,
+            'first_saturated': first_bad[axis] if first_bad else None,
+            'max_ok_throughput_mbps': ok[-1]['throughput_mbps'] if ok else None,
+        })
+        out.append(entry)
+    return out
+
+
+def plot_curves(rows: Sequence[Dict[str, Any]], axis: str, path: str) -> bool:
+    """Loss, latency p99 and delivered fps versus `axis`, one line per series. False without matplotlib."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    series: Dict[Tuple, List[Dict[str, Any]]] = {}
+    for r in rows:
+        series.setdefault(series_key(r, axis), []).append(r)
+    others = [a for a in AXES if a != axis]
+    fig, axes = plt.subplots(1, 3, figsize=(16, 5))
+    for key, rs in sorted(series.items(), key=lambda kv: str(kv[0])):
+        rs = sorted(rs, key=lambda r: r[axis])
+        x = [r[axis] for r in rs]
+        label = ", ".join(f"{a}={v}" for a, v in zip(others, key))
+        axes[0].plot(x, [r['loss_percent'] for r in rs], marker='o', label=label)
+        axes[1].plot(x, [r['latency_p99'] * 1e3 for r in rs], marker='o', label=label)
+        axes[2].plot(x, [r['delivered_fps'] for r in rs], marker='o', label=label)
+    for ax, title in zip(axes, ("Loss (%)", "Latency p99 (ms)", "Delivered FPS per PV")):
+        ax.set_xlabel(axis)
+        ax.set_title(title)
+        ax.grid(True, alpha=0.3)
+    axes[0].legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return True
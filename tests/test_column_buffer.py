@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from column_buffer import ColumnBuffer  # noqa: E402
+
+
+def test_deferred_spill_chunks_are_written_in_swap_order(tmp_path):
+    buf = ColumnBuffer([("seq", "i8")], spill_path=str(tmp_path / "spill.bin"), spill_rows=100)
+    lock = threading.Lock()
+    counter = [0]
+    held = []
+    # swap out two chunks, then write the later one first from another thread
+    for _ in range(201):
+        with lock:
+            counter[0] += 1
+            full = buf.append_deferred(counter[0])
+        if full is not None:
+            held.append(full)
+    late = threading.Thread(target=buf.write_chunk, args=(held[1],))
+    late.start()
+    late.join(0.2)
+    assert late.is_alive()  # waits for the earlier chunk
+    buf.write_chunk(held[0])
+    late.join()
+
+    def produce():
+        for _ in range(5000):
+            with lock:
+                counter[0] += 1
+                full = buf.append_deferred(counter[0])
+            if full is not None:
+                buf.write_chunk(full)
+
+    threads = [threading.Thread(target=produce) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seq = buf.to_arrays()["seq"]
+    assert len(seq) == counter[0]
+    assert np.array_equal(seq, np.arange(1, counter[0] + 1))
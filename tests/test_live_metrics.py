@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_metrics import LiveMetrics  # noqa: E402
+
+
+def test_record_with_decreasing_now_stays_in_the_current_slot():
+    metrics = LiveMetrics(["PV"], window=10.0, slots=5)
+    metrics.record(0, 4.1, nbytes=10)
+    # a caller that read the clock just before the slot boundary records after it
+    metrics.record(0, 3.9, nbytes=10)
+    metrics.record(0, 4.2, nbytes=10)
+
+    assert metrics._epoch == 2
+    assert list(metrics.slot_epoch) == [-1, -1, 2, -1, -1]
+    assert metrics.frames[2] == 3
+    snap = metrics.snapshot(4.3)
+    assert snap['frames_total'][0] == 3
+    assert snap['interval']['count'][0] == 2
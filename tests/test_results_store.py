@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from results_store import ResultStore, read_results  # noqa: E402
+
+COLUMNS = [("pv", "category"), ("method", "str"), ("recv_time", "f8")]
+
+
+def test_hdf5_appends_chunks_with_different_pv_subsets(tmp_path):
+    pytest.importorskip("tables")
+    path = str(tmp_path / "latency.h5")
+    store = ResultStore(path, COLUMNS, metadata={}, chunk_rows=1)
+    store.append({"pv": ["CAM1:image1:ArrayData"] * 2, "method": ["pyepics"] * 2, "recv_time": [1.0, 2.0]})
+    store.append({"pv": ["CAM2:image1:ArrayData", "CAM3:a:much:longer:image1:ArrayData"],
+                  "method": ["p4p_threaded", "p4p"], "recv_time": [3.0, 4.0]})
+    store.close()
+    assert store.rows_written == 4
+
+    df = read_results(path)
+    assert df["pv"].tolist() == ["CAM1:image1:ArrayData", "CAM1:image1:ArrayData", "CAM2:image1:ArrayData",
+                                 "CAM3:a:much:longer:image1:ArrayData"]
+    assert df["method"].tolist() == ["pyepics", "pyepics", "p4p_threaded", "p4p"]
+    assert read_results(path, columns=["pv"], start=3.0, time_column="recv_time")["pv"].nunique() == 2
+
+
+def test_hdf5_appends_missing_integers_after_an_int_only_chunk(tmp_path):
+    pytest.importorskip("tables")
+    path = str(tmp_path / "latency.h5")
+    store = ResultStore(path, [("uid", "i8"), ("recv_time", "f8")], metadata={}, chunk_rows=1)
+    store.append({"uid": [1, 2], "recv_time": [1.0, 2.0]})
+    store.append({"uid": [None, 4], "recv_time": [3.0, 4.0]})
+    store.close()
+
+    uid = read_results(path)["uid"]
+    assert uid.isna().tolist() == [False, False, True, False]
+    assert uid.dropna().tolist() == [1, 2, 4]